@@ -15,6 +15,9 @@ class PythonBridgeManager {
     private var isPythonReady = false
     private let sys = Python.import("sys")
     
+    // 增量击球分析有状态（环形缓冲），所有调用在同一个串行队列上按顺序执行
+    private let analysisQueue = DispatchQueue(label: "PythonBridge.analysis", qos: .userInitiated)
+    
     private init() {
         setupPythonEnvironment()
     }
@@ -44,7 +47,7 @@ class PythonBridgeManager {
             return nil
         }
         
-        DispatchQueue.global(qos: .userInitiated).async {
+        analysisQueue.async {
             do {
                 let analysisModule = try Python.attemptImport("AnalyzeExample")
                 let jsonData = try JSONSerialization.data(withJSONObject: data)
@@ -79,5 +82,75 @@ class PythonBridgeManager {
         
         return nil
     }
+    
+    // MARK: - 本地增量击球检测（与服务器同一套检测逻辑）
+    
+    /// 开始新的录制会话；config 可包含 threshold / min_gap / slice_len / with_angles
+    func startStrokeStream(config: [String: Any] = [:]) {
+        callStream { module in
+            let jsonData = try JSONSerialization.data(withJSONObject: config)
+            return module.start_stream(String(data: jsonData, encoding: .utf8) ?? "{}")
+        }
+    }
+    
+    /// 按批喂入采样点（每个元素为 [x, y, z]），检测到的击球通过 PythonStrokesDetected 通知发出
+    /// times 为每个采样点的时间戳（"yyyy-MM-dd HH:mm:ss.SSS"），有则去掉重复包并在丢包处分段检测
+    func pushSamples(acc: [[Double]], gyro: [[Double]], angle: [[Double]]? = nil, times: [String]? = nil) {
+        var batch: [String: Any] = ["acc": acc, "gyro": gyro]
+        if let angle = angle {
+            batch["angle"] = angle
+        }
+        if let times = times {
+            batch["times"] = times
+        }
+        callStream { module in
+            let jsonData = try JSONSerialization.data(withJSONObject: batch)
+            return module.push_samples(String(data: jsonData, encoding: .utf8) ?? "{}")
+        }
+    }
+    
+    /// 录制结束：取出最后剩余的击球
+    func finishStrokeStream() {
+        callStream { module in
+            module.finish_stream()
+        }
+    }
+    
+    private func callStream(_ call: @escaping (PythonObject) throws -> PythonObject) {
+        guard isPythonReady else {
+            print("Python环境未就绪")
+            return
+        }
+        
+        analysisQueue.async {
+            do {
+                let analysisModule = try Python.attemptImport("AnalyzeExample")
+                let result = try call(analysisModule)
+                
+                guard let resultString = String(result),
+                      let jsonData = resultString.data(using: .utf8),
+                      let jsonDict = try? JSONSerialization.jsonObject(with: jsonData) as? [String: Any] else {
+                    return
+                }
+                
+                if let error = jsonDict["error"] as? String {
+                    print("Python增量分析失败: \(error)")
+                    return
+                }
+                
+                if let strokes = jsonDict["strokes"] as? [[String: Any]], !strokes.isEmpty {
+                    DispatchQueue.main.async {
+                        NotificationCenter.default.post(
+                            name: NSNotification.Name("PythonStrokesDetected"),
+                            object: nil,
+                            userInfo: jsonDict
+                        )
+                    }
+                }
+            } catch {
+                print("Python增量分析失败: \(error)")
+            }
+        }
+    }
 }
 
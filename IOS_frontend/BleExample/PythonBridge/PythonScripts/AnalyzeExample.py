@@ -1,89 +1,157 @@
 #
-//  AnalyzeExample.py
-//  WitSDK
-//
-//  Created by 顾心怡 on 2025/12/8.
-//
+#  AnalyzeExample.py
+#  WitSDK
+#
+#  Created by 顾心怡 on 2025/12/8.
+#
+#  击球检测与服务器共用同一套代码：stroke_core / stroke_features / tennis_stroke_analyzer / stroke_stream
+#  由 backend/benchmarks/sync_ios_scripts.py 从 backend/analyzers 同步到本目录，不要直接修改这些副本。
+#  所有接口都返回JSON字符串，Swift 端直接按JSON解析。
+#
 
 
 import json
 import numpy as np
 from datetime import datetime
 
+from stroke_stream import StrokeStream
+
+# 当前会话的增量分析器（PythonBridge 在串行队列上调用，同一时间只有一个会话）
+_stream = None
+
+
 def analyze_live_data(json_data):
     """
-    实时分析传感器数据
+    实时分析传感器数据（单个采样点）
     """
     try:
         data = json.loads(json_data)
         sensor_data = data.get('sensor_data', {})
-        
+
         # 提取数值数据
         acc_x = float(sensor_data.get('acc_x', 0))
         acc_y = float(sensor_data.get('acc_y', 0))
         acc_z = float(sensor_data.get('acc_z', 0))
-        
+
         gyro_x = float(sensor_data.get('gyro_x', 0))
         gyro_y = float(sensor_data.get('gyro_y', 0))
         gyro_z = float(sensor_data.get('gyro_z', 0))
-        
+
         # 示例分析1：计算合加速度
         acceleration_magnitude = np.sqrt(acc_x**2 + acc_y**2 + acc_z**2)
-        
+
         # 示例分析2：简单运动状态判断
         motion_state = "静止"
         if acceleration_magnitude > 1.2:
             motion_state = "移动中"
-        
+
         # 示例分析3：角度变化率（简化的姿态变化检测）
-        angle_x = float(sensor_data.get('angle_x', 0))
         angle_change_rate = abs(gyro_x) + abs(gyro_y) + abs(gyro_z)
-        
+
         # 返回分析结果
         result = {
             "success": True,
             "timestamp": sensor_data.get('timestamp', ''),
-            "acceleration_magnitude": round(acceleration_magnitude, 3),
+            "acceleration_magnitude": round(float(acceleration_magnitude), 3),
             "motion_state": motion_state,
             "angle_change_rate": round(angle_change_rate, 3),
-            "is_moving": acceleration_magnitude > 1.0,
+            "is_moving": bool(acceleration_magnitude > 1.0),
             "analysis_time": datetime.now().isoformat()
         }
-        
-        return result
-        
+
+        return json.dumps(result, ensure_ascii=False)
+
     except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }
+        return _error(e)
+
+
+def start_stream(config_json=None):
+    """
+    开始新的增量分析会话
+
+    config_json 可选: {"threshold": 300, "min_gap": 75, "slice_len": 200, "with_angles": true}
+    """
+    global _stream
+    try:
+        config = json.loads(config_json) if config_json else {}
+        _stream = StrokeStream(
+            threshold=float(config.get('threshold', 300.0)),
+            min_gap=int(config.get('min_gap', 75)),
+            slice_len=int(config.get('slice_len', 200)),
+            with_angles=bool(config.get('with_angles', True))
+        )
+        return json.dumps({"success": True, "state": _stream.state()}, ensure_ascii=False)
+    except Exception as e:
+        return _error(e)
+
+
+def push_samples(batch_json):
+    """
+    喂入一批采样点，返回本批新产出的击球
+
+    batch_json: {"acc": [[ax, ay, az], ...], "gyro": [[gx, gy, gz], ...], "angle": [[x, y, z], ...],
+                 "times": ["2025-12-11 22:15:37.267", ...]}
+    times 可选（文本或Unix毫秒）；有则与服务器一样去掉重复包、在丢包处分段检测
+    整批只做一次JSON解析和一次数组转换
+    """
+    try:
+        if _stream is None:
+            start_stream()
+        batch = json.loads(batch_json)
+        strokes = _stream.push(batch.get('acc', []), batch.get('gyro', []), batch.get('angle'), batch.get('times'))
+        return json.dumps({"success": True, "strokes": strokes, "state": _stream.state()}, ensure_ascii=False)
+    except Exception as e:
+        return _error(e)
+
+
+def finish_stream():
+    """会话结束：返回最后剩余的击球，并释放分析器"""
+    global _stream
+    try:
+        if _stream is None:
+            return json.dumps({"success": True, "strokes": [], "state": None}, ensure_ascii=False)
+        strokes = _stream.flush()
+        state = _stream.state()
+        _stream = None
+        return json.dumps({"success": True, "strokes": strokes, "state": state}, ensure_ascii=False)
+    except Exception as e:
+        return _error(e)
+
 
 def analyze_csv_file(file_path):
     """
-    分析已保存的CSV文件
+    分析已保存的CSV文件（不依赖 pandas；击球检测与服务器结果一致）
     """
     try:
-        import pandas as pd
-        # 这里可以添加更复杂的数据分析逻辑
-        df = pd.read_csv(file_path)
-        
-        # 示例：计算统计数据
+        from stroke_core import load_imu_csv_file
+        acc, gyro, ang, times = load_imu_csv_file(file_path, with_times=True)
+
+        stream = StrokeStream(with_angles=ang is not None)
+        strokes = stream.push(acc, gyro, ang, times) + stream.flush()
+
         stats = {
-            "total_records": len(df),
-            "avg_acc_x": df['AX'].mean() if 'AX' in df.columns else 0,
-            "avg_acc_y": df['AY'].mean() if 'AY' in df.columns else 0,
-            "avg_acc_z": df['AZ'].mean() if 'AZ' in df.columns else 0,
+            "total_records": len(acc),
+            "avg_acc_x": float(acc[:, 0].mean()) if len(acc) else 0,
+            "avg_acc_y": float(acc[:, 1].mean()) if len(acc) else 0,
+            "avg_acc_z": float(acc[:, 2].mean()) if len(acc) else 0,
+            "strokes_detected": len(strokes),
+            "duplicate_rows": stream.state()["duplicate_rows"],
             "analysis_summary": "数据分析完成"
         }
-        
-        return {
+
+        return json.dumps({
             "success": True,
-            "file_analysis": stats
-        }
-        
+            "file_analysis": stats,
+            "strokes": strokes
+        }, ensure_ascii=False)
+
     except Exception as e:
-        return {
-            "success": False,
-            "error": str(e)
-        }
+        return _error(e)
+
+
+def _error(e):
+    return json.dumps({
+        "success": False,
+        "error": str(e),
+        "timestamp": datetime.now().isoformat()
+    }, ensure_ascii=False)
@@ -0,0 +1,124 @@
+"""
+分析各阶段的内存分配统计（tracemalloc）
+
+默认关闭；打开后每个阶段记录:
+    peak_bytes   阶段内相对阶段开始时的最高额外分配（临时数组、字符串拆分等都计入）
+    net_bytes    阶段结束时仍然存活的新增分配（传给下一阶段的数组）
+    duration_ms  阶段耗时（开启 tracemalloc 后会变慢，只用于相对比较）
+
+numpy 的数组内存也会上报给 tracemalloc。tracemalloc 是进程级的，
+并发请求同时开启时数字会互相叠加，只适合排查和基准测试时使用。
+"""
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+from logger import setup_logger
+
+logger = setup_logger('memory_profile')
+
+# 设置 ANALYSIS_PROFILE_MEMORY=1 时所有分析都开启（结果写日志），否则只有请求中显式要求时才开启
+PROFILE_BY_DEFAULT = os.environ.get('ANALYSIS_PROFILE_MEMORY') == '1'
+
+# 多个分析同时开启时共用一次 tracemalloc.start()，最后一个结束时才 stop()
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class StageProfiler:
+    """
+    分阶段的内存分配记录
+
+    用法:
+        profiler = StageProfiler(enabled=True)
+        with profiler:
+            with profiler.stage('parse'):
+                ...
+        profiler.report()
+
+    enabled=False 时 stage() 什么都不做，可以无条件地包在热路径上
+    """
+
+    def __init__(self, enabled: bool = True, samples: Optional[int] = None):
+        self.enabled = enabled
+        self.samples = samples
+        self.stages = []
+        self._baseline = 0
+        self._peak = 0
+        self._active = False
+
+    def __enter__(self):
+        if self.enabled and not self._active:
+            _start_tracing()
+            self._active = True
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc):
+        if self._active:
+            self._active = False
+            _stop_tracing()
+        return False
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self._active:
+            yield
+            return
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.stages.append({
+                "stage": name,
+                "peak_bytes": peak - before,
+                "net_bytes": current - before,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2)
+            })
+            self._peak = max(self._peak, peak - self._baseline)
+
+    def report(self) -> Optional[Dict[str, Any]]:
+        """各阶段统计和总峰值；未开启时返回None"""
+        if not self.enabled:
+            return None
+        report = {
+            "peak_bytes": self._peak,
+            "stages": list(self.stages)
+        }
+        if self.samples:
+            report["samples"] = self.samples
+            report["peak_bytes_per_100k_samples"] = round(self._peak * 100000 / self.samples)
+        return report
+
+    def log(self, label: str):
+        """把报告写到日志（每阶段一行）"""
+        report = self.report()
+        if report is None:
+            return
+        logger.info(f"🧠 {label} 内存峰值 {report['peak_bytes'] / 1e6:.1f} MB"
+                    + (f"（{self.samples} 个数据点）" if self.samples else ""))
+        for stage in report["stages"]:
+            logger.info(f"   {stage['stage']:>10}: 峰值 {stage['peak_bytes'] / 1e6:8.1f} MB, "
+                        f"留存 {stage['net_bytes'] / 1e6:8.1f} MB, {stage['duration_ms']:.1f} ms")
@@ -0,0 +1,315 @@
+"""
+增量击球检测（固定内存环形缓冲）
+
+给 iOS PythonBridge 在手机上实时使用：按批喂入采样点，检测到击球并且击球窗口采满后立即产出
+与服务器相同的击球特征。检测判据直接复用 stroke_core.compute_derived_channels。
+
+带时间戳喂入时与服务器一样去掉重复包、在丢包处分段检测（去重和断点判定逐批进行，
+标称间隔取到目前为止正间隔的中位数，时长/频率类特征也按它换算采样率）；击球下标和窗口仍按原始行计算。
+对同一段数据逐批喂入的结果与 TennisStrokeAnalyzer 整段分析一致（时间戳和特征），
+只要到目前为止的间隔中位数与整段的相同（正常录制中几乎总是相同）。
+
+只依赖 numpy（不需要 pandas），内存占用只取决于窗口长度和批大小，与会话长度无关。
+"""
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+from stroke_core import (compute_derived_channels, parse_sample_times, resolve_dtype,
+                         SIGN_WINDOW_BEFORE, SIGN_WINDOW_AFTER, GAP_AWARE, GAP_FACTOR)
+from stroke_features import DEFAULT_SAMPLE_RATE
+
+# 判定某个点需要向后看的采样点数（符号变化窗口 [i-3, i+3) 作用在 diff 上，需要采样点 i+3）
+LOOKAHEAD = SIGN_WINDOW_AFTER
+
+# 每次送进检测的最大采样点数；更大的批会被拆开，保证环形缓冲容量固定
+DEFAULT_CHUNK_SIZE = 256
+
+# 标称采样间隔用正间隔的直方图求中位数（按毫秒分桶，内存固定）；超过该值的间隔都记在最后一个桶
+STEP_HISTOGRAM_MS = 1000
+
+
+class StrokeStream:
+    """
+    有状态的增量击球分析器
+
+    用法:
+        stream = StrokeStream()
+        for acc, gyro, ang, times in batches:   # 每批 (k, 3) 数组和 k 个时间戳
+            for stroke in stream.push(acc, gyro, ang, times):
+                ...
+        remaining = stream.flush()             # 会话结束：处理最后几个点
+
+    产出的每个击球是与服务器 stroke_analysis 中相同字段的字典，另加 "index"（击球点在会话中的原始行号）；
+    有时间戳时和服务器一样带 offset_s（距会话第一个时间戳的秒数）。
+    stroke_id 为会话内从1开始的序号；末尾窗口采不满的击球和服务器一样被丢弃。
+    第一批决定是否按时间戳处理（有 times 且 ANALYSIS_GAP_AWARE 未关闭），之后每批都要一致。
+    """
+
+    def __init__(self, threshold: float = 300.0, min_gap: int = 75, slice_len: int = 200,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, with_angles: bool = True, dtype=None):
+        self.threshold = threshold
+        self.min_gap = min_gap
+        self.slice_len = slice_len
+        self.chunk_size = chunk_size
+        self.with_angles = with_angles
+        self.dtype = resolve_dtype(dtype)
+
+        # 原始行缓冲（切击球窗口）: 容量 = 一个击球窗口 + 一批 + 检测回看/前瞻余量
+        self.capacity = slice_len + chunk_size + SIGN_WINDOW_BEFORE + LOOKAHEAD + 2
+        self._acc = np.zeros((self.capacity, 3), dtype=self.dtype)
+        self._gyro = np.zeros((self.capacity, 3), dtype=self.dtype)
+        self._ang = np.zeros((self.capacity, 3), dtype=self.dtype) if with_angles else None
+
+        # 去重后的采样点缓冲（检测用）: 一批 + 检测回看/前瞻余量，另记原始行号、时间戳和所在连续段
+        kept_capacity = chunk_size + SIGN_WINDOW_BEFORE + LOOKAHEAD + 2
+        self._kept_acc = np.zeros((kept_capacity, 3), dtype=self.dtype)
+        self._kept_gyro = np.zeros((kept_capacity, 3), dtype=self.dtype)
+        self._kept_row = np.zeros(kept_capacity, dtype=np.int64)
+        self._kept_ms = np.zeros(kept_capacity, dtype=np.int64)
+        self._kept_segment = np.zeros(kept_capacity, dtype=np.int64)
+        self._step_counts = np.zeros(STEP_HISTOGRAM_MS + 1, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """开始新的会话（不重新分配缓冲区）"""
+        self.samples_seen = 0          # 已接收的原始行总数
+        self.kept_seen = 0             # 去重后的采样点总数（没有时间戳时等于 samples_seen）
+        self._next_diff = 0            # 下一个待判定的 diff 下标（去重后的点，对应采样点 diff+1）
+        self._last_raw = None          # 上一个原始检测点（过滤与服务器一致：与上一个原始检测点比较间隔）
+        self._pending: List[Tuple[int, Optional[float]]] = []  # 已检测、等待窗口采满的击球点（原始行号, offset_s）
+        self.strokes_detected = 0
+        self.strokes_dropped = 0       # 重复行过多、窗口已被覆盖而丢弃的击球
+        self._flushed = False
+
+        # 时间线状态（与 stroke_core.build_sample_timeline 的规则相同）
+        self._timed = None             # 第一批决定：是否按时间戳去重、分段
+        self._last_ms = None           # 上一行的时间戳（NaT 沿用前一个有效值）
+        self._first_ms = None          # 会话第一个有效时间戳（offset_s 的起点）
+        self._last_values = None       # 上一行的全部数值（判断重复包）
+        self._last_kept_ms = None      # 上一个保留点的时间戳
+        self._segment = 0              # 当前连续段序号
+        self._step_counts[:] = 0
+
+    # ------------------------------------------------------------
+    # 输入
+    # ------------------------------------------------------------
+    def push(self, acc, gyro, ang=None, times=None) -> List[Dict[str, Any]]:
+        """
+        喂入一批采样点，返回本批内窗口已采满的击球
+
+        参数:
+            acc, gyro: (k, 3) 加速度 / 角速度
+            ang: (k, 3) 角度；创建时 with_angles=False 则忽略
+            times: k 个时间戳（datetime64、"2025-12-11 22:15:37.267" 文本或 Unix 毫秒），可选
+        """
+        if self._flushed:
+            raise RuntimeError("会话已结束，继续喂数据前请先调用 reset()")
+        acc = np.asarray(acc, dtype=self.dtype).reshape(-1, 3)
+        gyro = np.asarray(gyro, dtype=self.dtype).reshape(-1, 3)
+        if len(acc) != len(gyro):
+            raise ValueError(f"加速度和角速度的采样点数不一致: {len(acc)} / {len(gyro)}")
+        if self._ang is not None:
+            if ang is None:
+                raise ValueError("创建时 with_angles=True，需要提供角度数据")
+            ang = np.asarray(ang, dtype=self.dtype).reshape(-1, 3)
+        if self._timed is None:
+            self._timed = times is not None and GAP_AWARE
+        if self._timed:
+            if times is None:
+                raise ValueError("会话开始时提供了时间戳，之后每批都需要提供")
+            times = np.asarray(times)
+            times = (times.astype('datetime64[ms]') if times.dtype.kind == 'M'
+                     else parse_sample_times(times.reshape(-1)))
+            if len(times) != len(acc):
+                raise ValueError(f"时间戳和采样点数不一致: {len(times)} / {len(acc)}")
+
+        strokes = []
+        for start in range(0, len(acc), self.chunk_size):
+            end = start + self.chunk_size
+            self._append(acc[start:end], gyro[start:end], ang[start:end] if self._ang is not None else None,
+                         times[start:end] if self._timed else None)
+            self._detect(final=False)
+            strokes.extend(self._emit())
+        return strokes
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """会话结束：判定最后几个采样点（窗口在末尾截断，与整段分析一致），返回剩余可产出的击球"""
+        if self._flushed:
+            return []
+        self._detect(final=True)
+        strokes = self._emit()
+        self._pending = []
+        self._flushed = True
+        return strokes
+
+    def _append(self, acc, gyro, ang, times):
+        rows = self.samples_seen + np.arange(len(acc))
+        positions = rows % self.capacity
+        self._acc[positions] = acc
+        self._gyro[positions] = gyro
+        if self._ang is not None:
+            self._ang[positions] = ang
+        self.samples_seen += len(acc)
+
+        if times is None:
+            kept = np.ones(len(acc), dtype=bool)
+            segments = np.full(len(acc), self._segment, dtype=np.int64)
+            kept_ms = 0
+        else:
+            kept, segments, kept_ms = self._timeline(acc, gyro, ang, times)
+
+        positions = (self.kept_seen + np.arange(int(kept.sum()))) % len(self._kept_row)
+        self._kept_acc[positions] = acc[kept]
+        self._kept_gyro[positions] = gyro[kept]
+        self._kept_row[positions] = rows[kept]
+        self._kept_ms[positions] = kept_ms
+        self._kept_segment[positions] = segments
+        self.kept_seen += len(positions)
+
+    def _timeline(self, acc, gyro, ang, times):
+        """
+        本批的去重和断点判定，返回 (保留标记, 每个保留点的连续段序号, 每个保留点的时间戳)
+
+        规则同 build_sample_timeline: 时间戳和所有数值都与上一行相同的是重复包；
+        去重后相邻两点时间戳倒退，或间隔超过 GAP_FACTOR × 标称间隔时断开。
+        还没有出现有效时间戳时只按数值去重（整个会话都没有有效时间戳时服务器不去重，这是唯一的差别）
+        """
+        # NaT 沿用前一个有效时间戳；会话开头的 NaT 沿用第一个有效时间戳
+        ms = times.astype(np.int64)
+        valid = ~np.isnat(times)
+        if self._last_ms is None and valid.any():
+            self._last_ms = int(ms[np.argmax(valid)])
+            # 之前的点都沿用第一个有效时间戳
+            self._first_ms = self._last_ms
+            self._kept_ms[:] = self._first_ms
+            if self._last_kept_ms is not None:
+                self._last_kept_ms = self._last_ms
+        last = np.maximum.accumulate(np.where(valid, np.arange(len(ms)), -1))
+        fallback = self._last_ms if self._last_ms is not None else 0
+        ms = np.where(last >= 0, ms[np.maximum(last, 0)], fallback)
+
+        values = np.hstack([channel for channel in (acc, gyro, ang) if channel is not None])
+        first = self._last_values if self._last_values is not None else values[0]
+        previous = np.vstack((first, values[:-1]))
+        duplicate = (np.diff(ms, prepend=fallback) == 0) & np.all(values == previous, axis=1)
+        if self._last_values is None:
+            duplicate[0] = False  # 会话第一行
+        self._last_ms = int(ms[-1]) if self._last_ms is not None else None
+        self._last_values = values[-1].copy()
+
+        kept_ms = ms[~duplicate]
+        if len(kept_ms) == 0:
+            return ~duplicate, np.zeros(0, dtype=np.int64), kept_ms
+        step = np.diff(kept_ms, prepend=kept_ms[0] if self._last_kept_ms is None else self._last_kept_ms)
+        self._last_kept_ms = int(kept_ms[-1])
+
+        positive = step[step > 0]
+        np.add.at(self._step_counts, np.minimum(positive, STEP_HISTOGRAM_MS), 1)
+        interval = self._median_step()
+        breaks = step < 0
+        if interval > 0:
+            breaks |= step > GAP_FACTOR * interval
+        segments = self._segment + np.cumsum(breaks)
+        self._segment = int(segments[-1])
+        return ~duplicate, segments, kept_ms
+
+    def _median_step(self) -> float:
+        """到目前为止正间隔的中位数（与 np.median 相同：偶数个时取中间两个的平均）"""
+        total = int(self._step_counts.sum())
+        if total == 0:
+            return 0.0
+        cumulative = np.cumsum(self._step_counts)
+        low = np.searchsorted(cumulative, (total - 1) // 2 + 1)
+        high = np.searchsorted(cumulative, total // 2 + 1)
+        return (low + high) / 2.0
+
+    def _window(self, buffer, start, end):
+        """取出绝对下标 [start, end) 的数据（调用方保证仍在缓冲区内）"""
+        return buffer[np.arange(start, end) % len(buffer)]
+
+    # ------------------------------------------------------------
+    # 检测
+    # ------------------------------------------------------------
+    def _detect(self, final: bool):
+        n = self.kept_seen
+        # 非最终批只判定前瞻已经到齐的点（断点也要等下一个点到达才知道）；最终批判定到末尾
+        last_diff = n - 2 if final else n - 1 - LOOKAHEAD
+        if last_diff < self._next_diff:
+            return
+
+        # 从第一个待判定点往前 SIGN_WINDOW_BEFORE 个点开始算派生通道：
+        # 片段起点处的窗口截断与整段计算时的截断（或不截断）结果相同
+        seg_start = max(0, self._next_diff - SIGN_WINDOW_BEFORE)
+        segments = self._window(self._kept_segment, seg_start, n)
+        timeline = {
+            # 缓冲区里已经是去重后的点，只需要片段内各连续段的起点
+            "sample_index": np.arange(n - seg_start),
+            "segment_starts": np.concatenate(([0], np.flatnonzero(np.diff(segments)) + 1))
+        }
+        derived = compute_derived_channels(self._window(self._kept_gyro, seg_start, n),
+                                           self._window(self._kept_acc, seg_start, n), timeline)
+        offset = self._next_diff - seg_start
+        count = last_diff - self._next_diff + 1
+        mask = ((derived["gyro_diff_max"][offset:offset + count] > self.threshold)
+                & derived["has_sign_change"][offset:offset + count])
+
+        # 去重后的点换回原始行号（过滤和窗口都按原始行，与服务器一致）
+        points = (np.flatnonzero(mask) + self._next_diff + 1) % len(self._kept_row)
+        offsets = ((self._kept_ms[points] - self._first_ms) / 1000.0).tolist() if self._first_ms is not None else None
+        for i, point in enumerate(self._kept_row[points].tolist()):
+            if self._last_raw is None or point - self._last_raw >= self.min_gap:
+                self._pending.append((point, offsets[i] if offsets is not None else None))
+            self._last_raw = point
+        self._next_diff = last_diff + 1
+
+    def _emit(self) -> List[Dict[str, Any]]:
+        """产出窗口已采满的击球，丢弃窗口起点在会话开始之前的"""
+        half = self.slice_len // 2
+        ready = []
+        while self._pending and self._pending[0][0] - half + self.slice_len <= self.samples_seen:
+            point, offset = self._pending.pop(0)
+            if point - half < 0:
+                continue
+            if self.samples_seen - (point - half) > self.capacity:
+                # 检测前瞻内的重复行太多，窗口开头已被覆盖
+                self.strokes_dropped += 1
+                continue
+            ready.append((point, offset))
+        if not ready:
+            return []
+
+        # 延迟导入：只在真的要计算特征时加载
+        from tennis_stroke_analyzer import TennisStrokeAnalyzer
+
+        index = [np.arange(p - half, p - half + self.slice_len) % self.capacity for p, _ in ready]
+        acc_windows = self._acc[index]
+        gyro_windows = self._gyro[index]
+        ang_windows = self._ang[index] if self._ang is not None else None
+        # 时长/频率类特征按到目前为止的标称间隔换算采样率（与服务器一样，没有时间戳时用默认值）
+        interval = self._median_step() if self._timed else 0.0
+        sample_rate = 1000.0 / interval if interval > 0 else DEFAULT_SAMPLE_RATE
+        offsets = [offset for _, offset in ready]
+        strokes = TennisStrokeAnalyzer()._analyze_strokes(
+            acc_windows, gyro_windows, ang_windows, sample_rate=sample_rate,
+            offsets=offsets if None not in offsets else None)
+
+        for stroke, (point, _) in zip(strokes, ready):
+            self.strokes_detected += 1
+            stroke["stroke_id"] = self.strokes_detected
+            stroke["index"] = point
+        return strokes
+
+    def state(self) -> Dict[str, Any]:
+        """当前状态（调试和界面显示用）"""
+        return {
+            "samples_seen": self.samples_seen,
+            "duplicate_rows": self.samples_seen - self.kept_seen,
+            "segments": self._segment + 1 if self.kept_seen else 0,
+            "strokes_detected": self.strokes_detected,
+            "strokes_dropped": self.strokes_dropped,
+            "pending_strokes": len(self._pending),
+            "buffer_capacity": self.capacity,
+            "buffer_bytes": sum(b.nbytes for b in (self._acc, self._gyro, self._ang, self._kept_acc, self._kept_gyro,
+                                                   self._kept_row, self._kept_ms, self._kept_segment, self._step_counts)
+                                if b is not None)
+        }
@@ -0,0 +1,332 @@
+import numpy as np
+import json
+import math
+from datetime import datetime
+from typing import Dict, List, Any
+import io
+import sys
+from logger import setup_logger
+from stroke_core import (load_imu_csv, detect_stroke_timestamps, filter_timestamps,
+                         extract_stroke_windows, stroke_window_index, plot_stroke_windows, resolve_dtype,
+                         build_sample_timeline, compute_derived_channels, timeline_quality,
+                         sample_offsets_s)
+from stroke_features import extract_stroke_features, DEFAULT_SAMPLE_RATE
+from memory_profile import StageProfiler, PROFILE_BY_DEFAULT
+
+# 创建日志器
+logger = setup_logger('tennis_analyzer')
+
+# 每个击球输出的特征字段（stroke_id 在前、estimated_type 在后；没有角度数据时不含 orientation_*）
+STROKE_FEATURE_COLUMNS = (
+    "peak_acceleration", "peak_rotation", "avg_acceleration", "avg_rotation", "stroke_power",
+    "duration_points", "swing_duration_s", "time_to_peak_s", "peak_acc_axes", "peak_gyro_axes",
+    "peak_jerk", "spectral_energy", "dominant_frequency_hz",
+    "orientation_change_axes", "orientation_change_deg"
+)
+
+class TennisStrokeAnalyzer:
+    """网球击球检测分析器"""
+    
+    def __init__(self):
+        self.version = "1.0.0"
+    
+    def analyze_stroke_from_csv_content(self, csv_content: str, threshold: float = 300.0, 
+                                       slice_len: int = 200, plot: bool = False,
+                                       dtype=None, layout: str = 'rows',
+                                       profile_memory=None) -> Dict[str, Any]:
+        """
+        从CSV文本内容分析网球击球
+        
+        参数:
+            csv_content: CSV格式的文本内容
+            threshold: 击球检测阈值 (默认300)
+            slice_len: 击球窗口长度 (默认200个数据点)
+            plot: 是否生成图表 (在服务器中通常设为False)
+            dtype: 计算精度 'float64' / 'float32' (默认取 ANALYSIS_DTYPE 环境变量，未设置为float64)
+            layout: 击球结果布局 'rows'（每个击球一个字典）/ 'columnar'（每个特征一个数组）
+            profile_memory: 记录各阶段内存分配，结果放在 analysis_info.memory_profile
+                            (默认取 ANALYSIS_PROFILE_MEMORY 环境变量)
+        
+        返回:
+            分析结果字典
+        """
+        start_time = datetime.now()
+        profiler = StageProfiler(PROFILE_BY_DEFAULT if profile_memory is None else bool(profile_memory))
+        
+        with profiler:
+            try:
+                dtype = resolve_dtype(dtype)
+                
+                # 1. 从CSV文本加载数据（解析、检测、特征计算全程使用同一精度）
+                with profiler.stage('parse'):
+                    acc_data, gyro_data, ang_data, times = self._load_csv_from_string(csv_content, dtype,
+                                                                                      with_times=True)
+                
+            except Exception as e:
+                logger.info(f"❌ 击球分析错误: {str(e)}")
+                return {
+                    "success": False,
+                    "error": f"击球分析失败: {str(e)}",
+                    "timestamp": datetime.now().isoformat()
+                }
+            
+            result = self.analyze_arrays(acc_data, gyro_data, ang_data, threshold, slice_len, plot,
+                                         layout=layout, start_time=start_time, profiler=profiler, times=times)
+        
+        if profiler.enabled and result.get("success"):
+            profiler.samples = len(acc_data)
+            result["analysis_info"]["memory_profile"] = profiler.report()
+            profiler.log("击球分析")
+        return result
+    
+    def analyze_arrays(self, acc_data, gyro_data, ang_data=None, threshold: float = 300.0,
+                       slice_len: int = 200, plot: bool = False, layout: str = 'rows',
+                       derived=None, start_time=None, profiler=None, times=None) -> Dict[str, Any]:
+        """
+        分析已解析的传感器数组（会话重新分析时跳过CSV解析）
+        
+        参数:
+            acc_data, gyro_data, ang_data: load_imu_csv 的返回值
+            derived: 预先计算的逐点通道（session_arrays.compute_session_arrays 的结果），
+                     有则检测只做阈值比较、特征直接切片模长，不传时现场计算
+            profiler: StageProfiler，记录检测 / 切片 / 特征各阶段的内存分配
+            times: 每行的时间戳（datetime64[ms]），没有 derived 时用来去掉重复包、在丢包处分段检测
+            其余参数同 analyze_stroke_from_csv_content
+        """
+        start_time = start_time or datetime.now()
+        profiler = profiler or StageProfiler(enabled=False)
+        
+        try:
+            if layout not in ('rows', 'columnar'):
+                raise ValueError(f"不支持的布局: {layout}")
+            
+            if len(acc_data) == 0:
+                return {
+                    "success": False,
+                    "error": "CSV中没有有效数据",
+                    "timestamp": datetime.now().isoformat()
+                }
+            
+            logger.info(f"📊 加载数据: {len(acc_data)} 个数据点")
+            
+            # 2. 检测击球时间戳（有时间戳时按连续段检测）
+            with profiler.stage('detect'):
+                if derived is None and times is not None:
+                    timeline = build_sample_timeline(times, acc_data, gyro_data, ang_data)
+                    if timeline is not None:
+                        derived = compute_derived_channels(gyro_data, acc_data, timeline)
+                timestamps = self._detect_stroke_timestamps(gyro_data, acc_data, threshold, derived)
+            logger.info(f"🎾 原始检测到 {len(timestamps)} 个击球点")
+            
+            data_quality = None
+            sample_rate = DEFAULT_SAMPLE_RATE
+            if derived is not None and "sample_index" in derived:
+                data_quality = timeline_quality(derived, len(acc_data))
+                if float(derived["sample_interval_ms"]) > 0:
+                    # 时长/频率类特征按实测采样率计算
+                    sample_rate = 1000.0 / float(derived["sample_interval_ms"])
+                logger.info(f"📶 数据质量: 重复行 {data_quality['duplicate_rows']}, "
+                            f"丢包 {data_quality['gaps']} 处（约 {data_quality['missing_samples_estimate']} 个点）, "
+                            f"{data_quality['segments']} 个连续段")
+            
+            # 3. 过滤时间戳（避免重复）
+            filtered_timestamps = self._filter_timestamps(timestamps, min_gap=75)
+            logger.info(f"🎾 过滤后剩余 {len(filtered_timestamps)} 个击球点")
+            
+            # 4. 提取击球窗口切片
+            with profiler.stage('windows'):
+                acc_slices, gyro_slices, ang_slices = self._extract_stroke_slices(
+                    acc_data, gyro_data, filtered_timestamps, slice_len, plot, ang=ang_data
+                )
+                magnitudes = None
+                offsets = None
+                if derived is not None:
+                    index = stroke_window_index(filtered_timestamps, slice_len, len(acc_data))
+                    if "acc_magnitude" in derived:
+                        magnitudes = (derived["acc_magnitude"][index], derived["gyro_magnitude"][index])
+                    if "offset_ms" in derived:
+                        # 击球点距会话开始的秒数，按实际时间戳（重复行和丢包不影响）
+                        offsets = sample_offsets_s(derived, index[:, 0] + slice_len // 2)
+            
+            # 5. 分析每个击球的特征，TODO：后面要改成类别/其他分析
+            with profiler.stage('features'):
+                stroke_analysis = self._analyze_strokes(acc_slices, gyro_slices, ang_slices, layout, magnitudes,
+                                                        sample_rate, offsets)
+            
+            # TODO: 存储击球片段，以便其他分析
+
+            # 计算处理时间
+            processing_time = (datetime.now() - start_time).total_seconds() * 1000
+            
+            result = {
+                "success": True,
+                "message": "网球击球分析完成",
+                "data": {
+                    "strokes_detected": len(filtered_timestamps),
+                    "timestamps": filtered_timestamps,
+                    "stroke_analysis": stroke_analysis,
+                    "layout": layout,
+                    "statistics": {
+                        "total_data_points": len(acc_data),
+                        "stroke_rate": f"{len(filtered_timestamps)} strokes",
+                        "data_duration_seconds": len(acc_data) / 5.0,  # 假设5Hz采样率
+                        "average_interval": self._calculate_average_interval(filtered_timestamps)
+                    }
+                },
+                "analysis_info": {
+                    "method": "tennis_stroke_detection",
+                    "threshold_used": threshold,
+                    "window_size": slice_len,
+                    "sample_rate_hz": round(sample_rate, 3),
+                    "dtype": acc_data.dtype.name,
+                    "processing_time_ms": round(processing_time, 2),
+                    "version": self.version
+                },
+                "timestamp": datetime.now().isoformat()
+            }
+            if data_quality is not None:
+                result["data"]["data_quality"] = data_quality
+            return result
+            
+        except Exception as e:
+            logger.info(f"❌ 击球分析错误: {str(e)}")
+            return {
+                "success": False,
+                "error": f"击球分析失败: {str(e)}",
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    def _load_csv_from_string(self, csv_content: str, dtype=None, with_times=False):
+        """从字符串加载CSV数据 - 适配你的CSV格式（解析逻辑见 stroke_core.load_imu_csv）"""
+        logger.info(f"📖 解析CSV内容，总字符数: {len(csv_content)}")
+        return load_imu_csv(csv_content, dtype=dtype, with_times=with_times)
+    
+    def _detect_stroke_timestamps(self, gyro, acc, threshold=300.0, derived=None):
+        """检测击球时间戳"""
+        return detect_stroke_timestamps(gyro, acc, threshold, derived=derived)
+    
+    def _filter_timestamps(self, timestamps, min_gap=75):
+        """过滤时间戳，避免重复检测"""
+        return filter_timestamps(timestamps, min_gap)
+    
+    def _extract_stroke_slices(self, acc, gyro, timestamps, window_size=200, plot=False, ang=None):
+        """
+        提取击球窗口切片
+        
+        返回 (击球数, 窗口长度, 3) 的张量，只保留完整窗口；没有角度数据时 ang 切片为None
+        """
+        acc_slices, gyro_slices, ang_slices = extract_stroke_windows(acc, gyro, timestamps, window_size, ang)
+        
+        if plot:
+            plot_stroke_windows(acc_slices, gyro_slices)
+        
+        return acc_slices, gyro_slices, ang_slices
+    
+    def _analyze_strokes(self, acc_slices, gyro_slices, ang_slices=None, layout='rows', magnitudes=None,
+                         sample_rate=DEFAULT_SAMPLE_RATE, offsets=None):
+        """
+        分析每个击球的特征（所有击球一次性向量化计算）
+        
+        layout='rows' 返回每个击球一个字典的列表；'columnar' 返回 {特征名: 每个击球的值列表}
+        magnitudes 为预先计算的 (加速度模长窗口, 角速度模长窗口)
+        sample_rate 为实际采样率 (Hz)，用于挥拍时长、急动度、主频等特征
+        offsets 为每个击球点距会话开始的秒数（有时间戳时），输出为 offset_s 字段
+        """
+        if len(acc_slices) == 0:
+            return {} if layout == 'columnar' else []
+        
+        acc_magnitude, gyro_magnitude = magnitudes if magnitudes is not None else (None, None)
+        features = extract_stroke_features(acc_slices, gyro_slices, ang_slices, sample_rate=sample_rate,
+                                           acc_magnitude=acc_magnitude, gyro_magnitude=gyro_magnitude)
+        n_strokes = len(acc_slices)
+        
+        # 一次性转换为Python类型，避免逐个 float()；字段顺序与逐击球字典一致
+        columns = {"stroke_id": list(range(1, n_strokes + 1))}
+        if offsets is not None:
+            columns["offset_s"] = np.asarray(offsets, dtype=np.float64).tolist()
+        for name in STROKE_FEATURE_COLUMNS:
+            if name == "duration_points":
+                columns[name] = [acc_slices.shape[1]] * n_strokes
+            elif name in features:
+                columns[name] = features[name].tolist()
+        
+        # 判断击球类型（简化版）
+        columns["estimated_type"] = self._classify_stroke_types(
+            features["peak_acceleration"], features["peak_rotation"]).tolist()
+        
+        if layout == 'columnar':
+            return columns
+        
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+    
+    def _classify_stroke_types(self, peak_acc, peak_rot):
+        """根据峰值加速度和角速度判断击球类型（按击球向量化）"""
+        return np.select(
+            [(peak_acc < 2.0) & (peak_rot < 200), (peak_acc < 5.0) & (peak_rot < 500), peak_acc < 8.0],
+            ["轻击/短球", "正常击球", "强力击球"],
+            default="非常强力击球"
+        )
+    
+    def _calculate_average_interval(self, timestamps):
+        """计算平均击球间隔"""
+        if len(timestamps) < 2:
+            return "N/A"
+        
+        intervals = [timestamps[i] - timestamps[i-1] for i in range(1, len(timestamps))]
+        avg_interval = np.mean(intervals)
+        
+        # 转换为秒（假设5Hz采样率）
+        avg_seconds = avg_interval / 5.0
+        return f"{avg_seconds:.1f}秒"
+    
+    def process_single_imu_csv(self, csv_path, threshold=300, slice_len=200, plot=False):
+        """
+        兼容原函数的接口（从文件路径读取）
+        """
+        with open(csv_path, mode="r", newline="", encoding="utf-8") as f:
+            csv_content = f.read()
+        
+        return self.analyze_stroke_from_csv_content(csv_content, threshold, slice_len, plot)
+
+# 单例实例
+_stroke_analyzer = TennisStrokeAnalyzer()
+
+# 简化调用接口
+def analyze_tennis_strokes(csv_content: str, threshold: float = 300.0, 
+                          slice_len: int = 200, plot: bool = False, dtype=None,
+                          layout: str = 'rows', profile_memory=None) -> Dict[str, Any]:
+    """
+    网球击球分析主函数
+    """
+    return _stroke_analyzer.analyze_stroke_from_csv_content(csv_content, threshold, slice_len, plot, dtype, layout,
+                                                              profile_memory)
+
+def analyze_tennis_arrays(acc, gyro, ang=None, threshold: float = 300.0, slice_len: int = 200,
+                          derived=None, layout: str = 'rows', profiler=None, times=None) -> Dict[str, Any]:
+    """
+    对已解析的数组做网球击球分析（上传时与预计算通道共用一次解析，重新分析时直接读取缓存的数组）
+    """
+    return _stroke_analyzer.analyze_arrays(acc, gyro, ang, threshold, slice_len, layout=layout, derived=derived,
+                                           profiler=profiler, times=times)
+
+def load_sensor_csv(csv_content: str, dtype=None, with_times: bool = False):
+    """
+    解析CSV文本，返回 (acc, gyro, ang) 数组，供其他分析模块复用
+    with_times=True 时返回 (acc, gyro, ang, times)，times 为每行的 datetime64[ms] 时间戳
+    """
+    return _stroke_analyzer._load_csv_from_string(csv_content, dtype, with_times=with_times)
+
+# 测试函数
+if __name__ == "__main__":
+    # 创建测试CSV数据
+    test_csv = """Timestamp,DeviceName,Mac,AX,AY,AZ,GX,GY,GZ,AngX,AngY,AngZ,HX,HY,HZ,Electric,Temp
+2024-01-01 10:00:00.000,Device1,AA:BB:CC:DD:EE:FF,0.1,0.2,0.9,10.2,8.3,5.1,5.2,3.1,12.5,0,0,0,100,25
+2024-01-01 10:00:00.200,Device1,AA:BB:CC:DD:EE:FF,0.2,0.1,0.8,15.1,9.2,6.3,5.3,3.2,12.6,0,0,0,100,25
+2024-01-01 10:00:00.400,Device1,AA:BB:CC:DD:EE:FF,0.3,0.3,1.2,350.5,280.3,310.2,5.1,3.0,12.4,0,0,0,100,25
+2024-01-01 10:00:00.600,Device1,AA:BB:CC:DD:EE:FF,0.4,0.2,1.1,320.1,290.4,305.8,5.4,3.3,12.7,0,0,0,100,25
+2024-01-01 10:00:00.800,Device1,AA:BB:CC:DD:EE:FF,0.2,0.3,0.9,20.3,15.2,12.1,5.0,2.9,12.3,0,0,0,100,25"""
+    
+    result = analyze_tennis_strokes(test_csv, threshold=300, plot=False)
+    logger.info("🎾 网球击球分析测试结果:")
+    logger.info(json.dumps(result, indent=2, ensure_ascii=False))
\ No newline at end of file
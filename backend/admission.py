@@ -0,0 +1,195 @@
+import functools
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from flask import request, jsonify
+
+# 小于该大小的请求优先出队（手机端短录音、单次分析），大文件上传排在后面
+SMALL_PAYLOAD_BYTES = 256 * 1024
+
+# 等待时间分位数只统计最近这么多次
+WAIT_SAMPLES = 1024
+
+
+class Saturated(Exception):
+    """排队已满或等待超时，调用方应返回 429 并在 retry_after 秒后重试"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    单个接口的并发准入控制
+
+    同时最多 max_concurrent 个请求执行；其余请求进入有界等待队列，
+    按 (是否小请求, 到达顺序) 出队，超过 max_wait 秒仍未轮到则放弃。
+    队列已满时立即拒绝，不让突发请求把所有核心都占满、拖慢已经在执行的请求。
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_wait: float = 5.0,
+                 small_payload_bytes: int = SMALL_PAYLOAD_BYTES):
+        self.name = name
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = max_wait
+        self.small_payload_bytes = small_payload_bytes
+
+        self._cond = threading.Condition()
+        self._waiters = []  # 堆: (优先级, 序号)
+        self._sequence = itertools.count()
+        self._in_flight = 0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_queue_depth = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._service_avg = None  # 执行耗时的指数移动平均（秒）
+
+    @classmethod
+    def from_env(cls, name: str) -> 'AdmissionController':
+        """
+        从环境变量读取限制（接口专用的 ADMISSION_<NAME>_* 优先于通用的 ADMISSION_*）:
+            MAX_CONCURRENT    同时执行数，默认CPU核数
+            MAX_QUEUE         等待队列长度，默认 2 × 同时执行数
+            MAX_WAIT_S        最长排队秒数，默认5
+            SMALL_PAYLOAD_KB  小请求阈值，默认256
+        """
+        def setting(key, default):
+            value = os.environ.get(f'ADMISSION_{name.upper()}_{key}', os.environ.get(f'ADMISSION_{key}'))
+            return float(value) if value not in (None, '') else default
+
+        max_concurrent = int(setting('MAX_CONCURRENT', os.cpu_count() or 1))
+        return cls(
+            name,
+            max_concurrent=max_concurrent,
+            max_queue=int(setting('MAX_QUEUE', 2 * max_concurrent)),
+            max_wait=setting('MAX_WAIT_S', 5.0),
+            small_payload_bytes=int(setting('SMALL_PAYLOAD_KB', SMALL_PAYLOAD_BYTES / 1024) * 1024)
+        )
+
+    def acquire(self, payload_bytes: int = 0) -> float:
+        """
+        获取执行名额，返回排队等待的秒数；排不上时抛出 Saturated
+        """
+        start = time.monotonic()
+        with self._cond:
+            if self._in_flight < self.max_concurrent and not self._waiters:
+                self._in_flight += 1
+                self.admitted += 1
+                self._waits.append(0.0)
+                return 0.0
+
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise Saturated("队列已满", self._retry_after())
+
+            priority = 0 if payload_bytes <= self.small_payload_bytes else 1
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            self.peak_queue_depth = max(self.peak_queue_depth, len(self._waiters))
+
+            deadline = start + self.max_wait
+            while not (self._waiters[0] == ticket and self._in_flight < self.max_concurrent):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                    self.timed_out += 1
+                    self._cond.notify_all()  # 队首可能变了
+                    raise Saturated("排队超时", self._retry_after())
+                self._cond.wait(remaining)
+
+            heapq.heappop(self._waiters)
+            self._in_flight += 1
+            self.admitted += 1
+            waited = time.monotonic() - start
+            self._waits.append(waited)
+            self._cond.notify_all()  # 还有空余名额时让下一个也出队
+            return waited
+
+    def release(self, service_seconds: Optional[float] = None):
+        """归还名额；service_seconds 用于估算 Retry-After"""
+        with self._cond:
+            self._in_flight -= 1
+            if service_seconds is not None:
+                self._service_avg = (service_seconds if self._service_avg is None
+                                     else 0.8 * self._service_avg + 0.2 * service_seconds)
+            self._cond.notify_all()
+
+    def _retry_after(self) -> int:
+        """按平均执行耗时估算排在当前队列之后需要等待的秒数"""
+        service = self._service_avg if self._service_avg is not None else 1.0
+        return max(1, math.ceil(service * (len(self._waiters) + 1) / self.max_concurrent))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._waits)
+            in_flight = self._in_flight
+            queue_depth = len(self._waiters)
+
+        def percentile(q):
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 2) if waits else None
+
+        return {
+            "name": self.name,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait,
+            "small_payload_bytes": self.small_payload_bytes,
+            "in_flight": in_flight,
+            "queue_depth": queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 2) if waits else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(waits[-1] * 1000, 2) if waits else None
+            },
+            "service_ms_avg": round(self._service_avg * 1000, 2) if self._service_avg is not None else None
+        }
+
+
+def admission_limited(controller: AdmissionController):
+    """
+    Flask 接口装饰器：按请求体大小排队，排不上时返回 429 + Retry-After
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                waited = controller.acquire(request.content_length or 0)
+            except Saturated as e:
+                response = jsonify({
+                    "success": False,
+                    "error": f"服务器繁忙（{e.reason}），请 {e.retry_after} 秒后重试",
+                    "retry_after": e.retry_after,
+                    "timestamp": datetime.now().isoformat()
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+
+            start = time.monotonic()
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                controller.release(time.monotonic() - start)
+            if waited > 0:
+                print(f"⏳ {controller.name} 排队 {waited * 1000:.0f}ms")
+            return response
+        return wrapper
+    return decorator
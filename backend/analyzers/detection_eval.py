@@ -0,0 +1,243 @@
+"""
+击球检测准确率评估
+
+标注格式（与会话CSV放在同一目录，文件名为 <会话名>_labels.json）:
+    {
+        "csv_file": "session_20251211_221542_33767179.csv",
+        "sample_rate": 200.0,
+        "reviewed": true,
+        "strokes": [
+            {"index": 412, "type": "正手"},
+            {"index": 980}
+        ]
+    }
+
+index 是击球点在CSV数据行中的下标（不含表头，从0开始），与分析结果中的 timestamps 一致；
+sample_rate 为该会话的采样率 (Hz)，必填，用于把毫秒容差换算成采样点；type 可选。reviewed 为 false 的标注（例如由 --bootstrap 从检测结果生成、尚未人工核对的）
+默认不参与评估。
+
+检测器统一为 detector(csv_content) -> 击球下标列表，可以是 "模块:函数" 形式的任意实现。
+"""
+import importlib
+import json
+import os
+import time
+import numpy as np
+from typing import Callable, Dict, Any, List, Optional, Sequence
+from logger import setup_logger
+from stroke_core import load_imu_csv, build_sample_timeline
+
+# 创建日志器
+logger = setup_logger('detection_eval')
+
+LABELS_SUFFIX = '_labels.json'
+
+# 默认时间容差（毫秒），按每个标注文件的 sample_rate 换算成采样点
+DEFAULT_TOLERANCE_MS = 1000.0
+
+
+def load_labels(labels_path: str) -> Dict[str, Any]:
+    """读取并校验标注文件，strokes 按下标排序"""
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+
+    if 'csv_file' not in labels or not isinstance(labels.get('strokes'), list):
+        raise ValueError(f"标注文件缺少 csv_file 或 strokes: {labels_path}")
+    for stroke in labels['strokes']:
+        if not isinstance(stroke.get('index'), int) or stroke['index'] < 0:
+            raise ValueError(f"无效的击球下标 {stroke.get('index')!r}: {labels_path}")
+
+    sample_rate = labels.get('sample_rate')
+    if isinstance(sample_rate, bool) or not isinstance(sample_rate, (int, float)) or sample_rate <= 0:
+        raise ValueError(f"标注文件缺少有效的 sample_rate: {labels_path}")
+
+    labels['strokes'] = sorted(labels['strokes'], key=lambda s: s['index'])
+    labels.setdefault('reviewed', True)
+    return labels
+
+
+def find_labeled_sessions(folder: str, include_unreviewed: bool = False) -> List[Dict[str, Any]]:
+    """列出目录中所有带标注的会话：[{labels_path, csv_path, labels}]"""
+    sessions = []
+    for filename in sorted(os.listdir(folder)):
+        if not filename.endswith(LABELS_SUFFIX):
+            continue
+        labels_path = os.path.join(folder, filename)
+        try:
+            labels = load_labels(labels_path)
+        except (ValueError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️  跳过标注文件 {filename}: {e}")
+            continue
+        if not labels['reviewed'] and not include_unreviewed:
+            continue
+        csv_path = os.path.join(folder, labels['csv_file'])
+        if not os.path.exists(csv_path):
+            logger.warning(f"⚠️  标注对应的CSV不存在: {labels['csv_file']}")
+            continue
+        sessions.append({"labels_path": labels_path, "csv_path": csv_path, "labels": labels})
+    return sessions
+
+
+def tolerance_samples(tolerance_ms: float, sample_rate: float) -> int:
+    """毫秒容差换算成采样点（四舍五入）"""
+    return max(0, int(round(tolerance_ms * sample_rate / 1000.0)))
+
+
+def match_detections(predicted: Sequence[int], truth: Sequence[int], tolerance: int) -> Dict[str, int]:
+    """
+    在时间容差内一对一匹配检测结果和标注
+
+    两者都按下标排序后做双指针贪心匹配：每个检测点最多匹配一个标注，
+    |检测 - 标注| <= tolerance（采样点）视为命中
+    """
+    predicted = np.sort(np.asarray(predicted, dtype=np.int64))
+    truth = np.sort(np.asarray(truth, dtype=np.int64))
+
+    i = j = matched = 0
+    while i < len(predicted) and j < len(truth):
+        delta = predicted[i] - truth[j]
+        if abs(delta) <= tolerance:
+            matched += 1
+            i += 1
+            j += 1
+        elif delta < 0:
+            i += 1
+        else:
+            j += 1
+
+    return {
+        "true_positives": matched,
+        "false_positives": len(predicted) - matched,
+        "false_negatives": len(truth) - matched
+    }
+
+
+def precision_recall(counts: Dict[str, int]) -> Dict[str, float]:
+    """由命中/误检/漏检计算 precision、recall、F1（没有检测也没有标注时都记为1）"""
+    tp, fp, fn = counts["true_positives"], counts["false_positives"], counts["false_negatives"]
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+# ============================================================
+# 检测器
+# ============================================================
+def tennis_stroke_analyzer_detector(threshold: float = 300.0, slice_len: int = 200) -> Callable[[str], List[int]]:
+    """服务器上的完整分析流程（解析 + 检测 + 过滤 + 特征分析）"""
+    from tennis_stroke_analyzer import TennisStrokeAnalyzer
+
+    analyzer = TennisStrokeAnalyzer()
+
+    def detect(csv_content: str) -> List[int]:
+        result = analyzer.analyze_stroke_from_csv_content(csv_content, threshold=threshold,
+                                                          slice_len=slice_len, plot=False)
+        if not result.get('success'):
+            raise RuntimeError(result.get('error'))
+        return result['data']['timestamps']
+
+    return detect
+
+
+def load_detector(spec: str) -> Callable[[str], List[int]]:
+    """
+    按名称加载检测器
+
+    "tennis_stroke_analyzer" 为默认实现；其他实现用 "模块:函数" 指定，
+    函数签名为 detector(csv_content) -> 击球下标列表
+    """
+    if spec == 'tennis_stroke_analyzer':
+        return tennis_stroke_analyzer_detector()
+    module_name, _, func_name = spec.partition(':')
+    if not func_name:
+        raise ValueError(f"检测器格式应为 模块:函数，实际为 {spec!r}")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def evaluate_detector(detector: Callable[[str], List[int]], sessions: List[Dict[str, Any]],
+                      tolerance_ms: float = DEFAULT_TOLERANCE_MS, repeat: int = 1) -> Dict[str, Any]:
+    """
+    在带标注的会话上评估检测器（容差按各会话标注的 sample_rate 换算成采样点）
+
+    返回每个会话和总体的 precision/recall/F1，以及吞吐量（采样点/秒，取 repeat 次中最快一次，
+    CSV读取不计时，解析计入检测器耗时）
+    """
+    per_session = []
+    totals = {"true_positives": 0, "false_positives": 0, "false_negatives": 0}
+    total_samples = 0
+    total_seconds = 0.0
+
+    for session in sessions:
+        with open(session["csv_path"], 'r', encoding='utf-8') as f:
+            csv_content = f.read()
+        samples = csv_content.strip().count('\n')  # 数据行数（不含表头）
+
+        best = float('inf')
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            predicted = detector(csv_content)
+            best = min(best, time.perf_counter() - start)
+
+        truth = [stroke['index'] for stroke in session["labels"]["strokes"]]
+        tolerance = tolerance_samples(tolerance_ms, session["labels"]["sample_rate"])
+        counts = match_detections(predicted, truth, tolerance)
+        for key in totals:
+            totals[key] += counts[key]
+        total_samples += samples
+        total_seconds += best
+
+        per_session.append({
+            "csv_file": os.path.basename(session["csv_path"]),
+            "samples": samples,
+            "labeled": len(truth),
+            "detected": len(predicted),
+            "tolerance_samples": tolerance,
+            **counts,
+            **precision_recall(counts),
+            "detect_ms": round(best * 1000, 2)
+        })
+
+    return {
+        "tolerance_ms": tolerance_ms,
+        "sessions": per_session,
+        "overall": {
+            **totals,
+            **precision_recall(totals),
+            "samples": total_samples,
+            "samples_per_second": round(total_samples / total_seconds, 1) if total_seconds > 0 else None
+        }
+    }
+
+
+def bootstrap_labels(csv_path: str, detector: Callable[[str], List[int]],
+                     sample_rate: Optional[float] = None) -> str:
+    """
+    用检测结果生成待人工核对的标注模板（reviewed=false），已存在的标注文件不会被覆盖
+
+    sample_rate 不指定时按CSV时间戳的标称间隔计算；时间戳不可用时必须指定
+    """
+    labels_path = csv_path[:-len('.csv')] + LABELS_SUFFIX
+    if os.path.exists(labels_path):
+        raise FileExistsError(labels_path)
+
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        csv_content = f.read()
+    if sample_rate is None:
+        acc, gyro, ang, times = load_imu_csv(csv_content, with_times=True)
+        timeline = build_sample_timeline(times, acc, gyro, ang)
+        interval = float(timeline["sample_interval_ms"]) if timeline is not None else 0.0
+        if interval <= 0:
+            raise ValueError(f"无法从时间戳确定采样率，请指定 sample_rate: {csv_path}")
+        sample_rate = round(1000.0 / interval, 3)
+    predicted = detector(csv_content)
+
+    labels = {
+        "csv_file": os.path.basename(csv_path),
+        "sample_rate": sample_rate,
+        "reviewed": False,
+        "strokes": [{"index": int(index)} for index in predicted]
+    }
+    with open(labels_path, 'w', encoding='utf-8') as f:
+        json.dump(labels, f, ensure_ascii=False, indent=2)
+    return labels_path
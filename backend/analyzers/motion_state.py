@@ -0,0 +1,74 @@
+from typing import Dict, Any
+
+# numpy 只在批量接口中按需导入：单样本接口只用到标准库
+
+# 运动状态及分界阈值（合加速度 < 1.0 静止，< 3.0 行走，其余为剧烈运动）
+MOTION_STATES = ["静止", "行走", "剧烈运动"]
+MOTION_THRESHOLDS = [1.0, 3.0]
+
+# 二进制批量格式：小端 float32，每个样本依次为 acc_x, acc_y, acc_z
+BINARY_SAMPLE_DTYPE = '<f4'
+BINARY_SAMPLE_SIZE = 4
+
+
+def classify_motion_state(magnitude: float) -> str:
+    """根据合加速度判断单个样本的运动状态"""
+    for state, limit in zip(MOTION_STATES, MOTION_THRESHOLDS):
+        if magnitude < limit:
+            return state
+    return MOTION_STATES[-1]
+
+
+def parse_binary_samples(raw: bytes):
+    """把二进制数据块解析为 (样本数, 3) 数组"""
+    import numpy as np
+
+    if len(raw) % (3 * BINARY_SAMPLE_SIZE) != 0:
+        raise ValueError(f"二进制数据长度 {len(raw)} 不是 {3 * BINARY_SAMPLE_SIZE} 字节的整数倍")
+    return np.frombuffer(raw, dtype=BINARY_SAMPLE_DTYPE).reshape(-1, 3)
+
+
+def parse_json_samples(samples):
+    """
+    解析JSON中的样本，支持两种形式:
+        {"acc_x": [...], "acc_y": [...], "acc_z": [...]}  列式
+        [[acc_x, acc_y, acc_z], ...]                        行式
+    """
+    import numpy as np
+
+    if isinstance(samples, dict):
+        columns = [np.asarray(samples.get(key, []), dtype=float) for key in ('acc_x', 'acc_y', 'acc_z')]
+        if len({len(c) for c in columns}) != 1:
+            raise ValueError("acc_x / acc_y / acc_z 长度不一致")
+        return np.column_stack(columns)
+
+    acc = np.asarray(samples, dtype=float)
+    if acc.size == 0:
+        return acc.reshape(0, 3)
+    if acc.ndim != 2 or acc.shape[1] != 3:
+        raise ValueError(f"样本形状应为 (N, 3)，实际为 {acc.shape}")
+    return acc
+
+
+def analyze_motion_batch(acc) -> Dict[str, Any]:
+    """
+    批量计算合加速度和运动状态
+
+    返回:
+        magnitudes: 合加速度数组 (float)
+        states: 状态编码数组 (uint8)，对应 MOTION_STATES 的下标
+        counts: 各状态的样本数
+    """
+    import numpy as np
+
+    acc = np.asarray(acc, dtype=float)
+    magnitudes = np.sqrt(np.einsum('ij,ij->i', acc, acc))
+    # side='right' 与逐个比较的 "<" 语义一致（恰好等于阈值时归入下一档）
+    states = np.searchsorted(MOTION_THRESHOLDS, magnitudes, side='right').astype(np.uint8)
+    counts = np.bincount(states, minlength=len(MOTION_STATES))
+
+    return {
+        "magnitudes": magnitudes,
+        "states": states,
+        "counts": {state: int(counts[i]) for i, state in enumerate(MOTION_STATES)}
+    }
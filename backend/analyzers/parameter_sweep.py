@@ -0,0 +1,197 @@
+"""
+击球检测参数扫描
+
+会话只解析一次，gyro_diff / 符号变化等与参数无关的派生通道只计算一次，
+然后对 threshold × min_gap × slice_len 网格批量求出每组参数的击球数。
+
+命令行用法:
+    python analyzers/parameter_sweep.py session.csv --thresholds 200 300 400 --min-gaps 50 75 --slice-lens 100 200
+"""
+import argparse
+import json
+import sys
+import numpy as np
+from datetime import datetime
+from typing import Dict, Any, Optional, Sequence
+from logger import setup_logger
+from stroke_core import load_imu_csv_file, compute_derived_channels, build_sample_timeline
+
+# 创建日志器
+logger = setup_logger('parameter_sweep')
+
+DEFAULT_THRESHOLDS = [200.0, 250.0, 300.0, 350.0, 400.0]
+DEFAULT_MIN_GAPS = [75]
+DEFAULT_SLICE_LENS = [200]
+
+# 单次扫描允许的最大参数组合数
+MAX_GRID_SIZE = 10000
+
+
+def sweep_stroke_parameters(acc: np.ndarray, gyro: np.ndarray,
+                            thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+                            min_gaps: Sequence[int] = DEFAULT_MIN_GAPS,
+                            slice_lens: Sequence[int] = DEFAULT_SLICE_LENS,
+                            derived: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, Any]:
+    """
+    对参数网格批量统计击球数
+
+    返回:
+        grid: 各维度的参数取值
+        raw_detections: (阈值数,) 过滤前的检测点数
+        strokes_detected: (阈值数, 间隔数) 过滤后的击球数（与 /api/analyze/tennis 的 strokes_detected 一致）
+        full_windows: (阈值数, 间隔数, 窗口数) 能取到完整窗口、会进入特征分析的击球数
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    min_gaps = np.asarray(min_gaps, dtype=np.int64)
+    slice_lens = np.asarray(slice_lens, dtype=np.int64)
+
+    grid_size = len(thresholds) * len(min_gaps) * len(slice_lens)
+    if grid_size == 0:
+        raise ValueError("参数网格为空")
+    if grid_size > MAX_GRID_SIZE:
+        raise ValueError(f"参数组合数 {grid_size} 超过上限 {MAX_GRID_SIZE}")
+
+    if derived is None:
+        derived = compute_derived_channels(gyro, acc)
+
+    n_points = len(acc)
+    halves = slice_lens // 2
+
+    # 与阈值无关：先取出所有满足符号变化条件的候选点，之后每个阈值只做一次比较
+    candidates = np.flatnonzero(derived["has_sign_change"])
+    candidate_diff = derived["gyro_diff_max"][candidates]
+
+    raw_detections = np.zeros(len(thresholds), dtype=np.int64)
+    strokes_detected = np.zeros((len(thresholds), len(min_gaps)), dtype=np.int64)
+    full_windows = np.zeros((len(thresholds), len(min_gaps), len(slice_lens)), dtype=np.int64)
+
+    for ti, threshold in enumerate(thresholds):
+        timestamps = candidates[candidate_diff > threshold] + 1  # +1因为diff减少了索引
+        if "sample_index" in derived:
+            timestamps = derived["sample_index"][timestamps]  # 分段检测：换回原始行号
+        raw_detections[ti] = len(timestamps)
+        if len(timestamps) == 0:
+            continue
+
+        # 所有 min_gap 一次比较：(间隔数, 检测点数) 的保留矩阵
+        gaps = np.diff(timestamps)
+        keep = np.ones((len(min_gaps), len(timestamps)), dtype=bool)
+        keep[:, 1:] = gaps[None, :] >= min_gaps[:, None]
+        strokes_detected[ti] = keep.sum(axis=1)
+
+        # 所有窗口长度一次判断：窗口起点 t - half >= 0 且终点 t - half + len <= N
+        starts = timestamps[None, :] - halves[:, None]
+        in_range = (starts >= 0) & (starts + slice_lens[:, None] <= n_points)
+        full_windows[ti] = keep.astype(np.int64) @ in_range.T.astype(np.int64)
+
+    return {
+        "grid": {
+            "thresholds": thresholds.tolist(),
+            "min_gaps": min_gaps.tolist(),
+            "slice_lens": slice_lens.tolist()
+        },
+        "total_data_points": n_points,
+        "raw_detections": raw_detections,
+        "strokes_detected": strokes_detected,
+        "full_windows": full_windows
+    }
+
+
+def sweep_to_records(sweep: Dict[str, Any]):
+    """把扫描结果展开成每组参数一条记录"""
+    grid = sweep["grid"]
+    records = []
+    for ti, threshold in enumerate(grid["thresholds"]):
+        for gi, min_gap in enumerate(grid["min_gaps"]):
+            for wi, slice_len in enumerate(grid["slice_lens"]):
+                records.append({
+                    "threshold": threshold,
+                    "min_gap": min_gap,
+                    "slice_len": slice_len,
+                    "raw_detections": int(sweep["raw_detections"][ti]),
+                    "strokes_detected": int(sweep["strokes_detected"][ti, gi]),
+                    "full_windows": int(sweep["full_windows"][ti, gi, wi])
+                })
+    return records
+
+
+def run_parameter_sweep(acc: np.ndarray, gyro: np.ndarray,
+                        derived: Optional[Dict[str, np.ndarray]] = None, times: Optional[np.ndarray] = None,
+                        ang: Optional[np.ndarray] = None, **grid) -> Dict[str, Any]:
+    """
+    参数扫描主函数（接口使用）
+
+    derived 为会话预计算的派生通道（session_arrays），有则跳过派生通道计算；
+    没有时按 times（每行时间戳）去重分段后计算，与 /api/analyze/tennis 的检测一致
+    """
+    start_time = datetime.now()
+
+    try:
+        if len(acc) == 0:
+            return {
+                "success": False,
+                "error": "CSV中没有有效数据",
+                "timestamp": datetime.now().isoformat()
+            }
+
+        if derived is None and times is not None:
+            timeline = build_sample_timeline(times, acc, gyro, ang)
+            if timeline is not None:
+                derived = compute_derived_channels(gyro, acc, timeline)
+        sweep = sweep_stroke_parameters(acc, gyro, derived=derived, **grid)
+        records = sweep_to_records(sweep)
+        processing_time = (datetime.now() - start_time).total_seconds() * 1000
+        logger.info(f"🔧 参数扫描完成: {len(records)} 组参数, {processing_time:.1f} ms")
+
+        return {
+            "success": True,
+            "message": "参数扫描完成",
+            "data": {
+                "grid": sweep["grid"],
+                "total_data_points": sweep["total_data_points"],
+                "results": records
+            },
+            "analysis_info": {
+                "method": "tennis_stroke_parameter_sweep",
+                "parameter_sets": len(records),
+                "processing_time_ms": round(processing_time, 2)
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+
+    except Exception as e:
+        logger.info(f"❌ 参数扫描错误: {str(e)}")
+        return {
+            "success": False,
+            "error": f"参数扫描失败: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="击球检测参数扫描")
+    parser.add_argument('csv_path', help="会话CSV文件")
+    parser.add_argument('--thresholds', type=float, nargs='+', default=DEFAULT_THRESHOLDS)
+    parser.add_argument('--min-gaps', type=int, nargs='+', default=DEFAULT_MIN_GAPS)
+    parser.add_argument('--slice-lens', type=int, nargs='+', default=DEFAULT_SLICE_LENS)
+    parser.add_argument('--dtype', choices=['float64', 'float32'], default=None)
+    parser.add_argument('--json', action='store_true', help="输出JSON而不是表格")
+    args = parser.parse_args(argv)
+
+    acc, gyro, ang, times = load_imu_csv_file(args.csv_path, dtype=args.dtype, with_times=True)
+    result = run_parameter_sweep(acc, gyro, times=times, ang=ang, thresholds=args.thresholds,
+                                 min_gaps=args.min_gaps, slice_lens=args.slice_lens)
+
+    if args.json or not result["success"]:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return 0 if result["success"] else 1
+
+    print(f"{'threshold':>10} {'min_gap':>8} {'slice_len':>10} {'原始检测':>8} {'击球数':>6} {'完整窗口':>8}")
+    for rec in result["data"]["results"]:
+        print(f"{rec['threshold']:>10.1f} {rec['min_gap']:>8} {rec['slice_len']:>10} "
+              f"{rec['raw_detections']:>8} {rec['strokes_detected']:>6} {rec['full_windows']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+会话的预计算数组（上传时计算一次，与CSV存放在一起）
+
+<会话名>_derived.npz 中保存:
+    acc / gyro / ang       解析好的传感器数据（重新分析时不用再解析CSV）
+    gyro_diff_max          相邻点角速度变化的最大轴分量（检测用，长度 N-1）
+    has_sign_change        角速度和加速度的符号变化标记（检测用，长度 N-1）
+    acc_magnitude          逐点加速度模长（特征用）
+    gyro_magnitude         逐点角速度模长（特征用）
+    sample_index 等        有时间戳时的去重/分段信息（stroke_core.build_sample_timeline），
+                           此时两个检测通道按去重后的点计算
+
+重新分析、阈值扫描只需要对这些数组做阈值比较和切片。文件只是缓存：
+缺失、格式版本或 ANALYSIS_GAP_AWARE 设置不符、或比CSV旧时返回None，调用方从CSV重新计算。
+"""
+import io
+import os
+import zipfile
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from stroke_core import GAP_AWARE, build_sample_timeline, compute_derived_channels, resolve_dtype
+from stroke_features import sample_magnitudes
+
+DERIVED_SUFFIX = '_derived.npz'
+
+# 数组含义或计算方式变化时递增，旧文件自动失效
+# 3: 时间线增加 offset_ms（击球时间按实际时间戳计算）
+DERIVED_FORMAT_VERSION = 3
+
+SAMPLE_KEYS = ('acc', 'gyro', 'ang')
+
+# 文件头信息（不属于数组数据）
+HEADER_KEYS = ('format_version', 'gap_aware')
+
+
+def compute_session_arrays(acc: np.ndarray, gyro: np.ndarray, ang: Optional[np.ndarray] = None,
+                           times: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    计算检测和特征用的逐点派生通道（结构同 compute_derived_channels，另加两个模长通道）
+
+    times 为每行的时间戳，有则按去重、分段后的数据计算检测通道
+    """
+    derived = compute_derived_channels(gyro, acc, build_sample_timeline(times, acc, gyro, ang))
+    derived["acc_magnitude"] = sample_magnitudes(acc)
+    derived["gyro_magnitude"] = sample_magnitudes(gyro)
+    return derived
+
+
+def encode_session_arrays(acc: np.ndarray, gyro: np.ndarray, ang: Optional[np.ndarray],
+                          derived: Dict[str, np.ndarray]) -> bytes:
+    """打包成 .npz 字节（不压缩：读取时直接内存拷贝，不需要解压）"""
+    arrays = {"format_version": np.array(DERIVED_FORMAT_VERSION), "gap_aware": np.array(GAP_AWARE),
+              "acc": acc, "gyro": gyro, **derived}
+    if ang is not None:
+        arrays["ang"] = ang
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def load_session_arrays(path: str, dtype=None, not_older_than: Optional[float] = None
+                        ) -> Optional[Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], Dict[str, np.ndarray]]]:
+    """
+    读取预计算数组，返回 (acc, gyro, ang, derived)
+
+    not_older_than: CSV的修改时间，npz 比它旧时视为失效
+    精度与请求的 dtype 不同时也返回None（由调用方按请求精度重新解析，结果与直接分析CSV一致）
+    """
+    try:
+        if not_older_than is not None and os.path.getmtime(path) < not_older_than:
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format_version"]) != DERIVED_FORMAT_VERSION:
+                return None
+            # 去重/分段信息是否存在取决于写入时的设置，切换 ANALYSIS_GAP_AWARE 后旧缓存失效
+            if bool(data["gap_aware"]) != GAP_AWARE:
+                return None
+            arrays = {name: data[name] for name in data.files if name not in HEADER_KEYS}
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+
+    if arrays["acc"].dtype != resolve_dtype(dtype):
+        return None
+    derived = {name: value for name, value in arrays.items() if name not in SAMPLE_KEYS}
+    return arrays["acc"], arrays["gyro"], arrays.get("ang"), derived
@@ -0,0 +1,184 @@
+import numpy as np
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, Callable
+from logger import setup_logger
+from stroke_features import DEFAULT_SAMPLE_RATE
+
+# 创建日志器
+logger = setup_logger('spectral_analyzer')
+
+# 通道顺序与 (acc, gyro) 拼接后的列一致
+CHANNEL_NAMES = ['AX', 'AY', 'AZ', 'GX', 'GY', 'GZ']
+SUPPORTED_METHODS = ('welch', 'stft', 'both')
+
+
+class SpectralAnalyzer:
+    """会话频谱分析器（Welch功率谱 + 加窗rFFT时频谱），按会话和窗口参数缓存结果"""
+
+    def __init__(self, cache_size: int = 32):
+        self.version = "1.0.0"
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def analyze(self, load_data: Callable[[], Tuple[np.ndarray, np.ndarray, Optional[float]]],
+                cache_key: Optional[Tuple] = None, sample_rate: Optional[float] = None, nperseg: int = 256,
+                noverlap: Optional[int] = None, window: str = 'hann',
+                method: str = 'welch') -> Tuple[Dict[str, Any], bool]:
+        """
+        计算所有通道的频谱
+
+        参数:
+            load_data: 返回 (acc, gyro, 实测采样率) 的函数，只有缓存未命中时才调用（省去CSV解析）；
+                       没有时间戳时实测采样率为None
+            cache_key: 会话标识（如 (会话ID, 文件修改时间)），为None时不缓存
+            sample_rate: 采样率 (Hz)，为None时用实测采样率（都没有时用 DEFAULT_SAMPLE_RATE）
+            nperseg: 每段长度（超过数据长度时自动截断）
+            noverlap: 段间重叠点数，默认 nperseg // 2
+            window: scipy 窗函数名
+            method: 'welch' / 'stft' / 'both'
+
+        返回:
+            (频谱结果字典, 是否命中缓存)
+        """
+        if method not in SUPPORTED_METHODS:
+            raise ValueError(f"不支持的频谱方法: {method}，可选 {list(SUPPORTED_METHODS)}")
+
+        full_key = None
+        if cache_key is not None:
+            # 实测采样率由会话数据决定，cache_key 相同则相同
+            rate_key = float(sample_rate) if sample_rate is not None else 'measured'
+            full_key = tuple(cache_key) + (rate_key, nperseg, noverlap, window, method)
+            with self._lock:
+                cached = self._cache.get(full_key)
+                if cached is not None:
+                    self._cache.move_to_end(full_key)
+                    self.cache_hits += 1
+                    return cached, True
+                self.cache_misses += 1
+
+        # scipy 导入较慢，只在真正需要计算（缓存未命中）时才导入
+        from scipy import signal
+
+        acc, gyro, measured_rate = load_data()
+        if len(acc) == 0:
+            raise ValueError("没有有效数据")
+        if sample_rate is not None:
+            sample_rate, rate_source = float(sample_rate), 'request'
+        elif measured_rate:
+            sample_rate, rate_source = float(measured_rate), 'measured'
+        else:
+            sample_rate, rate_source = DEFAULT_SAMPLE_RATE, 'default'
+
+        # 所有通道拼成 (通道数, 数据点数)，一次调用完成批量计算
+        data = np.ascontiguousarray(np.hstack([acc, gyro]).T)
+        n_points = data.shape[1]
+        nperseg = max(1, min(int(nperseg), n_points))
+        noverlap = nperseg // 2 if noverlap is None else max(0, min(int(noverlap), nperseg - 1))
+
+        result = {
+            "channels": CHANNEL_NAMES,
+            "sample_rate": sample_rate,
+            "sample_rate_source": rate_source,
+            "total_data_points": n_points,
+            "parameters": {"nperseg": nperseg, "noverlap": noverlap, "window": window, "method": method}
+        }
+
+        if method in ('welch', 'both'):
+            freqs, psd = signal.welch(data, fs=sample_rate, window=window,
+                                      nperseg=nperseg, noverlap=noverlap, axis=-1)
+            result["welch"] = {
+                "frequencies": freqs.tolist(),
+                "psd": {name: psd[i].tolist() for i, name in enumerate(CHANNEL_NAMES)}
+            }
+            result["summary"] = self._summarize(freqs, psd)
+
+        if method in ('stft', 'both'):
+            freqs, times, power = signal.spectrogram(data, fs=sample_rate, window=window,
+                                                     nperseg=nperseg, noverlap=noverlap,
+                                                     mode='psd', axis=-1)
+            result["spectrogram"] = {
+                "frequencies": freqs.tolist(),
+                "times": times.tolist(),
+                "power": {name: power[i].tolist() for i, name in enumerate(CHANNEL_NAMES)}
+            }
+            if "summary" not in result:
+                result["summary"] = self._summarize(freqs, power.mean(axis=-1))
+
+        if full_key is not None:
+            with self._lock:
+                self._cache[full_key] = result
+                self._cache.move_to_end(full_key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return result, False
+
+    def _summarize(self, freqs, psd):
+        """每个通道的主频和总能量"""
+        if psd.shape[-1] > 1:
+            dominant = freqs[psd[:, 1:].argmax(axis=1) + 1]
+        else:
+            dominant = np.zeros(psd.shape[0])
+        df = freqs[1] - freqs[0] if len(freqs) > 1 else 1.0
+        energy = psd.sum(axis=1) * df
+        return {
+            name: {
+                "dominant_frequency_hz": float(dominant[i]),
+                "total_power": float(energy[i])
+            }
+            for i, name in enumerate(CHANNEL_NAMES)
+        }
+
+    def cache_info(self):
+        """缓存状态"""
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.cache_size,
+                "hits": self.cache_hits,
+                "misses": self.cache_misses
+            }
+
+
+# 单例实例（缓存跨请求共享）
+_spectral_analyzer = SpectralAnalyzer()
+
+
+def analyze_session_spectra(load_data: Callable[[], Tuple[np.ndarray, np.ndarray, Optional[float]]],
+                            cache_key: Optional[Tuple] = None, **params) -> Dict[str, Any]:
+    """
+    频谱分析主函数
+    """
+    start_time = datetime.now()
+
+    try:
+        spectra, cache_hit = _spectral_analyzer.analyze(load_data, cache_key=cache_key, **params)
+        processing_time = (datetime.now() - start_time).total_seconds() * 1000
+        logger.info(f"📈 频谱分析完成: {spectra['total_data_points']} 个数据点, 缓存命中={cache_hit}")
+
+        return {
+            "success": True,
+            "message": "频谱分析完成",
+            "data": spectra,
+            "analysis_info": {
+                "method": "spectral_analysis",
+                "cache_hit": cache_hit,
+                "cache": _spectral_analyzer.cache_info(),
+                "processing_time_ms": round(processing_time, 2),
+                "version": _spectral_analyzer.version
+            },
+            "timestamp": datetime.now().isoformat()
+        }
+
+    except Exception as e:
+        logger.info(f"❌ 频谱分析错误: {str(e)}")
+        return {
+            "success": False,
+            "error": f"频谱分析失败: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        }
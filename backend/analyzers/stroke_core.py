@@ -0,0 +1,506 @@
+"""
+单IMU击球检测核心（数组化实现）
+
+TennisStrokeAnalyzer（服务器）和 single_imu_stroke_detector（离线脚本）共用这里的
+CSV解析、击球检测、时间戳过滤和窗口切片，只维护一条热路径。
+
+WT901BLE 经蓝牙传输会丢包和重发整包：有时间戳列时先用 build_sample_timeline 去掉重复行、
+在丢包处切成连续段，检测只在段内做差分和符号窗口，检测结果仍是原始CSV的行号。
+"""
+import io
+import os
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from logger import setup_logger
+
+# 创建日志器
+logger = setup_logger('stroke_core')
+
+# 必需列与可选的角度列（WT901BLE 表头）
+REQUIRED_COLUMNS = ['AX', 'AY', 'AZ', 'GX', 'GY', 'GZ']
+ANGLE_COLUMNS = ['ANGX', 'ANGY', 'ANGZ']
+TIMESTAMP_COLUMN = 'TIMESTAMP'
+
+# 可信的时间戳范围，超出的按无法解析处理（numpy 会把纯数字的时间戳当成年份，解析出上亿年）
+TIMESTAMP_MIN = np.datetime64('2000-01-01', 'ms')
+TIMESTAMP_MAX = np.datetime64('2100-01-01', 'ms')
+
+# 丢包判定：去重后相邻两点的时间间隔超过 GAP_FACTOR × 标称采样间隔（间隔中位数）。
+# 真实录制标称 5ms，批量到达时会出现 0~11ms 的抖动，真正的丢包在 20ms 以上
+GAP_FACTOR = 4.0
+
+# 按时间戳去重和分段检测；ANALYSIS_GAP_AWARE=0 时恢复为把整个数组当作等间隔采样
+GAP_AWARE = os.environ.get('ANALYSIS_GAP_AWARE', '1') != '0'
+
+# 分析用的浮点精度：默认 float64；传感器数值只有3位小数，float32 足够并且内存/带宽减半。
+# 可以用环境变量 ANALYSIS_DTYPE=float32 全局开启，或在接口参数中按请求指定
+SUPPORTED_DTYPES = ('float64', 'float32')
+
+
+def _default_dtype_from_env() -> str:
+    """启动时检查 ANALYSIS_DTYPE，写错时退回 float64（否则每个分析请求都会失败）"""
+    value = os.environ.get('ANALYSIS_DTYPE') or 'float64'
+    try:
+        name = np.dtype(value).name
+    except TypeError:
+        name = None
+    if name not in SUPPORTED_DTYPES:
+        logger.warning(f"⚠️  ANALYSIS_DTYPE={value!r} 无效（可选 {', '.join(SUPPORTED_DTYPES)}），使用 float64")
+        return 'float64'
+    return name
+
+
+DEFAULT_DTYPE = _default_dtype_from_env()
+
+# 击球检测：阈值点前后检查符号变化的窗口（与原实现一致：[i-3, i+3)）
+SIGN_WINDOW_BEFORE = 3
+SIGN_WINDOW_AFTER = 3
+
+
+def resolve_dtype(dtype=None) -> np.dtype:
+    """把 None / 'float32' / 'float64' / np.float32 等解析为支持的浮点类型"""
+    if dtype is None:
+        dtype = DEFAULT_DTYPE
+    resolved = np.dtype(dtype)
+    if resolved.name not in SUPPORTED_DTYPES:
+        raise ValueError(f"不支持的 dtype: {dtype}（可选 {', '.join(SUPPORTED_DTYPES)}）")
+    return resolved
+
+
+# ============================================================
+# CSV 解析
+# ============================================================
+def map_columns(headers: List[str]) -> Dict[str, int]:
+    """
+    根据表头找出各列的位置
+
+    先精确匹配（否则 AngX 会被模糊匹配成 GX），再对未找到的必需列做模糊匹配
+    （兼容 "AX(g)" 这类表头）
+    """
+    column_mapping = {}
+
+    for i, col in enumerate(headers):
+        col_upper = col.strip().upper()
+        if col_upper in REQUIRED_COLUMNS + ANGLE_COLUMNS and col_upper not in column_mapping:
+            column_mapping[col_upper] = i
+
+    for i, col in enumerate(headers):
+        col_upper = col.strip().upper()
+        if not col_upper or i in column_mapping.values():
+            continue
+        for expected in REQUIRED_COLUMNS:
+            if expected not in column_mapping and (expected in col_upper or col_upper in expected):
+                column_mapping[expected] = i
+                break
+
+    return column_mapping
+
+
+def find_timestamp_column(headers: List[str]) -> Optional[int]:
+    """时间戳列的位置（表头 Timestamp，不区分大小写），没有时返回None"""
+    for i, col in enumerate(headers):
+        if col.strip().upper() == TIMESTAMP_COLUMN:
+            return i
+    return None
+
+
+def parse_sample_times(values) -> np.ndarray:
+    """
+    把时间戳文本批量转成 datetime64[ms]（"2025-12-11 22:15:37.267"、ISO 格式，或 Unix 毫秒/秒数字）
+
+    整体转换失败时才逐个转换；无法解析或超出可信范围的记为 NaT
+    """
+    values = np.asarray(values, dtype=str)
+    times = _parse_epoch_times(values)
+    if times is None:
+        try:
+            times = values.astype('datetime64[ms]')
+        except ValueError:
+            times = np.empty(len(values), dtype='datetime64[ms]')
+            for i, value in enumerate(values):
+                try:
+                    times[i] = np.datetime64(value.strip(), 'ms')
+                except ValueError:
+                    times[i] = np.datetime64('NaT')
+    return _drop_implausible_times(times)
+
+
+def _parse_epoch_times(values: np.ndarray) -> Optional[np.ndarray]:
+    """纯数字的时间戳列按 Unix 时间解析（绝对值 >= 1e11 的是毫秒，否则是秒）；不是纯数字时返回None"""
+    try:
+        numbers = np.char.strip(values).astype(np.float64)
+    except ValueError:
+        return None
+    ms = np.where(np.abs(numbers) >= 1e11, numbers, numbers * 1000.0)
+    # 非有限值和大到无法转成 int64 的值记为 NaT，范围检查交给 _drop_implausible_times
+    usable = np.isfinite(ms) & (np.abs(ms) < 1e15)
+    times = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ms]')
+    times[usable] = np.round(ms[usable]).astype(np.int64).astype('datetime64[ms]')
+    return times
+
+
+def _implausible_times(times: np.ndarray) -> np.ndarray:
+    """超出 TIMESTAMP_MIN ~ TIMESTAMP_MAX 的时间戳（NaT 的比较结果为False，不算在内）"""
+    return (times < TIMESTAMP_MIN) | (times >= TIMESTAMP_MAX)
+
+
+def _drop_implausible_times(times: np.ndarray) -> np.ndarray:
+    """超出可信范围的时间戳改为 NaT"""
+    implausible = _implausible_times(times)
+    if implausible.any():
+        times = times.copy()
+        times[implausible] = np.datetime64('NaT')
+    return times
+
+
+def _parse_rows_slow(data_lines: List[str], columns: List[int], dtype, time_column: Optional[int] = None):
+    """逐行解析（快速路径失败时使用）：缺列补0，无法解析的行跳过"""
+    rows = []
+    times = []
+    error_count = 0
+
+    for line_num, line in enumerate(data_lines, 1):
+        if not line.strip():
+            continue
+        values = line.split(',')
+        try:
+            rows.append([float(values[idx]) if idx < len(values) else 0.0 for idx in columns])
+        except ValueError as e:
+            error_count += 1
+            if error_count <= 3:  # 只显示前3个错误
+                logger.warning(f"⚠️  第{line_num}行解析失败: {e}, 数据: {line[:50]}...")
+            continue
+        if time_column is not None:
+            times.append(values[time_column] if time_column < len(values) else 'NaT')
+
+    data = np.array(rows, dtype=dtype).reshape(-1, len(columns))
+    return data, error_count, parse_sample_times(times) if time_column is not None else None
+
+
+def load_imu_csv(csv_content: str, dtype=None, with_times: bool = False):
+    """
+    从CSV文本加载IMU数据
+
+    dtype 为 None 时使用 DEFAULT_DTYPE；float32 时直接解析成 float32，不经过 float64 中间数组
+    with_times=True 时在同一遍解析中读出时间戳列
+
+    返回:
+        (acc, gyro, ang)，前两个为 (数据点数, 3) 数组；CSV中没有角度列时 ang 为None。
+        with_times=True 时返回 (acc, gyro, ang, times)，times 为 datetime64[ms] 数组，没有时间戳列时为None。
+        数据不足或缺少必要列时返回空数组
+    """
+    dtype = resolve_dtype(dtype)
+    empty = np.array([], dtype=dtype), np.array([], dtype=dtype), None
+    if with_times:
+        empty += (None,)
+
+    if csv_content[:1].isspace():
+        csv_content = csv_content.lstrip()
+    header_end = csv_content.find('\n')
+    if header_end < 0 or not csv_content[header_end:].strip():
+        logger.warning("⚠️  CSV数据不足（只有表头或无数据）")
+        return empty
+
+    headers = [h.strip() for h in csv_content[:header_end].split(',')]
+    logger.info(f"📋 CSV表头: {headers}")
+
+    column_mapping = map_columns(headers)
+    logger.info(f"📊 列映射结果: {column_mapping}")
+
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in column_mapping]
+    if missing_cols:
+        logger.error(f"❌ 缺少必要的列: {missing_cols}")
+        return empty
+
+    has_angle = all(col in column_mapping for col in ANGLE_COLUMNS)
+    names = REQUIRED_COLUMNS + (ANGLE_COLUMNS if has_angle else [])
+    columns = [column_mapping[name] for name in names]
+    time_column = find_timestamp_column(headers) if with_times else None
+
+    # 快速路径：numpy 的 C 解析器只读取需要的列（时间戳和数值用结构化类型一次读出）
+    error_count = 0
+    times = None
+    try:
+        if time_column is None:
+            data = np.loadtxt(io.StringIO(csv_content), delimiter=',', skiprows=1, usecols=columns,
+                              dtype=dtype, comments=None, ndmin=2)
+        else:
+            record = np.dtype([('time', 'datetime64[ms]'), ('values', dtype, (len(columns),))])
+            parsed = np.loadtxt(io.StringIO(csv_content), delimiter=',', skiprows=1,
+                                usecols=[time_column] + columns, dtype=record, comments=None, ndmin=1)
+            data = parsed['values']
+            times = np.ascontiguousarray(parsed['time'])
+            if _implausible_times(times).any():
+                # 纯数字（Unix 时间）会被当成年份解析：按文本重新读时间戳列
+                raw = np.loadtxt(io.StringIO(csv_content), delimiter=',', skiprows=1, usecols=[time_column],
+                                 dtype=str, comments=None, ndmin=1)
+                times = parse_sample_times(raw)
+    except (ValueError, IndexError):
+        # 有坏行、缺列或时间戳格式不对：退回逐行解析，保持原有的容错行为
+        data, error_count, times = _parse_rows_slow(csv_content[header_end + 1:].split('\n'), columns, dtype,
+                                                    time_column)
+
+    logger.info(f"📊 解析完成: 成功 {len(data)} 行, 失败 {error_count} 行")
+    if len(data) == 0:
+        logger.error("❌ 没有成功解析任何数据行")
+        return empty
+
+    acc = np.ascontiguousarray(data[:, 0:3])
+    gyro = np.ascontiguousarray(data[:, 3:6])
+    ang = np.ascontiguousarray(data[:, 6:9]) if has_angle else None
+    if with_times:
+        return acc, gyro, ang, times
+    return acc, gyro, ang
+
+
+def load_imu_csv_file(csv_path: str, dtype=None, with_times: bool = False):
+    """从文件路径加载IMU数据，返回值同 load_imu_csv"""
+    with open(csv_path, mode="r", newline="", encoding="utf-8") as f:
+        return load_imu_csv(f.read(), dtype=dtype, with_times=with_times)
+
+
+# ============================================================
+# 采样时间线（重复包 / 丢包）
+# ============================================================
+def build_sample_timeline(times, acc, gyro, ang=None,
+                          gap_factor: float = GAP_FACTOR) -> Optional[Dict[str, np.ndarray]]:
+    """
+    根据时间戳找出重复包和丢包断点（全部是数组运算，没有逐行循环）
+
+    重复包: 时间戳和所有数值都与上一行相同的行（蓝牙重发的整包）。
+            只有时间戳相同、数值不同的行是正常的批量到达，保留
+    断点:   去重后相邻两点的间隔超过 gap_factor × 标称间隔，或时间戳倒退
+
+    返回（可直接并入 compute_derived_channels 的结果一起缓存）:
+        sample_index        保留的行号，去重后第 k 个点是原始第 sample_index[k] 行
+        segment_starts      每个连续段在去重后数组中的起点（第一个为0）
+        gap_ms              每个断点处的时间间隔（毫秒，负数为时间戳倒退），长度为段数-1
+        sample_interval_ms  标称采样间隔（正间隔的中位数）
+        offset_ms           每个保留点距第一个时间戳的毫秒数（sample_offsets_s 据此换算击球时间）
+        time_span_ms        第一个到最后一个时间戳的跨度
+        unparsed_times      无法解析或超出可信范围的时间戳个数（这些行沿用前一个有效时间戳）
+    没有时间戳、时间戳全部无效或 GAP_AWARE 关闭时返回None
+    """
+    if times is None or not GAP_AWARE or len(times) != len(acc):
+        return None
+    times = np.asarray(times, dtype='datetime64[ms]')
+    valid = ~np.isnat(times)
+    if not valid.any():
+        return None
+
+    # NaT 沿用前一个有效时间戳（开头的沿用第一个有效时间戳）
+    ms = times.astype(np.int64)
+    unparsed = int(len(ms) - valid.sum())
+    if unparsed:
+        filled = np.maximum.accumulate(np.where(valid, np.arange(len(ms)), 0))
+        filled[:np.argmax(valid)] = np.argmax(valid)
+        ms = ms[filled]
+
+    step = np.diff(ms)
+    duplicate = step == 0
+    for channel in (acc, gyro, ang):
+        if channel is not None:
+            duplicate &= np.all(channel[1:] == channel[:-1], axis=1)
+    sample_index = np.concatenate(([0], np.flatnonzero(~duplicate) + 1))
+
+    kept_step = np.diff(ms[sample_index])
+    positive = kept_step[kept_step > 0]
+    interval = float(np.median(positive)) if len(positive) else 0.0
+    breaks = kept_step < 0
+    if interval > 0:
+        breaks |= kept_step > gap_factor * interval
+    boundaries = np.flatnonzero(breaks)
+
+    return {
+        "sample_index": sample_index,
+        "segment_starts": np.concatenate(([0], boundaries + 1)),
+        "gap_ms": kept_step[boundaries],
+        "sample_interval_ms": np.array(interval),
+        "offset_ms": ms[sample_index] - ms[0],
+        "time_span_ms": np.array(int(ms.max() - ms.min())),
+        "unparsed_times": np.array(unparsed)
+    }
+
+
+def sample_offsets_s(timeline: Dict[str, np.ndarray], rows) -> np.ndarray:
+    """原始行号 -> 距会话第一个时间戳的秒数（重复行与被重复的行时间相同）"""
+    position = np.searchsorted(timeline["sample_index"], np.asarray(rows, dtype=np.int64), side='right') - 1
+    return timeline["offset_ms"][np.maximum(position, 0)] / 1000.0
+
+
+def timeline_quality(timeline: Dict[str, np.ndarray], n_rows: int) -> Dict[str, object]:
+    """
+    数据质量统计（timeline 为 build_sample_timeline 的结果，或包含这些字段的派生通道）
+
+    missing_samples_estimate 按标称间隔估算丢失的采样点数
+    """
+    samples = len(timeline["sample_index"])
+    starts = timeline["segment_starts"]
+    gap_ms = timeline["gap_ms"]
+    interval = float(timeline["sample_interval_ms"])
+    lost = gap_ms[gap_ms > 0]
+    missing = int(np.maximum(np.round(lost / interval) - 1, 0).sum()) if interval > 0 else 0
+    segment_lengths = np.diff(np.append(starts, samples))
+
+    return {
+        "rows": int(n_rows),
+        "samples_used": samples,
+        "duplicate_rows": int(n_rows - samples),
+        "duplicate_rate": round((n_rows - samples) / n_rows, 4) if n_rows else 0.0,
+        "gaps": len(lost),
+        "time_reversals": int((gap_ms < 0).sum()),
+        "missing_samples_estimate": missing,
+        "longest_gap_ms": int(lost.max()) if len(lost) else 0,
+        "segments": len(starts),
+        "longest_segment_samples": int(segment_lengths.max()) if len(segment_lengths) else 0,
+        "sample_interval_ms": round(interval, 3),
+        "duration_seconds": round(int(timeline["time_span_ms"]) / 1000.0, 3),
+        "unparsed_timestamps": int(timeline["unparsed_times"])
+    }
+
+
+# ============================================================
+# 击球检测（角速度变化 + 符号翻转）
+# ============================================================
+def _window_any(flags: np.ndarray, lower=0, upper=None) -> np.ndarray:
+    """
+    对每个位置 i，判断 flags[max(lower, i-3) : min(upper, i+3)] 中是否有True（前缀和实现）
+
+    lower / upper 默认为整个数组，分段检测时传入每个位置所在段的范围
+    """
+    n = len(flags)
+    counts = np.concatenate(([0], np.cumsum(flags, dtype=np.int64)))
+    idx = np.arange(n)
+    start = np.maximum(idx - SIGN_WINDOW_BEFORE, lower)
+    end = np.minimum(idx + SIGN_WINDOW_AFTER, n if upper is None else upper)
+    return counts[end] > counts[start]
+
+
+def compute_derived_channels(gyro: np.ndarray, acc: np.ndarray,
+                             timeline: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+    """
+    计算检测用的派生通道（与阈值无关，可在多次检测/参数扫描间复用）
+
+    timeline 为 build_sample_timeline 的结果时，在去重后的数组上计算：跨断点的差分记为NaN，
+    符号窗口不越过断点，返回值中同时带上 timeline 的字段（detect_stroke_timestamps 据此换回原始行号）
+
+    返回:
+        gyro_diff_max: 相邻点角速度变化的最大轴分量，长度 N-1（分段时为去重后的点数-1）
+        has_sign_change: 该点附近窗口内角速度和加速度都出现过符号翻转，长度同上
+    """
+    gyro = np.asarray(gyro)
+    acc = np.asarray(acc)
+    if timeline is not None and len(timeline["sample_index"]) < len(gyro):
+        gyro = gyro[timeline["sample_index"]]
+        acc = acc[timeline["sample_index"]]
+
+    # fmax 归约会跳过NaN，与原实现 np.any(diff > threshold) 的语义一致
+    gyro_diff_max = np.fmax.reduce(np.abs(np.diff(gyro, axis=0)), axis=1)
+
+    # 用 abs(...) > 0 而不是 != 0：NaN 不算符号变化，与原实现一致
+    gyro_sign_flag = np.any(np.abs(np.diff(np.sign(gyro), axis=0)) > 0, axis=1)
+    acc_sign_flag = np.any(np.abs(np.diff(np.sign(acc), axis=0)) > 0, axis=1)
+
+    if timeline is not None and len(timeline["segment_starts"]) > 1:
+        # 第 j 个差分连接第 j、j+1 个点；段 [start, end) 内的差分为 [start, end-1)
+        starts = timeline["segment_starts"]
+        ends = np.append(starts[1:], len(gyro))
+        crossing = starts[1:] - 1
+        gyro_diff_max[crossing] = np.nan
+        gyro_sign_flag[crossing] = False
+        acc_sign_flag[crossing] = False
+        segment = np.searchsorted(starts, np.arange(len(gyro_diff_max)), side='right') - 1
+        lower, upper = starts[segment], ends[segment] - 1
+        has_sign_change = (_window_any(gyro_sign_flag, lower, upper)
+                           & _window_any(acc_sign_flag, lower, upper))
+    else:
+        has_sign_change = _window_any(gyro_sign_flag) & _window_any(acc_sign_flag)
+
+    derived = {
+        "gyro_diff_max": gyro_diff_max,
+        "has_sign_change": has_sign_change
+    }
+    if timeline is not None:
+        derived.update(timeline)
+    return derived
+
+
+def detect_stroke_timestamps(gyro, acc, threshold: float = 300.0,
+                             derived: Optional[Dict[str, np.ndarray]] = None) -> List[int]:
+    """
+    检测击球时间戳：角速度变化超过阈值，且前后窗口内角速度和加速度都有符号变化
+
+    derived 可传入 compute_derived_channels 的结果以跳过重复计算；分段计算的派生通道
+    返回的仍是原始数组（CSV）中的行号
+    """
+    if derived is None:
+        derived = compute_derived_channels(gyro, acc)
+    mask = (derived["gyro_diff_max"] > threshold) & derived["has_sign_change"]
+    index = np.flatnonzero(mask) + 1  # +1因为diff减少了索引
+    if "sample_index" in derived:
+        index = derived["sample_index"][index]
+    return index.tolist()
+
+
+def filter_timestamps(timestamps, min_gap: int = 75) -> List[int]:
+    """过滤时间戳，避免重复检测（与相邻的上一个原始检测点间隔不足 min_gap 的被丢弃）"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if len(timestamps) == 0:
+        return []
+    keep = np.concatenate(([True], np.diff(timestamps) >= min_gap))
+    return timestamps[keep].tolist()
+
+
+# ============================================================
+# 提取击球窗口切片
+# ============================================================
+def stroke_window_index(timestamps, window_size: int, n_samples: int) -> np.ndarray:
+    """
+    击球窗口的采样点下标，形状 (击球数, 窗口长度)；越界的窗口直接丢弃
+
+    可以用同一组下标切出其他逐点通道（如预先计算的模长）
+    """
+    half = window_size // 2
+    starts = np.asarray(timestamps, dtype=np.int64) - half
+    starts = starts[(starts >= 0) & (starts + window_size <= n_samples)]
+    return starts[:, None] + np.arange(window_size)
+
+
+def extract_stroke_windows(acc, gyro, timestamps, window_size: int = 200, ang=None):
+    """
+    提取击球窗口
+
+    返回 (击球数, 窗口长度, 3) 的张量，只保留完整窗口；没有角度数据时 ang 切片为None
+    """
+    index = stroke_window_index(timestamps, window_size, len(acc))
+
+    acc_windows = np.asarray(acc)[index]
+    gyro_windows = np.asarray(gyro)[index]
+    ang_windows = np.asarray(ang)[index] if ang is not None else None
+
+    return acc_windows, gyro_windows, ang_windows
+
+
+def plot_stroke_windows(acc_windows, gyro_windows):
+    """逐个击球画出加速度/角速度窗口（matplotlib 只在需要画图时才导入）"""
+    import matplotlib.pyplot as plt
+
+    for acc_slice, gyro_slice in zip(acc_windows, gyro_windows):
+        ax = np.arange(len(acc_slice))
+        plt.figure(figsize=(12, 5))
+
+        plt.subplot(1, 2, 1)
+        plt.plot(ax, acc_slice[:, 0], label="ax")
+        plt.plot(ax, acc_slice[:, 1], label="ay")
+        plt.plot(ax, acc_slice[:, 2], label="az")
+        plt.legend()
+        plt.title("Acceleration Slice")
+
+        plt.subplot(1, 2, 2)
+        plt.plot(ax, gyro_slice[:, 0], label="gx")
+        plt.plot(ax, gyro_slice[:, 1], label="gy")
+        plt.plot(ax, gyro_slice[:, 2], label="gz")
+        plt.legend()
+        plt.title("Gyro Slice")
+
+        plt.show()
@@ -0,0 +1,114 @@
+import numpy as np
+from typing import Dict, Optional
+
+# 没有时间戳、测不出实际采样间隔时使用的采样率（原分析器的假设：5Hz）。
+# 有时间戳时分析器按 1000 / sample_interval_ms 传入实际采样率（WT901BLE 约 200Hz）
+DEFAULT_SAMPLE_RATE = 5.0
+
+
+def _channel_major(windows) -> np.ndarray:
+    """(击球数, 窗口长度, 3) -> (击球数, 3, 窗口长度)，让沿时间轴的归约在连续内存上进行"""
+    return np.ascontiguousarray(np.asarray(windows).transpose(0, 2, 1))
+
+
+def _magnitude(windows: np.ndarray) -> np.ndarray:
+    """对 (击球数, 3, 窗口长度) 张量按轴维求模"""
+    return np.sqrt(np.einsum('nkw,nkw->nw', windows, windows))
+
+
+def sample_magnitudes(samples: np.ndarray) -> np.ndarray:
+    """
+    整段 (数据点数, 3) 数据逐点求模
+
+    与特征计算中对窗口求模走同一条 einsum 路径，按窗口切出来的结果与在窗口上直接计算完全一致
+    """
+    return _magnitude(_channel_major(np.asarray(samples)[None]))[0]
+
+
+def extract_stroke_features(acc_windows: np.ndarray,
+                            gyro_windows: np.ndarray,
+                            ang_windows: Optional[np.ndarray] = None,
+                            sample_rate: float = DEFAULT_SAMPLE_RATE,
+                            swing_ratio: float = 0.5,
+                            acc_magnitude: Optional[np.ndarray] = None,
+                            gyro_magnitude: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    对所有击球窗口一次性（向量化）计算特征
+
+    参数:
+        acc_windows: 加速度窗口张量，形状 (击球数, 窗口长度, 3)
+        gyro_windows: 角速度窗口张量，形状同上
+        ang_windows: 角度窗口张量 (AngX/AngY/AngZ)，没有角度列时为None
+        sample_rate: 采样率 (Hz)
+        swing_ratio: 挥拍判定比例，角速度模超过 峰值*swing_ratio 视为挥拍中
+        acc_magnitude / gyro_magnitude: 预先计算好的模长窗口 (击球数, 窗口长度)，
+            来自 sample_magnitudes 的结果按窗口切片；不传时在窗口上计算
+
+    返回:
+        列式特征字典，每个值都是长度为击球数的数组（每轴特征为 (击球数, 3)）；
+        计算精度跟随输入（float32 窗口全程按 float32 计算）
+    """
+    count, window_size = np.shape(acc_windows)[:2]
+
+    if count == 0:
+        return {}
+
+    acc_windows = _channel_major(acc_windows)
+    gyro_windows = _channel_major(gyro_windows)
+
+    # 模长只计算一次，后续特征共用
+    if acc_magnitude is None:
+        acc_magnitude = _magnitude(acc_windows)
+    if gyro_magnitude is None:
+        gyro_magnitude = _magnitude(gyro_windows)
+
+    peak_acceleration = acc_magnitude.max(axis=1)
+    peak_rotation = gyro_magnitude.max(axis=1)
+
+    # 挥拍时长：角速度模超过峰值一定比例的采样点数
+    swing_mask = (gyro_magnitude >= peak_rotation[:, None] * swing_ratio) & (gyro_magnitude > 0)
+    swing_duration = swing_mask.sum(axis=1) / sample_rate
+
+    # 从窗口起点到角速度峰值的时间
+    time_to_peak = gyro_magnitude.argmax(axis=1) / sample_rate
+
+    # 急动度（加速度的一阶差分）
+    jerk = np.diff(acc_windows, axis=-1) * sample_rate
+    peak_jerk = _magnitude(jerk).max(axis=1)
+
+    # 频谱能量：去均值后的加速度模做 rFFT（忽略直流分量）
+    centered = acc_magnitude - acc_magnitude.mean(axis=1, keepdims=True)
+    power = np.abs(np.fft.rfft(centered, axis=1)) ** 2
+    spectral_energy = power[:, 1:].sum(axis=1) / window_size
+    freqs = np.fft.rfftfreq(window_size, d=1.0 / sample_rate)
+    if power.shape[1] > 1:
+        dominant_frequency = freqs[power[:, 1:].argmax(axis=1) + 1]
+    else:
+        dominant_frequency = np.zeros(count)
+
+    features = {
+        "peak_acceleration": peak_acceleration,
+        "peak_rotation": peak_rotation,
+        "avg_acceleration": acc_magnitude.mean(axis=1),
+        "avg_rotation": gyro_magnitude.mean(axis=1),
+        "stroke_power": peak_acceleration * peak_rotation,
+        "swing_duration_s": swing_duration,
+        "time_to_peak_s": time_to_peak,
+        "peak_acc_axes": np.abs(acc_windows).max(axis=-1),
+        "peak_gyro_axes": np.abs(gyro_windows).max(axis=-1),
+        "peak_jerk": peak_jerk,
+        "spectral_energy": spectral_energy,
+        "dominant_frequency_hz": dominant_frequency,
+    }
+
+    # 姿态变化：角度在±180°处回绕，把相邻差值折回[-180, 180]后累加，再取峰峰值
+    # （等价于 np.unwrap(period=360) 后求峰峰值，但少了很多中间数组）
+    if ang_windows is not None:
+        ang_step = np.diff(_channel_major(ang_windows), axis=-1)
+        ang_step -= 360.0 * np.round(ang_step / 360.0)
+        ang_path = np.cumsum(ang_step, axis=-1)
+        ang_range = np.maximum(ang_path.max(axis=-1), 0.0) - np.minimum(ang_path.min(axis=-1), 0.0)
+        features["orientation_change_axes"] = ang_range
+        features["orientation_change_deg"] = np.sqrt(np.sum(ang_range ** 2, axis=1))
+
+    return features
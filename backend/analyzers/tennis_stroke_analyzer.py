@@ -6,10 +6,24 @@ from typing import Dict, List, Any
 import io
 import sys
 from logger import setup_logger
+from stroke_core import (load_imu_csv, detect_stroke_timestamps, filter_timestamps,
+                         extract_stroke_windows, stroke_window_index, plot_stroke_windows, resolve_dtype,
+                         build_sample_timeline, compute_derived_channels, timeline_quality,
+                         sample_offsets_s)
+from stroke_features import extract_stroke_features, DEFAULT_SAMPLE_RATE
+from memory_profile import StageProfiler, PROFILE_BY_DEFAULT
 
 # 创建日志器
 logger = setup_logger('tennis_analyzer')
 
+# 每个击球输出的特征字段（stroke_id 在前、estimated_type 在后；没有角度数据时不含 orientation_*）
+STROKE_FEATURE_COLUMNS = (
+    "peak_acceleration", "peak_rotation", "avg_acceleration", "avg_rotation", "stroke_power",
+    "duration_points", "swing_duration_s", "time_to_peak_s", "peak_acc_axes", "peak_gyro_axes",
+    "peak_jerk", "spectral_energy", "dominant_frequency_hz",
+    "orientation_change_axes", "orientation_change_deg"
+)
+
 class TennisStrokeAnalyzer:
     """网球击球检测分析器"""
     
@@ -17,7 +31,9 @@ class TennisStrokeAnalyzer:
         self.version = "1.0.0"
     
     def analyze_stroke_from_csv_content(self, csv_content: str, threshold: float = 300.0, 
-                                       slice_len: int = 200, plot: bool = False) -> Dict[str, Any]:
+                                       slice_len: int = 200, plot: bool = False,
+                                       dtype=None, layout: str = 'rows',
+                                       profile_memory=None) -> Dict[str, Any]:
         """
         从CSV文本内容分析网球击球
         
@@ -26,15 +42,63 @@ class TennisStrokeAnalyzer:
             threshold: 击球检测阈值 (默认300)
             slice_len: 击球窗口长度 (默认200个数据点)
             plot: 是否生成图表 (在服务器中通常设为False)
+            dtype: 计算精度 'float64' / 'float32' (默认取 ANALYSIS_DTYPE 环境变量，未设置为float64)
+            layout: 击球结果布局 'rows'（每个击球一个字典）/ 'columnar'（每个特征一个数组）
+            profile_memory: 记录各阶段内存分配，结果放在 analysis_info.memory_profile
+                            (默认取 ANALYSIS_PROFILE_MEMORY 环境变量)
         
         返回:
             分析结果字典
         """
         start_time = datetime.now()
+        profiler = StageProfiler(PROFILE_BY_DEFAULT if profile_memory is None else bool(profile_memory))
+        
+        with profiler:
+            try:
+                dtype = resolve_dtype(dtype)
+                
+                # 1. 从CSV文本加载数据（解析、检测、特征计算全程使用同一精度）
+                with profiler.stage('parse'):
+                    acc_data, gyro_data, ang_data, times = self._load_csv_from_string(csv_content, dtype,
+                                                                                      with_times=True)
+                
+            except Exception as e:
+                logger.info(f"❌ 击球分析错误: {str(e)}")
+                return {
+                    "success": False,
+                    "error": f"击球分析失败: {str(e)}",
+                    "timestamp": datetime.now().isoformat()
+                }
+            
+            result = self.analyze_arrays(acc_data, gyro_data, ang_data, threshold, slice_len, plot,
+                                         layout=layout, start_time=start_time, profiler=profiler, times=times)
+        
+        if profiler.enabled and result.get("success"):
+            profiler.samples = len(acc_data)
+            result["analysis_info"]["memory_profile"] = profiler.report()
+            profiler.log("击球分析")
+        return result
+    
+    def analyze_arrays(self, acc_data, gyro_data, ang_data=None, threshold: float = 300.0,
+                       slice_len: int = 200, plot: bool = False, layout: str = 'rows',
+                       derived=None, start_time=None, profiler=None, times=None) -> Dict[str, Any]:
+        """
+        分析已解析的传感器数组（会话重新分析时跳过CSV解析）
+        
+        参数:
+            acc_data, gyro_data, ang_data: load_imu_csv 的返回值
+            derived: 预先计算的逐点通道（session_arrays.compute_session_arrays 的结果），
+                     有则检测只做阈值比较、特征直接切片模长，不传时现场计算
+            profiler: StageProfiler，记录检测 / 切片 / 特征各阶段的内存分配
+            times: 每行的时间戳（datetime64[ms]），没有 derived 时用来去掉重复包、在丢包处分段检测
+            其余参数同 analyze_stroke_from_csv_content
+        """
+        start_time = start_time or datetime.now()
+        profiler = profiler or StageProfiler(enabled=False)
         
         try:
-            # 1. 从CSV文本加载数据
-            acc_data, gyro_data = self._load_csv_from_string(csv_content)
+            if layout not in ('rows', 'columnar'):
+                raise ValueError(f"不支持的布局: {layout}")
             
             if len(acc_data) == 0:
                 return {
@@ -45,34 +109,63 @@ class TennisStrokeAnalyzer:
             
             logger.info(f"📊 加载数据: {len(acc_data)} 个数据点")
             
-            # 2. 检测击球时间戳
-            timestamps = self._detect_stroke_timestamps(gyro_data, acc_data, threshold)
+            # 2. 检测击球时间戳（有时间戳时按连续段检测）
+            with profiler.stage('detect'):
+                if derived is None and times is not None:
+                    timeline = build_sample_timeline(times, acc_data, gyro_data, ang_data)
+                    if timeline is not None:
+                        derived = compute_derived_channels(gyro_data, acc_data, timeline)
+                timestamps = self._detect_stroke_timestamps(gyro_data, acc_data, threshold, derived)
             logger.info(f"🎾 原始检测到 {len(timestamps)} 个击球点")
             
+            data_quality = None
+            sample_rate = DEFAULT_SAMPLE_RATE
+            if derived is not None and "sample_index" in derived:
+                data_quality = timeline_quality(derived, len(acc_data))
+                if float(derived["sample_interval_ms"]) > 0:
+                    # 时长/频率类特征按实测采样率计算
+                    sample_rate = 1000.0 / float(derived["sample_interval_ms"])
+                logger.info(f"📶 数据质量: 重复行 {data_quality['duplicate_rows']}, "
+                            f"丢包 {data_quality['gaps']} 处（约 {data_quality['missing_samples_estimate']} 个点）, "
+                            f"{data_quality['segments']} 个连续段")
+            
             # 3. 过滤时间戳（避免重复）
             filtered_timestamps = self._filter_timestamps(timestamps, min_gap=75)
             logger.info(f"🎾 过滤后剩余 {len(filtered_timestamps)} 个击球点")
             
             # 4. 提取击球窗口切片
-            acc_slices, gyro_slices = self._extract_stroke_slices(
-                acc_data, gyro_data, filtered_timestamps, slice_len, plot
-            )
+            with profiler.stage('windows'):
+                acc_slices, gyro_slices, ang_slices = self._extract_stroke_slices(
+                    acc_data, gyro_data, filtered_timestamps, slice_len, plot, ang=ang_data
+                )
+                magnitudes = None
+                offsets = None
+                if derived is not None:
+                    index = stroke_window_index(filtered_timestamps, slice_len, len(acc_data))
+                    if "acc_magnitude" in derived:
+                        magnitudes = (derived["acc_magnitude"][index], derived["gyro_magnitude"][index])
+                    if "offset_ms" in derived:
+                        # 击球点距会话开始的秒数，按实际时间戳（重复行和丢包不影响）
+                        offsets = sample_offsets_s(derived, index[:, 0] + slice_len // 2)
             
             # 5. 分析每个击球的特征，TODO：后面要改成类别/其他分析
-            stroke_analysis = self._analyze_strokes(acc_slices, gyro_slices)
+            with profiler.stage('features'):
+                stroke_analysis = self._analyze_strokes(acc_slices, gyro_slices, ang_slices, layout, magnitudes,
+                                                        sample_rate, offsets)
             
             # TODO: 存储击球片段，以便其他分析
 
             # 计算处理时间
             processing_time = (datetime.now() - start_time).total_seconds() * 1000
             
-            return {
+            result = {
                 "success": True,
                 "message": "网球击球分析完成",
                 "data": {
                     "strokes_detected": len(filtered_timestamps),
                     "timestamps": filtered_timestamps,
                     "stroke_analysis": stroke_analysis,
+                    "layout": layout,
                     "statistics": {
                         "total_data_points": len(acc_data),
                         "stroke_rate": f"{len(filtered_timestamps)} strokes",
@@ -84,11 +177,16 @@ class TennisStrokeAnalyzer:
                     "method": "tennis_stroke_detection",
                     "threshold_used": threshold,
                     "window_size": slice_len,
+                    "sample_rate_hz": round(sample_rate, 3),
+                    "dtype": acc_data.dtype.name,
                     "processing_time_ms": round(processing_time, 2),
                     "version": self.version
                 },
                 "timestamp": datetime.now().isoformat()
             }
+            if data_quality is not None:
+                result["data"]["data_quality"] = data_quality
+            return result
             
         except Exception as e:
             logger.info(f"❌ 击球分析错误: {str(e)}")
@@ -98,223 +196,77 @@ class TennisStrokeAnalyzer:
                 "timestamp": datetime.now().isoformat()
             }
     
-    def _load_csv_from_string(self, csv_content: str):
-        """从字符串加载CSV数据 - 适配你的CSV格式"""
-        lines = csv_content.strip().split('\n')
-        
-        logger.info(f"📖 解析CSV内容，总行数: {len(lines)}")
-        
-        if len(lines) <= 1:
-            logger.warning("⚠️  CSV数据不足（只有表头或无数据）")
-            return np.array([]), np.array([])
-        
-        # 显示表头信息用于调试
-        header = lines[0]
-        logger.info(f"📋 CSV表头: {header}")
-        
-        # 解析表头，找出各列的位置
-        headers = [h.strip() for h in header.split(',')]
-        logger.info(f"📋 解析到的列名: {headers}")
-        logger.info(f"📋 列数量: {len(headers)}")
-        
-        # 找出关键列的位置
-        column_mapping = {}
-        expected_columns = ['AX', 'AY', 'AZ', 'GX', 'GY', 'GZ']
-        
-        for i, col in enumerate(headers):
-            col_upper = col.upper()
-            for expected in expected_columns:
-                if expected in col_upper or col_upper in expected:
-                    column_mapping[expected] = i
-                    logger.info(f"🔍 找到列 '{col}' -> {expected} (索引: {i})")
-        
-        logger.info(f"📊 列映射结果: {column_mapping}")
-        
-        # 检查必要的列是否存在
-        required_cols = ['AX', 'AY', 'AZ', 'GX', 'GY', 'GZ']
-        missing_cols = [col for col in required_cols if col not in column_mapping]
-        
-        if missing_cols:
-            logger.error(f"❌ 缺少必要的列: {missing_cols}")
-            logger.error(f"❌ 找到的列: {list(column_mapping.keys())}")
-            return np.array([]), np.array([])
-        
-        # 跳过表头，开始解析数据行
-        data_lines = lines[1:] if len(lines) > 1 else []
-        logger.info(f"📊 开始解析 {len(data_lines)} 行数据...")
-        
-        acc_data = []
-        gyro_data = []
-        error_count = 0
-        success_count = 0
-        
-        # 解析前几行数据用于调试
-        sample_data_shown = 0
-        for line_num, line in enumerate(data_lines[:5], 1):  # 只显示前5行
-            if line.strip():
-                values = line.split(',')
-                logger.info(f"🔍 第{line_num}行示例: {values[:10]}...")  # 显示前10个值
-        
-        # 解析所有数据行
-        for line_num, line in enumerate(data_lines, 1):
-            if not line.strip():
-                continue
-                
-            try:
-                # 分割CSV行
-                values = [v.strip() for v in line.split(',')]
-                
-                # 提取加速度数据
-                acc_x_idx = column_mapping['AX']
-                acc_y_idx = column_mapping['AY']
-                acc_z_idx = column_mapping['AZ']
-                
-                # 提取陀螺仪数据
-                gyro_x_idx = column_mapping['GX']
-                gyro_y_idx = column_mapping['GY']
-                gyro_z_idx = column_mapping['GZ']
-                
-                # 解析数值
-                acc_x = float(values[acc_x_idx]) if acc_x_idx < len(values) else 0.0
-                acc_y = float(values[acc_y_idx]) if acc_y_idx < len(values) else 0.0
-                acc_z = float(values[acc_z_idx]) if acc_z_idx < len(values) else 0.0
-                
-                gyro_x = float(values[gyro_x_idx]) if gyro_x_idx < len(values) else 0.0
-                gyro_y = float(values[gyro_y_idx]) if gyro_y_idx < len(values) else 0.0
-                gyro_z = float(values[gyro_z_idx]) if gyro_z_idx < len(values) else 0.0
-                
-                acc_data.append([acc_x, acc_y, acc_z])
-                gyro_data.append([gyro_x, gyro_y, gyro_z])
-                success_count += 1
-                
-                # 显示前几行数据值用于调试
-                if success_count <= 3:
-                    logger.info(f"✅ 第{line_num}行数据: "
-                            f"acc=[{acc_x:.2f}, {acc_y:.2f}, {acc_z:.2f}], "
-                            f"gyro=[{gyro_x:.2f}, {gyro_y:.2f}, {gyro_z:.2f}]")
-                    
-            except (ValueError, IndexError) as e:
-                error_count += 1
-                if error_count <= 3:  # 只显示前3个错误
-                    logger.warning(f"⚠️  第{line_num}行解析失败: {e}, 数据: {line[:50]}...")
-                continue
-        
-        logger.info(f"📊 解析完成: 成功 {success_count} 行, 失败 {error_count} 行")
-        
-        if success_count == 0:
-            logger.error("❌ 没有成功解析任何数据行")
-        
-        return np.array(acc_data, float), np.array(gyro_data, float)
+    def _load_csv_from_string(self, csv_content: str, dtype=None, with_times=False):
+        """从字符串加载CSV数据 - 适配你的CSV格式（解析逻辑见 stroke_core.load_imu_csv）"""
+        logger.info(f"📖 解析CSV内容，总字符数: {len(csv_content)}")
+        return load_imu_csv(csv_content, dtype=dtype, with_times=with_times)
     
-    def _detect_stroke_timestamps(self, gyro, acc, threshold=300.0):
+    def _detect_stroke_timestamps(self, gyro, acc, threshold=300.0, derived=None):
         """检测击球时间戳"""
-        gyro = np.array(gyro, float)
-        acc = np.array(acc, float)
-        
-        # 计算角速度变化
-        gyro_diff = np.abs(np.diff(gyro, axis=0))
-        
-        # 符号变化检测
-        gyro_sign_change = np.diff(np.sign(gyro), axis=0)
-        acc_sign_change = np.diff(np.sign(acc), axis=0)
-        
-        stroke_indices = []
-        
-        for i in range(len(gyro_diff)):
-            # 检查是否有角速度超过阈值
-            if np.any(gyro_diff[i] > threshold):
-                # 检查前后窗口内的符号变化
-                start = max(0, i - 3)
-                end = min(len(gyro_sign_change), i + 3)
-                
-                has_change = (
-                    np.any(np.abs(gyro_sign_change[start:end]) > 0) and
-                    np.any(np.abs(acc_sign_change[start:end]) > 0)
-                )
-                
-                if has_change:
-                    stroke_indices.append(i + 1)  # +1因为diff减少了索引
-        
-        return stroke_indices
+        return detect_stroke_timestamps(gyro, acc, threshold, derived=derived)
     
     def _filter_timestamps(self, timestamps, min_gap=75):
         """过滤时间戳，避免重复检测"""
-        if not timestamps:
-            return []
-        
-        filtered = [timestamps[0]]
-        for i in range(1, len(timestamps)):
-            if timestamps[i] - timestamps[i - 1] >= min_gap:
-                filtered.append(timestamps[i])
-        
-        return filtered
-    
-    def _extract_stroke_slices(self, acc, gyro, timestamps, window_size=200, plot=False):
-        """提取击球窗口切片"""
-        acc_slices = []
-        gyro_slices = []
-        half = window_size // 2
-        
-        for t in timestamps:
-            start = max(t - half, 0)
-            end = min(t + half, len(acc))
-            
-            # 确保窗口大小一致
-            if end - start == window_size:
-                acc_slice = acc[start:end]
-                gyro_slice = gyro[start:end]
-                
-                acc_slices.append(acc_slice.tolist())  # 转换为列表便于JSON序列化
-                gyro_slices.append(gyro_slice.tolist())
-        
-        return acc_slices, gyro_slices
+        return filter_timestamps(timestamps, min_gap)
     
-    def _analyze_strokes(self, acc_slices, gyro_slices):
-        """分析每个击球的特征"""
-        if not acc_slices:
-            return []
+    def _extract_stroke_slices(self, acc, gyro, timestamps, window_size=200, plot=False, ang=None):
+        """
+        提取击球窗口切片
         
-        stroke_analysis = []
+        返回 (击球数, 窗口长度, 3) 的张量，只保留完整窗口；没有角度数据时 ang 切片为None
+        """
+        acc_slices, gyro_slices, ang_slices = extract_stroke_windows(acc, gyro, timestamps, window_size, ang)
         
-        for i, (acc_slice, gyro_slice) in enumerate(zip(acc_slices, gyro_slices)):
-            acc_array = np.array(acc_slice)
-            gyro_array = np.array(gyro_slice)
-            
-            # 计算基本特征
-            acc_magnitude = np.sqrt(np.sum(acc_array**2, axis=1))
-            gyro_magnitude = np.sqrt(np.sum(gyro_array**2, axis=1))
-            
-            stroke_features = {
-                "stroke_id": i + 1,
-                "peak_acceleration": float(np.max(acc_magnitude)),
-                "peak_rotation": float(np.max(gyro_magnitude)),
-                "avg_acceleration": float(np.mean(acc_magnitude)),
-                "avg_rotation": float(np.mean(gyro_magnitude)),
-                "stroke_power": float(np.max(acc_magnitude) * np.max(gyro_magnitude)),
-                "duration_points": len(acc_slice)
-            }
-            
-            # 判断击球类型（简化版）
-            stroke_type = self._classify_stroke_type(stroke_features)
-            stroke_features["estimated_type"] = stroke_type
-            
-            stroke_analysis.append(stroke_features)
+        if plot:
+            plot_stroke_windows(acc_slices, gyro_slices)
         
-        return stroke_analysis
+        return acc_slices, gyro_slices, ang_slices
     
-    def _classify_stroke_type(self, features):
-        """根据特征判断击球类型"""
-        peak_acc = features["peak_acceleration"]
-        peak_rot = features["peak_rotation"]
+    def _analyze_strokes(self, acc_slices, gyro_slices, ang_slices=None, layout='rows', magnitudes=None,
+                         sample_rate=DEFAULT_SAMPLE_RATE, offsets=None):
+        """
+        分析每个击球的特征（所有击球一次性向量化计算）
         
-        if peak_acc < 2.0 and peak_rot < 200:
-            return "轻击/短球"
-        elif peak_acc < 5.0 and peak_rot < 500:
-            return "正常击球"
-        elif peak_acc < 8.0:
-            return "强力击球"
-        else:
-            return "非常强力击球"
+        layout='rows' 返回每个击球一个字典的列表；'columnar' 返回 {特征名: 每个击球的值列表}
+        magnitudes 为预先计算的 (加速度模长窗口, 角速度模长窗口)
+        sample_rate 为实际采样率 (Hz)，用于挥拍时长、急动度、主频等特征
+        offsets 为每个击球点距会话开始的秒数（有时间戳时），输出为 offset_s 字段
+        """
+        if len(acc_slices) == 0:
+            return {} if layout == 'columnar' else []
+        
+        acc_magnitude, gyro_magnitude = magnitudes if magnitudes is not None else (None, None)
+        features = extract_stroke_features(acc_slices, gyro_slices, ang_slices, sample_rate=sample_rate,
+                                           acc_magnitude=acc_magnitude, gyro_magnitude=gyro_magnitude)
+        n_strokes = len(acc_slices)
+        
+        # 一次性转换为Python类型，避免逐个 float()；字段顺序与逐击球字典一致
+        columns = {"stroke_id": list(range(1, n_strokes + 1))}
+        if offsets is not None:
+            columns["offset_s"] = np.asarray(offsets, dtype=np.float64).tolist()
+        for name in STROKE_FEATURE_COLUMNS:
+            if name == "duration_points":
+                columns[name] = [acc_slices.shape[1]] * n_strokes
+            elif name in features:
+                columns[name] = features[name].tolist()
+        
+        # 判断击球类型（简化版）
+        columns["estimated_type"] = self._classify_stroke_types(
+            features["peak_acceleration"], features["peak_rotation"]).tolist()
+        
+        if layout == 'columnar':
+            return columns
+        
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+    
+    def _classify_stroke_types(self, peak_acc, peak_rot):
+        """根据峰值加速度和角速度判断击球类型（按击球向量化）"""
+        return np.select(
+            [(peak_acc < 2.0) & (peak_rot < 200), (peak_acc < 5.0) & (peak_rot < 500), peak_acc < 8.0],
+            ["轻击/短球", "正常击球", "强力击球"],
+            default="非常强力击球"
+        )
     
     def _calculate_average_interval(self, timestamps):
         """计算平均击球间隔"""
@@ -342,11 +294,28 @@ _stroke_analyzer = TennisStrokeAnalyzer()
 
 # 简化调用接口
 def analyze_tennis_strokes(csv_content: str, threshold: float = 300.0, 
-                          slice_len: int = 200, plot: bool = False) -> Dict[str, Any]:
+                          slice_len: int = 200, plot: bool = False, dtype=None,
+                          layout: str = 'rows', profile_memory=None) -> Dict[str, Any]:
     """
     网球击球分析主函数
     """
-    return _stroke_analyzer.analyze_stroke_from_csv_content(csv_content, threshold, slice_len, plot)
+    return _stroke_analyzer.analyze_stroke_from_csv_content(csv_content, threshold, slice_len, plot, dtype, layout,
+                                                              profile_memory)
+
+def analyze_tennis_arrays(acc, gyro, ang=None, threshold: float = 300.0, slice_len: int = 200,
+                          derived=None, layout: str = 'rows', profiler=None, times=None) -> Dict[str, Any]:
+    """
+    对已解析的数组做网球击球分析（上传时与预计算通道共用一次解析，重新分析时直接读取缓存的数组）
+    """
+    return _stroke_analyzer.analyze_arrays(acc, gyro, ang, threshold, slice_len, layout=layout, derived=derived,
+                                           profiler=profiler, times=times)
+
+def load_sensor_csv(csv_content: str, dtype=None, with_times: bool = False):
+    """
+    解析CSV文本，返回 (acc, gyro, ang) 数组，供其他分析模块复用
+    with_times=True 时返回 (acc, gyro, ang, times)，times 为每行的 datetime64[ms] 时间戳
+    """
+    return _stroke_analyzer._load_csv_from_string(csv_content, dtype, with_times=with_times)
 
 # 测试函数
 if __name__ == "__main__":
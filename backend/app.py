@@ -8,6 +8,15 @@ import os
 import json
 import uuid
 import logging
+import threading
+from html import escape
+from session_summary import SessionSummaryIndex, build_session_summary, is_session_metadata_file
+from player_stats import PlayerStatsAggregator
+from stroke_index import StrokeIndex, FEATURE_COLUMNS
+from session_store import SessionStore, MANIFEST_SUFFIX
+from session_archive import SessionArchive, RetentionPolicy, RetentionService
+from admission import AdmissionController, admission_limited
+from serialization import dumps as dumps_json, loads as loads_json, json_response, resolve_layout, with_layout
 
 # 获取当前文件所在目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,21 +26,65 @@ UPLOAD_FOLDER = 'sensor_data_uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # 添加analyzers目录到Python路径
+# 分析模块（numpy / scipy）都在接口内部按需导入，导入 app 本身只需要 flask
 analyzers_dir = os.path.join(current_dir, 'analyzers')
 if analyzers_dir not in sys.path:
     sys.path.insert(0, analyzers_dir)  # 插入到最前面
-    print(f"✅ 添加分析模块路径: {analyzers_dir}")
 
-# 打印调试信息
-print(f"📁 当前工作目录: {os.getcwd()}")
-print(f"📁 当前文件目录: {current_dir}")
-print(f"📁 analyzers目录: {analyzers_dir}")
-print(f"📁 目录存在: {os.path.exists(analyzers_dir)}")
+def print_startup_diagnostics():
+    """打印路径调试信息（只在直接运行时打印，导入时不做目录扫描）"""
+    print(f"✅ 分析模块路径: {analyzers_dir}")
+    print(f"📁 当前工作目录: {os.getcwd()}")
+    print(f"📁 当前文件目录: {current_dir}")
+    print(f"📁 目录存在: {os.path.exists(analyzers_dir)}")
+    
+    if os.path.exists(analyzers_dir):
+        print("📂 analyzers内容:")
+        for item in os.listdir(analyzers_dir):
+            print(f"   - {item}")
+
+def preload_analyzers():
+    """
+    预先导入分析模块（numpy / scipy），让第一个分析请求不用再等导入
+    设置环境变量 PRELOAD_ANALYZERS=1 时在后台线程中执行，不阻塞启动
+    """
+    import tennis_stroke_analyzer  # noqa: F401
+    import spectral_analyzer  # noqa: F401
+    from scipy import signal  # noqa: F401
+
+if os.environ.get('PRELOAD_ANALYZERS') == '1':
+    threading.Thread(target=preload_analyzers, name='preload-analyzers', daemon=True).start()
+
+# 会话摘要索引（看板和列表从这里读取，不再逐个打开会话文件）
+summary_index = SessionSummaryIndex(UPLOAD_FOLDER)
+
+# 跨会话设备统计（每次分析后增量合并）
+player_stats = PlayerStatsAggregator(UPLOAD_FOLDER)
+
+# 击球级索引（SQLite，按设备/时间/特征范围查询单个击球）
+stroke_index = StrokeIndex(UPLOAD_FOLDER)
+
+# 会话文件原子写入 + 组提交 fsync（开发环境可设置 SESSION_FSYNC=0 跳过 fsync）
+session_store = SessionStore(UPLOAD_FOLDER, fsync=os.environ.get('SESSION_FSYNC', '1') != '0')
 
-if os.path.exists(analyzers_dir):
-    print("📂 analyzers内容:")
-    for item in os.listdir(analyzers_dir):
-        print(f"   - {item}")
+# 上传时把解析好的数组和检测/特征用的派生通道存成 <会话>_derived.npz，重新分析时直接读取（SESSION_DERIVED_CACHE=0 关闭）
+DERIVED_CACHE_ENABLED = os.environ.get('SESSION_DERIVED_CACHE', '1') != '0'
+
+# 旧会话压缩归档 + 保留策略（RETENTION_ENABLED=1 时在后台定期执行，策略见 RetentionPolicy.from_env）
+session_archive = SessionArchive(UPLOAD_FOLDER)
+retention_service = RetentionService(
+    session_archive,
+    RetentionPolicy.from_env(),
+    interval=float(os.environ.get('RETENTION_INTERVAL_S', 3600)),
+    on_deleted=lambda names: (summary_index.rebuild(), stroke_index.remove_sessions(names))
+)
+if os.environ.get('RETENTION_ENABLED') == '1':
+    retention_service.start()
+
+# 分析类接口的并发准入控制（每个接口独立排队，排不上返回429；限制见 AdmissionController.from_env）
+admission_controllers = {
+    name: AdmissionController.from_env(name) for name in ('advanced', 'tennis', 'sweep', 'upload')
+}
 
 app = Flask(__name__)
 CORS(app)  # 允许所有跨域请求，方便调试
@@ -40,32 +93,47 @@ CORS(app)  # 允许所有跨域请求，方便调试
 def home():
     return "传感器分析服务器已启动！"
 
+def _format_optional(value, fmt, unit=''):
+    """摘要中缺失的值显示为 -"""
+    return '-' if value is None else format(value, fmt) + unit
+
 @app.route('/recordings', methods=['GET'])
 def recordings_dashboard():
     """
-    录制数据管理 Web 界面
+    录制数据管理 Web 界面（从摘要索引分页渲染）
     """
     try:
-        recordings = []
+        result = summary_index.page(
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', 50, type=int)
+        )
         
-        for filename in os.listdir(UPLOAD_FOLDER):
-            if filename.endswith('.json') and '_analysis' not in filename:
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    metadata = data.get('metadata', {})
-                    recordings.append({
-                        "id": metadata.get('session_id', 'unknown'),
-                        "device": metadata.get('device_name', 'unknown'),
-                        "duration": metadata.get('recording_duration', 0),
-                        "points": metadata.get('data_points', 0),
-                        "time": metadata.get('upload_timestamp', ''),
-                        "size": metadata.get('file_size', 0)
-                    })
-                except:
-                    continue
+        rows = []
+        for rec in result['items']:
+            rows.append(f"""
+                <tr>
+                    <td><code>{escape(str(rec['session_id']))}</code></td>
+                    <td>{escape(str(rec['device']))}</td>
+                    <td>{_format_optional(rec.get('duration_s'), '.1f', '秒')}</td>
+                    <td>{escape(str(rec['data_points']))}</td>
+                    <td>{_format_optional(rec.get('stroke_count'), 'd')}</td>
+                    <td>{_format_optional(rec.get('average_interval_s'), '.1f', '秒')}</td>
+                    <td>{_format_optional(rec.get('peak_power'), ',.0f')}</td>
+                    <td>{escape(str(rec['upload_timestamp']))}</td>
+                    <td>{rec['file_size']:,} 字符</td>
+                    <td>
+                        <a href="/api/recordings/{escape(str(rec['session_id']))}" target="_blank">查看详情</a>
+                    </td>
+                </tr>
+            """)
+        
+        page, pages, per_page = result['page'], result['pages'], result['per_page']
+        pager = []
+        if page > 1:
+            pager.append(f'<a href="?page={page - 1}&per_page={per_page}">上一页</a>')
+        pager.append(f'第 {page} / {max(pages, 1)} 页')
+        if page < pages:
+            pager.append(f'<a href="?page={page + 1}&per_page={per_page}">下一页</a>')
         
         # 生成HTML页面
         html = """
@@ -74,19 +142,19 @@ def recordings_dashboard():
         <head>
             <title>录制数据管理</title>
             <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                table { border-collapse: collapse; width: 100%; }
-                th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
-                th { background-color: #f2f2f2; }
-                tr:hover { background-color: #f5f5f5; }
-                .success { color: green; }
-                .error { color: red; }
+                body {{ font-family: Arial, sans-serif; margin: 20px; }}
+                table {{ border-collapse: collapse; width: 100%; }}
+                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+                th {{ background-color: #f2f2f2; }}
+                tr:hover {{ background-color: #f5f5f5; }}
+                .success {{ color: green; }}
+                .error {{ color: red; }}
             </style>
         </head>
         <body>
             <h1>录制数据管理</h1>
-            <p>存储路径: <code>{}</code></p>
-            <p>总计: {} 个录制</p>
+            <p>存储路径: <code>{folder}</code></p>
+            <p>总计: {total} 个录制</p>
             
             <table>
                 <tr>
@@ -94,39 +162,53 @@ def recordings_dashboard():
                     <th>设备</th>
                     <th>时长</th>
                     <th>数据点</th>
+                    <th>击球数</th>
+                    <th>平均间隔</th>
+                    <th>最大力量</th>
                     <th>时间</th>
                     <th>大小</th>
                     <th>操作</th>
                 </tr>
-        """.format(UPLOAD_FOLDER, len(recordings))
-        
-        for rec in recordings:
-            html += f"""
-                <tr>
-                    <td><code>{rec['id']}</code></td>
-                    <td>{rec['device']}</td>
-                    <td>{rec['duration']:.1f}秒</td>
-                    <td>{rec['points']}</td>
-                    <td>{rec['time']}</td>
-                    <td>{rec['size']:,} 字符</td>
-                    <td>
-                        <a href="/api/recordings/{rec['id']}" target="_blank">查看详情</a>
-                    </td>
-                </tr>
-            """
-        
-        html += """
+                {rows}
             </table>
-            <br>
+            <p>{pager}</p>
             <a href="/">返回首页</a>
         </body>
         </html>
-        """
+        """.format(folder=escape(UPLOAD_FOLDER), total=result['total'],
+                   rows=''.join(rows), pager=' | '.join(pager))
         
         return html
         
     except Exception as e:
-        return f"<h1>错误</h1><p>{str(e)}</p>", 500
+        return f"<h1>错误</h1><p>{escape(str(e))}</p>", 500
+
+@app.route('/api/recordings/summaries', methods=['GET'])
+def list_recording_summaries():
+    """
+    分页返回会话摘要（击球数、平均间隔、最大力量、时长）
+    """
+    try:
+        result = summary_index.page(
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', 50, type=int)
+        )
+        return jsonify({
+            "success": True,
+            "summaries": result['items'],
+            "page": result['page'],
+            "per_page": result['per_page'],
+            "pages": result['pages'],
+            "total": result['total'],
+            "timestamp": datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -156,13 +238,9 @@ def analyze_simple():
         # 计算合加速度
         magnitude = math.sqrt(acc_x**2 + acc_y**2 + acc_z**2)
         
-        # 判断状态
-        if magnitude < 1.0:
-            state = "静止"
-        elif magnitude <3.0:
-            state = "行走"
-        else:
-            state = "剧烈运动"
+        # 判断状态（阈值与批量接口共用）
+        from motion_state import classify_motion_state
+        state = classify_motion_state(magnitude)
         
         return jsonify({
             "success": True,
@@ -187,22 +265,61 @@ def analyze_simple():
             "timestamp": datetime.now().isoformat()
         }), 400
 
-@app.route('/api/analyze/advanced', methods=['POST'])
-def analyze_advanced():
+@app.route('/api/analyze/simple/batch', methods=['POST'])
+def analyze_simple_batch():
     """
-    更复杂的分析（可选）
+    批量版简单分析接口：一次请求处理多个样本
+    
+    请求格式（二选一）:
+        JSON: {"samples": {"acc_x": [...], "acc_y": [...], "acc_z": [...]}}
+              或 {"samples": [[acc_x, acc_y, acc_z], ...]}
+        二进制: Content-Type: application/octet-stream，小端float32，每个样本3个值
+    
+    返回紧凑数组；URL参数 format=binary 时直接返回二进制
+    （float32合加速度数组 + uint8状态编码数组）
     """
     try:
-        data = request.json
+        import numpy as np
+        from motion_state import (MOTION_STATES, analyze_motion_batch,
+                                  parse_binary_samples, parse_json_samples)
+        
+        if request.mimetype == 'application/octet-stream':
+            acc = parse_binary_samples(request.get_data())
+        else:
+            data = request.get_json(silent=True) or {}
+            if 'samples' not in data:
+                return jsonify({
+                    "success": False,
+                    "error": "未提供 samples",
+                    "timestamp": datetime.now().isoformat()
+                }), 400
+            acc = parse_json_samples(data['samples'])
+        
+        result = analyze_motion_batch(acc)
         
-        # 这里可以添加更复杂的分析逻辑
-        # 比如使用numpy进行FFT分析等
+        if request.args.get('format') == 'binary':
+            body = (result['magnitudes'].astype('<f4').tobytes()
+                    + result['states'].tobytes())
+            return body, 200, {
+                "Content-Type": "application/octet-stream",
+                "X-Sample-Count": str(len(acc))
+            }
         
         return jsonify({
             "success": True,
-            "message": "高级分析功能",
-            "features": ["频谱分析", "模式识别", "趋势预测"],
-            "status": "开发中",
+            "message": "批量分析成功",
+            "data": {
+                "sample_count": len(acc),
+                "acceleration_magnitude": np.round(result['magnitudes'], 4).tolist(),
+                "motion_state": result['states'].tolist(),
+                "state_labels": MOTION_STATES,
+                "state_counts": result['counts']
+            },
+            "server_info": {
+                "host": "localhost",
+                "python_version": "3.x",
+                "endpoint": "simple_batch"
+            },
             "timestamp": datetime.now().isoformat()
         })
         
@@ -212,27 +329,172 @@ def analyze_advanced():
             "error": str(e),
             "timestamp": datetime.now().isoformat()
         }), 400
+
+def find_session_path(session_id, suffix):
+    """
+    根据会话ID（短ID或完整文件名）查找存储目录中的文件
+    """
+    for filename in os.listdir(UPLOAD_FOLDER):
+        if not filename.endswith(suffix):
+            continue
+        name = filename[:-len(suffix)]
+        if name == session_id or name.endswith(f"_{session_id}"):
+            return os.path.join(UPLOAD_FOLDER, filename)
+    return None
+
+def open_session_csv(session_id):
+    """
+    查找会话CSV（存储目录优先，其次归档），返回 (读取CSV文本的函数, 缓存键)；找不到时返回 (None, None)
+    """
+    csv_path = find_session_path(session_id, '.csv')
+    if csv_path is not None:
+        # 文件修改时间作为缓存版本，会话文件被改写后自动失效
+        stat = os.stat(csv_path)
+        
+        def read_csv():
+            with open(csv_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        return read_csv, (os.path.basename(csv_path), stat.st_mtime_ns, stat.st_size)
+    
+    entry = session_archive.find(session_id)
+    if entry is not None:
+        def read_archived_csv():
+            return session_archive.read_member(entry, '.csv').decode('utf-8')
+        return read_archived_csv, (f"{entry['name']}.csv", entry['segment'])
+    
+    return None, None
+
+def open_session_arrays(session_id, dtype=None):
+    """
+    读取会话的 (acc, gyro, ang, derived)：优先使用上传时预计算的 _derived.npz，
+    没有时（旧会话、归档会话、缓存失效）解析CSV并计算，存储目录中的会话顺便补写缓存。
+    找不到会话时返回None
+    """
+    from tennis_stroke_analyzer import load_sensor_csv
+    from session_arrays import DERIVED_SUFFIX, compute_session_arrays, encode_session_arrays, load_session_arrays
+    from stroke_core import resolve_dtype
+    
+    csv_path = find_session_path(session_id, '.csv')
+    if csv_path is not None:
+        derived_path = csv_path[:-len('.csv')] + DERIVED_SUFFIX
+        try:
+            cached = load_session_arrays(derived_path, dtype, not_older_than=os.path.getmtime(csv_path))
+        except OSError:
+            cached = None  # 读取途中刚好被压缩进归档
+        if cached is not None:
+            return cached
+    
+    read_csv, _ = open_session_csv(session_id)
+    if read_csv is None:
+        return None
+    acc, gyro, ang, times = load_sensor_csv(read_csv(), dtype, with_times=True)
+    derived = compute_session_arrays(acc, gyro, ang, times) if len(acc) else None
+    
+    # 只按默认精度补写，避免不同精度的请求来回覆盖
+    if (csv_path is not None and derived is not None and DERIVED_CACHE_ENABLED
+            and acc.dtype == resolve_dtype(None)):
+        try:
+            session_store.write_files({os.path.basename(derived_path): encode_session_arrays(acc, gyro, ang, derived)})
+        except OSError as cache_error:
+            print(f"⚠️  预计算数组写入失败: {cache_error}")
+    return acc, gyro, ang, derived
+
+@app.route('/api/analyze/advanced', methods=['POST'])
+@admission_limited(admission_controllers['advanced'])
+def analyze_advanced():
+    """
+    高级分析：频谱分析（Welch功率谱 / 加窗rFFT时频谱）
+    可以分析已上传的会话（session_id）或直接提交的CSV内容（csv_content）
+    同一会话、同一窗口参数的结果会被缓存
+    """
+    try:
+        data = request.json or {}
+        
+        from tennis_stroke_analyzer import load_sensor_csv
+        from spectral_analyzer import analyze_session_spectra
+        from stroke_core import build_sample_timeline
+        
+        session_id = data.get('session_id')
+        if session_id:
+            read_csv, cache_key = open_session_csv(session_id)
+            if read_csv is None:
+                return jsonify({
+                    "success": False,
+                    "error": f"未找到会话 {session_id}",
+                    "timestamp": datetime.now().isoformat()
+                }), 404
+        elif 'csv_content' in data:
+            cache_key = None
+            
+            def read_csv():
+                return data['csv_content']
+        else:
+            return jsonify({
+                "success": False,
+                "error": "未提供 session_id 或 CSV内容",
+                "timestamp": datetime.now().isoformat()
+            }), 400
+        
+        noverlap = data.get('noverlap')
+        params = {
+            # 不指定时按时间戳实测的采样率
+            "sample_rate": float(data['sample_rate']) if data.get('sample_rate') is not None else None,
+            "nperseg": int(data.get('nperseg', 256)),
+            "noverlap": int(noverlap) if noverlap is not None else None,
+            "window": data.get('window', 'hann'),
+            "method": data.get('method', 'welch')
+        }
+        
+        # 只有缓存未命中时才读取数据；已存储的会话优先读取预计算数组，不再解析CSV
+        def load_data():
+            if session_id:
+                acc, gyro, _, timeline = open_session_arrays(session_id)
+            else:
+                acc, gyro, ang, times = load_sensor_csv(read_csv(), with_times=True)
+                timeline = build_sample_timeline(times, acc, gyro, ang)
+            if timeline is None or "sample_index" not in timeline:
+                return acc, gyro, None
+            # 有时间戳时去掉重复包，采样率取标称间隔
+            interval = float(timeline["sample_interval_ms"])
+            sample_index = timeline["sample_index"]
+            return acc[sample_index], gyro[sample_index], (1000.0 / interval if interval > 0 else None)
+        
+        result = analyze_session_spectra(load_data, cache_key=cache_key, **params)
+        if session_id:
+            result["session_id"] = session_id
+        
+        return jsonify(result), (200 if result.get('success') else 400)
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
     
 @app.route('/api/analyze/tennis', methods=['POST'])
+@admission_limited(admission_controllers['tennis'])
 def analyze_tennis():
     """
     网球击球分析接口
-    接收CSV格式的网球训练数据进行击球检测
+    接收CSV格式的网球训练数据进行击球检测；传 session_id 时重新分析已存储的会话（读取预计算数组）
     """
     try:
         data = request.json
         print(f"🎾 收到请求，数据键: {list(data.keys()) if data else '无数据'}")
         
-        if not data or 'csv_content' not in data:
+        session_id = data.get('session_id') if data else None
+        if not data or ('csv_content' not in data and not session_id):
             return jsonify({
                 "success": False,
                 "error": "未提供CSV内容",
                 "timestamp": datetime.now().isoformat()
             }), 400
         
-        csv_content = data['csv_content']
-        print(f"🎾 CSV内容长度: {len(csv_content)} 字符")
-        print(f"🎾 CSV前100字符: {csv_content[:100]}")
+        csv_content = data.get('csv_content')
+        if not session_id:
+            print(f"🎾 CSV内容长度: {len(csv_content)} 字符")
+            print(f"🎾 CSV前100字符: {csv_content[:100]}")
         
         # 获取可选参数
         threshold = float(data.get('threshold', 300.0))
@@ -242,33 +504,48 @@ def analyze_tennis():
         
         # 尝试导入和分析
         try:
-            # 动态导入，提供更多调试信息
-            module_path = os.path.join(analyzers_dir, 'tennis_stroke_analyzer.py')
-            print(f"📂 尝试导入模块: {module_path}")
-            print(f"📂 模块文件存在: {os.path.exists(module_path)}")
-            
-            # 清除可能的缓存
-            import importlib
-            if 'tennis_stroke_analyzer' in sys.modules:
-                del sys.modules['tennis_stroke_analyzer']
-            
-            # 尝试导入
-            from tennis_stroke_analyzer import analyze_tennis_strokes
-            print("✅ 成功导入网球分析模块")
+            # 按需导入（第一次请求时加载numpy，之后直接使用已缓存的模块）
+            from tennis_stroke_analyzer import analyze_tennis_strokes, analyze_tennis_arrays
+            from memory_profile import StageProfiler, PROFILE_BY_DEFAULT
             
             # 进行分析
             print("🎾 开始分析数据...")
-            result = analyze_tennis_strokes(
-                csv_content, 
-                threshold=threshold, 
-                slice_len=slice_len, 
-                plot=False
-            )
+            if session_id:
+                profiler = StageProfiler(enabled=bool(data.get('profile_memory', PROFILE_BY_DEFAULT)))
+                with profiler:
+                    with profiler.stage('load'):
+                        arrays = open_session_arrays(session_id, data.get('dtype'))
+                    if arrays is not None:
+                        acc, gyro, ang, derived = arrays
+                        result = analyze_tennis_arrays(acc, gyro, ang, threshold=threshold, slice_len=slice_len,
+                                                       derived=derived, layout=data.get('layout', 'rows'),
+                                                       profiler=profiler)
+                if arrays is None:
+                    return jsonify({
+                        "success": False,
+                        "error": f"未找到会话 {session_id}",
+                        "timestamp": datetime.now().isoformat()
+                    }), 404
+                result["session_id"] = session_id
+                if profiler.enabled and result.get('success'):
+                    profiler.samples = len(acc)
+                    result["analysis_info"]["memory_profile"] = profiler.report()
+                    profiler.log(f"会话 {session_id} 重新分析")
+            else:
+                result = analyze_tennis_strokes(
+                    csv_content, 
+                    threshold=threshold, 
+                    slice_len=slice_len, 
+                    plot=False,
+                    dtype=data.get('dtype'),  # 可选 'float32'，默认见 ANALYSIS_DTYPE
+                    layout=data.get('layout', 'rows'),  # 可选 'columnar'：每个特征一个数组
+                    profile_memory=data.get('profile_memory')  # 可选：各阶段内存分配写入 analysis_info
+                )
             
             print(f"🎾 分析完成，结果: {result.get('success', False)}")
-            print(f"🎾 检测到击球数: {len(result.get('strokes', []))}")
+            print(f"🎾 检测到击球数: {result.get('data', {}).get('strokes_detected', 0)}")
             
-            return jsonify(result)
+            return json_response(result)
             
         except ImportError as ie:
             print(f"❌ 导入错误: {str(ie)}")
@@ -299,8 +576,63 @@ def analyze_tennis():
             "error": f"请求处理失败: {str(e)}",
             "timestamp": datetime.now().isoformat()
         }), 500
-    
+
+@app.route('/api/analyze/tennis/sweep', methods=['POST'])
+@admission_limited(admission_controllers['sweep'])
+def analyze_tennis_sweep():
+    """
+    击球检测参数扫描
+    对同一会话（session_id 或 csv_content）批量尝试 thresholds × min_gaps × slice_lens，
+    返回每组参数的击球数；CSV只解析一次，派生通道只计算一次（已存储的会话直接读取预计算的派生通道）
+    """
+    try:
+        data = request.json or {}
+
+        from tennis_stroke_analyzer import load_sensor_csv
+        from parameter_sweep import run_parameter_sweep, DEFAULT_THRESHOLDS, DEFAULT_MIN_GAPS, DEFAULT_SLICE_LENS
+
+        session_id = data.get('session_id')
+        if session_id:
+            arrays = open_session_arrays(session_id, data.get('dtype'))
+            if arrays is None:
+                return jsonify({
+                    "success": False,
+                    "error": f"未找到会话 {session_id}",
+                    "timestamp": datetime.now().isoformat()
+                }), 404
+            acc, gyro, ang, derived = arrays
+            times = None
+        elif 'csv_content' in data:
+            acc, gyro, ang, times = load_sensor_csv(data['csv_content'], data.get('dtype'), with_times=True)
+            derived = None
+        else:
+            return jsonify({
+                "success": False,
+                "error": "未提供 session_id 或 CSV内容",
+                "timestamp": datetime.now().isoformat()
+            }), 400
+
+        grid = {
+            "thresholds": [float(v) for v in data.get('thresholds', DEFAULT_THRESHOLDS)],
+            "min_gaps": [int(v) for v in data.get('min_gaps', DEFAULT_MIN_GAPS)],
+            "slice_lens": [int(v) for v in data.get('slice_lens', DEFAULT_SLICE_LENS)]
+        }
+
+        result = run_parameter_sweep(acc, gyro, derived=derived, times=times, ang=ang, **grid)
+        if session_id:
+            result["session_id"] = session_id
+
+        return json_response(result, 200 if result.get('success') else 400)
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+
 @app.route('/api/recordings/upload', methods=['POST'])
+@admission_limited(admission_controllers['upload'])
 def upload_recording():
     """
     接收并存储录制数据接口
@@ -320,14 +652,25 @@ def upload_recording():
                 "timestamp": datetime.now().isoformat()
             }), 400
         
+        # 响应中击球结果的布局；存储的分析文件始终是 rows 布局
+        try:
+            layout = resolve_layout(data.get('layout'))
+        except ValueError as layout_error:
+            return jsonify({
+                "success": False,
+                "error": str(layout_error),
+                "timestamp": datetime.now().isoformat()
+            }), 400
+        
         # 生成唯一ID和文件名
         session_id = str(uuid.uuid4())[:8]
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"session_{timestamp}_{session_id}"
         
-        # 保存原始数据
+        # 文件路径
         raw_data_path = os.path.join(UPLOAD_FOLDER, f"{filename}.json")
         csv_data_path = os.path.join(UPLOAD_FOLDER, f"{filename}.csv")
+        analysis_path = os.path.join(UPLOAD_FOLDER, f"{filename}_analysis.json")
         
         # 保存JSON元数据
         metadata = {
@@ -338,50 +681,99 @@ def upload_recording():
             "recording_duration": data.get('recording_duration', 0),
             "data_points": data.get('data_points', 0),
             "upload_timestamp": datetime.now().isoformat(),
-            "file_size": len(data.get('csv_content', ''))
+            "file_size": len(data.get('csv_content', '')),
+            "manifest": f"{filename}{MANIFEST_SUFFIX}"
         }
         
-        with open(raw_data_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                "metadata": metadata,
-                "raw_data": data  # 包含所有原始数据
-            }, f, indent=2, ensure_ascii=False)
-        
-        # 保存CSV数据
+        # 先原子写入CSV并落盘：即使后面的分析失败或进程崩溃，原始数据也不会丢
         csv_content = data['csv_content']
-        with open(csv_data_path, 'w', encoding='utf-8') as f:
-            f.write(csv_content)
+        csv_bytes = csv_content.encode('utf-8')
+        session_store.write_files({f"{filename}.csv": csv_bytes})
+        
+        print(f"💾 CSV已保存: {csv_data_path}")
+        
+        # 可选：记录解析、分析、序列化、写盘各阶段的内存分配（ANALYSIS_PROFILE_MEMORY=1 时全部开启）
+        from memory_profile import StageProfiler, PROFILE_BY_DEFAULT
+        profiler = StageProfiler(enabled=bool(data.get('profile_memory', PROFILE_BY_DEFAULT)))
+        with profiler:
+            # 自动触发网球分析
+            analysis_result = None
+            analysis_bytes = None
+            derived_bytes = None
+            try:
+                # 调用现有的网球分析功能：CSV只解析一次，派生通道同时用于本次分析和之后的重新分析
+                from tennis_stroke_analyzer import load_sensor_csv, analyze_tennis_arrays
+                from session_arrays import compute_session_arrays, encode_session_arrays
+                with profiler.stage('parse'):
+                    acc, gyro, ang, times = load_sensor_csv(csv_content, data.get('dtype'), with_times=True)
+                profiler.samples = len(acc)
+                with profiler.stage('derived'):
+                    derived = compute_session_arrays(acc, gyro, ang, times) if len(acc) else None
+                analysis_result = analyze_tennis_arrays(
+                    acc, gyro, ang,
+                    threshold=float(data.get('threshold', 300.0)),
+                    slice_len=int(data.get('slice_len', 200)),
+                    derived=derived,
+                    profiler=profiler
+                )
+                with profiler.stage('serialize'):
+                    analysis_bytes = dumps_json(analysis_result)
+                    if derived is not None and DERIVED_CACHE_ENABLED:
+                        derived_bytes = encode_session_arrays(acc, gyro, ang, derived)
+                print(f"🎾 分析完成")
+            
+            except Exception as analysis_error:
+                print(f"⚠️  分析过程中出错: {analysis_error}")
+                analysis_result = {
+                    "success": False,
+                    "error": f"分析失败: {str(analysis_error)}",
+                    "note": "数据已保存，但分析失败"
+                }
+            
+            # 元数据、分析结果和完整性清单一起提交：列表中只会出现写完整的会话
+            session_files = {
+                f"{filename}.json": dumps_json({
+                    "metadata": metadata,
+                    # 原始请求中除CSV以外的字段（CSV已单独保存，不再重复存一份）
+                    "raw_data": {k: v for k, v in data.items() if k != 'csv_content'}
+                })
+            }
+            if analysis_bytes is not None:
+                session_files[f"{filename}_analysis.json"] = analysis_bytes
+            with profiler.stage('store'):
+                session_store.commit_session(filename, session_files, committed={f"{filename}.csv": csv_bytes})
+                
+                # 预计算数组只是缓存，不记入清单（丢失时重新分析会从CSV补算）
+                if derived_bytes is not None:
+                    try:
+                        session_store.write_files({f"{filename}_derived.npz": derived_bytes})
+                    except OSError as cache_error:
+                        print(f"⚠️  预计算数组写入失败: {cache_error}")
+        memory_profile = profiler.report()
+        if memory_profile is not None:
+            profiler.log(f"上传 {filename}")
         
         print(f"💾 数据已保存: {filename}")
         print(f"   - JSON: {raw_data_path}")
         print(f"   - CSV: {csv_data_path}")
         
-        # 自动触发网球分析（异步处理）
-        analysis_result = None
+        # 更新会话摘要索引（分析失败也记录，看板中显示为无分析数据）
         try:
-            # 调用现有的网球分析功能
-            from tennis_stroke_analyzer import analyze_tennis_strokes
-            analysis_result = analyze_tennis_strokes(
-                csv_content,
-                threshold=float(data.get('threshold', 300.0)),
-                slice_len=int(data.get('slice_len', 200)),
-                plot=False
-            )
-            
-            # 保存分析结果
-            analysis_path = os.path.join(UPLOAD_FOLDER, f"{filename}_analysis.json")
-            with open(analysis_path, 'w', encoding='utf-8') as f:
-                json.dump(analysis_result, f, indent=2, ensure_ascii=False)
-            
-            print(f"🎾 分析完成，结果已保存")
-            
-        except Exception as analysis_error:
-            print(f"⚠️  分析过程中出错: {analysis_error}")
-            analysis_result = {
-                "success": False,
-                "error": f"分析失败: {str(analysis_error)}",
-                "note": "数据已保存，但分析失败"
-            }
+            summary_index.append(build_session_summary(metadata, analysis_result))
+        except Exception as index_error:
+            print(f"⚠️  摘要索引更新失败: {index_error}")
+        
+        # 合并进设备统计
+        try:
+            player_stats.fold(metadata, analysis_result)
+        except Exception as stats_error:
+            print(f"⚠️  设备统计更新失败: {stats_error}")
+        
+        # 写入击球索引
+        try:
+            stroke_index.add_session(metadata, analysis_result)
+        except Exception as index_error:
+            print(f"⚠️  击球索引更新失败: {index_error}")
         
         # 准备响应
         response_data = {
@@ -390,16 +782,18 @@ def upload_recording():
             "session_id": session_id,
             "filename": filename,
             "metadata": metadata,
-            "analysis": analysis_result,
+            "analysis": with_layout(analysis_result, layout),
             "files": {
                 "raw_data": raw_data_path,
                 "csv_data": csv_data_path,
-                "analysis": analysis_path if analysis_result and analysis_result.get('success') else None
+                "analysis": analysis_path if analysis_result.get('success') else None
             },
             "timestamp": datetime.now().isoformat()
         }
+        if memory_profile is not None:
+            response_data["memory_profile"] = memory_profile
         
-        return jsonify(response_data)
+        return json_response(response_data)
         
     except Exception as e:
         print(f"❌ 上传处理错误: {str(e)}")
@@ -412,6 +806,100 @@ def upload_recording():
             "timestamp": datetime.now().isoformat()
         }), 500
 
+@app.route('/api/stats/devices', methods=['GET'])
+def list_device_stats():
+    """
+    所有设备的跨会话统计
+    """
+    try:
+        devices = player_stats.list_devices()
+        return jsonify({
+            "success": True,
+            "devices": devices,
+            "total": len(devices),
+            "timestamp": datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/stats/devices/<device>', methods=['GET'])
+def get_device_stats(device):
+    """
+    单个设备的跨会话统计：每场击球数、力量分位数、击球类型分布（总计 + 按天）
+    """
+    try:
+        stats = player_stats.get_device(device)
+        if stats is None:
+            return jsonify({
+                "success": False,
+                "error": f"未找到设备 {device} 的统计",
+                "timestamp": datetime.now().isoformat()
+            }), 404
+        
+        return jsonify({
+            "success": True,
+            "stats": stats,
+            "timestamp": datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/strokes', methods=['GET'])
+def query_strokes():
+    """
+    击球查询（跨全部会话，含归档）
+    参数: device, session_id, type, from / to（会话时间，ISO格式或日期）,
+          min_<特征> / max_<特征>（如 min_stroke_power）, order_by, order=asc|desc, limit, offset
+    """
+    try:
+        ranges = {}
+        for name in FEATURE_COLUMNS:
+            low = request.args.get(f'min_{name}', type=float)
+            high = request.args.get(f'max_{name}', type=float)
+            if low is not None or high is not None:
+                ranges[name] = (low, high)
+        
+        result = stroke_index.query(
+            device=request.args.get('device'),
+            session_id=request.args.get('session_id'),
+            since=request.args.get('from'),
+            until=request.args.get('to'),
+            stroke_type=request.args.get('type'),
+            ranges=ranges,
+            order_by=request.args.get('order_by', 'session_time'),
+            descending=request.args.get('order', 'desc') != 'asc',
+            limit=request.args.get('limit', 100, type=int),
+            offset=request.args.get('offset', 0, type=int)
+        )
+        return json_response({
+            "success": True,
+            **result,
+            "timestamp": datetime.now().isoformat()
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
 @app.route('/api/recordings/list', methods=['GET'])
 def list_recordings():
     """
@@ -419,24 +907,45 @@ def list_recordings():
     """
     try:
         recordings = []
+        skipped = []
         
         for filename in os.listdir(UPLOAD_FOLDER):
-            if filename.endswith('.json') and '_analysis' not in filename:
+            if is_session_metadata_file(filename):
                 filepath = os.path.join(UPLOAD_FOLDER, filename)
                 try:
                     with open(filepath, 'r', encoding='utf-8') as f:
                         data = json.load(f)
-                        
-                    recordings.append({
-                        "filename": filename.replace('.json', ''),
-                        "device": data.get('metadata', {}).get('device_name', 'unknown'),
-                        "duration": data.get('metadata', {}).get('recording_duration', 0),
-                        "data_points": data.get('metadata', {}).get('data_points', 0),
-                        "timestamp": data.get('metadata', {}).get('upload_timestamp', ''),
-                        "file_size": data.get('metadata', {}).get('file_size', 0)
-                    })
-                except:
+                except (OSError, ValueError) as read_error:
+                    # 不再静默跳过：无法读取的文件在响应中列出
+                    skipped.append({"filename": filename, "error": str(read_error)})
                     continue
+                
+                metadata = data.get('metadata', {})
+                recordings.append({
+                    "filename": filename.replace('.json', ''),
+                    "device": metadata.get('device_name', 'unknown'),
+                    "duration": metadata.get('recording_duration', 0),
+                    "data_points": metadata.get('data_points', 0),
+                    "timestamp": metadata.get('upload_timestamp', ''),
+                    "file_size": metadata.get('file_size', 0),
+                    "status": session_store.session_state(filename[:-len('.json')], metadata)
+                })
+        
+        # 已压缩归档的会话（元数据来自归档索引，不需要打开压缩包）
+        live_names = {rec["filename"] for rec in recordings}
+        for entry in session_archive.list_sessions():
+            if entry["name"] in live_names:
+                continue
+            metadata = entry["metadata"]
+            recordings.append({
+                "filename": entry["name"],
+                "device": metadata.get('device_name', 'unknown'),
+                "duration": metadata.get('recording_duration', 0),
+                "data_points": metadata.get('data_points', 0),
+                "timestamp": metadata.get('upload_timestamp', ''),
+                "file_size": metadata.get('file_size', 0),
+                "status": "archived"
+            })
         
         # 按时间倒序排序
         recordings.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
@@ -445,6 +954,7 @@ def list_recordings():
             "success": True,
             "recordings": recordings,
             "total": len(recordings),
+            "skipped": skipped,
             "storage_path": UPLOAD_FOLDER,
             "timestamp": datetime.now().isoformat()
         })
@@ -459,33 +969,55 @@ def list_recordings():
 @app.route('/api/recordings/<session_id>', methods=['GET'])
 def get_recording(session_id):
     """
-    获取特定录制会话的详细信息
+    获取特定录制会话的详细信息（存储目录中找不到时从归档中读取）
+    ?layout=columnar 时分析结果中的击球按特征返回数组
     """
     try:
-        # 查找匹配的文件
-        for filename in os.listdir(UPLOAD_FOLDER):
-            if session_id in filename:
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
+        try:
+            layout = resolve_layout(request.args.get('layout'))
+        except ValueError as layout_error:
+            return jsonify({
+                "success": False,
+                "error": str(layout_error),
+                "timestamp": datetime.now().isoformat()
+            }), 400
+        
+        raw_path = find_session_path(session_id, '.json')
+        if raw_path is not None:
+            try:
+                with open(raw_path, 'rb') as f:
+                    data = loads_json(f.read())
                 
-                if filename.endswith('.json') and '_analysis' not in filename:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # 查找对应的分析文件
-                    analysis_path = os.path.join(UPLOAD_FOLDER, f"{session_id}_analysis.json")
-                    analysis_data = None
-                    
-                    if os.path.exists(analysis_path):
-                        with open(analysis_path, 'r', encoding='utf-8') as f:
-                            analysis_data = json.load(f)
-                    
-                    return jsonify({
-                        "success": True,
-                        "session_id": session_id,
-                        "raw_data": data,
-                        "analysis": analysis_data,
-                        "timestamp": datetime.now().isoformat()
-                    })
+                # 查找对应的分析文件
+                analysis_path = raw_path[:-len('.json')] + '_analysis.json'
+                analysis_data = None
+                
+                if os.path.exists(analysis_path):
+                    with open(analysis_path, 'rb') as f:
+                        analysis_data = loads_json(f.read())
+                
+                return json_response({
+                    "success": True,
+                    "session_id": session_id,
+                    "raw_data": data,
+                    "analysis": with_layout(analysis_data, layout),
+                    "storage": "live",
+                    "timestamp": datetime.now().isoformat()
+                })
+            except FileNotFoundError:
+                pass  # 读取途中刚好被压缩进归档
+        
+        entry = session_archive.find(session_id)
+        if entry is not None:
+            analysis_bytes = session_archive.read_member(entry, '_analysis.json')
+            return json_response({
+                "success": True,
+                "session_id": session_id,
+                "raw_data": loads_json(session_archive.read_member(entry, '.json')),
+                "analysis": with_layout(loads_json(analysis_bytes), layout) if analysis_bytes else None,
+                "storage": "archived",
+                "timestamp": datetime.now().isoformat()
+            })
         
         return jsonify({
             "success": False,
@@ -500,9 +1032,60 @@ def get_recording(session_id):
             "timestamp": datetime.now().isoformat()
         }), 500
 
+@app.route('/api/storage/usage', methods=['GET'])
+def storage_usage():
+    """
+    存储占用（存储目录 / 归档）、保留策略和最近一次压缩结果
+    """
+    try:
+        return jsonify({
+            "success": True,
+            "usage": session_archive.usage(),
+            "policy": retention_service.policy.to_dict(),
+            "last_run": retention_service.last_report,
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/storage/compact', methods=['POST'])
+def storage_compact():
+    """
+    立即执行一轮压缩/保留策略
+    """
+    try:
+        report = retention_service.run_once()
+        return jsonify({
+            "success": True,
+            "report": report,
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "timestamp": datetime.now().isoformat()
+        }), 500
+
+@app.route('/api/admission/stats', methods=['GET'])
+def admission_stats():
+    """
+    各分析接口的并发、排队深度、等待时间和拒绝次数
+    """
+    return jsonify({
+        "success": True,
+        "endpoints": {name: controller.stats() for name, controller in admission_controllers.items()},
+        "timestamp": datetime.now().isoformat()
+    })
+
 if __name__ == '__main__':
     # 启用详细日志
     logging.getLogger('werkzeug').setLevel(logging.DEBUG)
+    print_startup_diagnostics()
 
     print("=" * 50)
     print("传感器分析服务器启动中...")
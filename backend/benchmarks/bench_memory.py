@@ -0,0 +1,128 @@
+"""
+分析内存峰值基准（tracemalloc）
+
+用法:
+    python benchmarks/bench_memory.py [--minutes 5 20 60] [--dtype float32] [--max-regression 0.2]
+
+用合成会话（synthetic_sessions.py）跑一遍 TennisStrokeAnalyzer，记录各阶段（解析 / 检测 / 切片 / 特征）的
+内存峰值，换算成每10万个数据点的字节数，便于不同长度的会话之间比较。
+
+每次运行追加一条记录到 benchmarks/memory_history.jsonl（时间、git 提交、各会话长度的结果），
+并与上一条相同参数的记录对比；指定 --max-regression 时峰值增长超过该比例返回非零，可以放进 CI。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_PATH = os.path.join(BACKEND_DIR, 'benchmarks', 'memory_history.jsonl')
+
+# 与 app.py 相同：把 analyzers 目录加入路径
+analyzers_dir = os.path.join(BACKEND_DIR, 'analyzers')
+if analyzers_dir not in sys.path:
+    sys.path.insert(0, analyzers_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_sessions import generate_session  # noqa: E402
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(params):
+    """最近一条参数相同的历史记录"""
+    if not os.path.exists(HISTORY_PATH):
+        return None
+    previous = None
+    with open(HISTORY_PATH, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('params') == params:
+                previous = record
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析内存峰值基准")
+    parser.add_argument('--minutes', type=float, nargs='+', default=[5.0, 20.0, 60.0])
+    parser.add_argument('--dtype', default=None, help="float64（默认）或 float32")
+    parser.add_argument('--layout', default='rows')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help="每10万点峰值比上次增长超过该比例（如0.2）时返回非零")
+    parser.add_argument('--no-history', action='store_true', help="不写入历史记录")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from tennis_stroke_analyzer import TennisStrokeAnalyzer
+
+    analyzer = TennisStrokeAnalyzer()
+    params = {"dtype": args.dtype or "float64", "layout": args.layout, "seed": args.seed}
+    results = {}
+
+    print(f"{'时长min':>8} {'数据点':>9} {'阶段':>10} {'峰值MB':>10} {'留存MB':>10} {'峰值/10万点MB':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for minutes in args.minutes:
+            session = generate_session(tmp, duration_s=minutes * 60, seed=args.seed, write_labels=False)
+            with open(session['csv_path'], 'r', encoding='utf-8') as f:
+                csv_content = f.read()
+            os.remove(session['csv_path'])
+
+            result = analyzer.analyze_stroke_from_csv_content(csv_content, dtype=args.dtype, layout=args.layout,
+                                                              profile_memory=True)
+            if not result.get('success'):
+                print(f"❌ {minutes} 分钟会话分析失败: {result.get('error')}")
+                return 1
+            profile = result['analysis_info']['memory_profile']
+            samples = profile['samples']
+            for stage in profile['stages']:
+                print(f"{minutes:>8g} {samples:>9} {stage['stage']:>10} {stage['peak_bytes'] / 1e6:>10.2f} "
+                      f"{stage['net_bytes'] / 1e6:>10.2f} {stage['peak_bytes'] * 1e5 / samples / 1e6:>14.2f}")
+            print(f"{minutes:>8g} {samples:>9} {'总计':>10} {profile['peak_bytes'] / 1e6:>10.2f} {'':>10} "
+                  f"{profile['peak_bytes_per_100k_samples'] / 1e6:>14.2f}")
+            results[f"{minutes:g}"] = profile
+
+    status = 0
+    previous = load_previous(params)
+    if previous:
+        print(f"\n与上次记录对比（{previous['timestamp']}，提交 {previous.get('commit') or '未知'}）:")
+        for key, profile in results.items():
+            before = previous['results'].get(key)
+            if not before:
+                continue
+            change = profile['peak_bytes_per_100k_samples'] / before['peak_bytes_per_100k_samples'] - 1
+            regressed = args.max_regression is not None and change > args.max_regression
+            status = 1 if regressed else status
+            print(f"   {key:>6} 分钟: {before['peak_bytes_per_100k_samples'] / 1e6:.2f} MB -> "
+                  f"{profile['peak_bytes_per_100k_samples'] / 1e6:.2f} MB ({change:+.1%})"
+                  + ("  ❌ 超出允许的增长" if regressed else ""))
+
+    if not args.no_history:
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "params": params,
+            "results": results
+        }
+        with open(HISTORY_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"\n📝 已追加到 {os.path.relpath(HISTORY_PATH, BACKEND_DIR)}")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+会话长度扩展性基准（解析 / 检测 / 完整分析 / 上传存储）
+
+用法:
+    python benchmarks/bench_scaling.py [--minutes 1 10 60] [--repeat 3] [--skip-upload]
+
+用 synthetic_sessions 生成不同长度的确定性会话，分别测量:
+  - load_imu_csv     CSV解析
+  - detect           派生通道 + 检测 + 过滤
+  - analyze          TennisStrokeAnalyzer 完整流程（含特征）
+  - upload           POST /api/recordings/upload（存储 + 分析 + 索引），在临时目录中运行，不影响真实数据
+输出每项的耗时和吞吐量（采样点/秒），用来观察各阶段是否随会话长度线性增长。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 与 app.py 相同：把 analyzers 目录加入路径
+analyzers_dir = os.path.join(BACKEND_DIR, 'analyzers')
+if analyzers_dir not in sys.path:
+    sys.path.insert(0, analyzers_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_sessions import generate_session  # noqa: E402
+
+# 在临时工作目录的子进程中上传（app 的存储目录是相对路径 sensor_data_uploads）
+UPLOAD_SCRIPT = r"""
+import contextlib, io, json, sys, time
+sys.path.insert(0, sys.argv[1])
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as server
+client = server.app.test_client()
+with open(sys.argv[2], 'r', encoding='utf-8') as f:
+    csv_content = f.read()
+payload = {"csv_content": csv_content, "device_name": "WT901BLE_BENCH", "device_mac": "bench",
+           "data_points": csv_content.count('\n')}
+best = float('inf')
+for _ in range(int(sys.argv[3])):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.post('/api/recordings/upload', json=payload)
+    best = min(best, time.perf_counter() - start)
+print(json.dumps({"status": response.status_code, "seconds": best}))
+"""
+
+
+def best_of(func, repeat):
+    """返回 (最短耗时秒, 最后一次的结果)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def time_upload(csv_path, repeat):
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = subprocess.run([sys.executable, '-c', UPLOAD_SCRIPT, BACKEND_DIR, csv_path, str(repeat)],
+                              cwd=workdir, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr[-2000:])
+        return json.loads(proc.stdout.strip().splitlines()[-1])["seconds"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话长度扩展性基准")
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 10, 60])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-upload', action='store_true')
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    from stroke_core import load_imu_csv, compute_derived_channels, detect_stroke_timestamps, filter_timestamps
+    from tennis_stroke_analyzer import TennisStrokeAnalyzer
+
+    analyzer = TennisStrokeAnalyzer()
+
+    print(f"{'时长(分)':>8} {'行数':>9} {'大小MB':>7} {'阶段':>14} {'耗时ms':>10} {'采样点/秒':>12}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        for minutes in args.minutes:
+            session = generate_session(data_dir, duration_s=minutes * 60.0, seed=args.seed, write_labels=False)
+            with open(session["csv_path"], 'r', encoding='utf-8') as f:
+                csv_content = f.read()
+            rows = session["rows"]
+            acc, gyro, _ = load_imu_csv(csv_content)
+
+            def detect():
+                derived = compute_derived_channels(gyro, acc)
+                return filter_timestamps(detect_stroke_timestamps(gyro, acc, derived=derived))
+
+            stages = [
+                ("load_imu_csv", lambda: load_imu_csv(csv_content)),
+                ("detect", detect),
+                ("analyze", lambda: analyzer.analyze_stroke_from_csv_content(csv_content, plot=False)),
+            ]
+            timings = [(name, best_of(func, args.repeat)[0]) for name, func in stages]
+            if not args.skip_upload:
+                timings.append(("upload", time_upload(session["csv_path"], args.repeat)))
+
+            size_mb = len(csv_content) / 1e6
+            for name, seconds in timings:
+                print(f"{minutes:>8g} {rows:>9} {size_mb:>7.1f} {name:>14} {seconds * 1000:>10.1f} "
+                      f"{rows / seconds:>12,.0f}")
+            os.remove(session["csv_path"])
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+分析结果序列化基准
+
+用法:
+    python benchmarks/bench_serialization.py [--strokes 1000 5000 20000] [--repeat 5]
+
+用随机击球窗口构造指定击球数的分析结果，比较:
+  - 结果构建    rows（每个击球一个字典）/ columnar（每个特征一个数组）
+  - 编码        原来的 json.dumps(indent=2) / 标准库紧凑输出 / serialization.dumps（有 orjson 时走 orjson）
+  - 解码        json.loads / serialization.loads
+输出每项耗时和编码后大小。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 与 app.py 相同：把 analyzers 目录加入路径
+analyzers_dir = os.path.join(BACKEND_DIR, 'analyzers')
+if analyzers_dir not in sys.path:
+    sys.path.insert(0, analyzers_dir)
+sys.path.insert(0, BACKEND_DIR)
+
+import serialization  # noqa: E402
+
+
+def best_of(func, repeat):
+    """返回 (最短耗时毫秒, 最后一次的结果)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def make_result(stroke_analysis, n_strokes):
+    """与 TennisStrokeAnalyzer 输出结构相同的结果字典"""
+    return {
+        "success": True,
+        "message": "网球击球分析完成",
+        "data": {
+            "strokes_detected": n_strokes,
+            "timestamps": list(range(100, 100 + 400 * n_strokes, 400)),
+            "stroke_analysis": stroke_analysis,
+            "statistics": {"total_data_points": 400 * n_strokes}
+        },
+        "timestamp": "2025-01-01T00:00:00"
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析结果序列化基准")
+    parser.add_argument('--strokes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--window', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from tennis_stroke_analyzer import TennisStrokeAnalyzer
+
+    analyzer = TennisStrokeAnalyzer()
+    rng = np.random.default_rng(args.seed)
+    print(f"快速编码器: {'orjson' if serialization.FAST_JSON else '未安装 orjson，使用标准库'}")
+    print(f"{'击球数':>7} {'阶段':>34} {'耗时ms':>10} {'大小KB':>10}")
+
+    for n_strokes in args.strokes:
+        acc = rng.normal(0, 3, (n_strokes, args.window, 3))
+        gyro = rng.normal(0, 300, (n_strokes, args.window, 3))
+        ang = np.cumsum(rng.normal(0, 1, (n_strokes, args.window, 3)), axis=1)
+
+        rows_ms, rows = best_of(lambda: analyzer._analyze_strokes(acc, gyro, ang, 'rows'), args.repeat)
+        cols_ms, cols = best_of(lambda: analyzer._analyze_strokes(acc, gyro, ang, 'columnar'), args.repeat)
+        rows_result = make_result(rows, n_strokes)
+        cols_result = make_result(cols, n_strokes)
+
+        measurements = [
+            ("构建 rows", rows_ms, None),
+            ("构建 columnar", cols_ms, None),
+        ]
+        encoders = [
+            ("rows json.dumps(indent=2)",
+             lambda: json.dumps(rows_result, indent=2, ensure_ascii=False).encode('utf-8')),
+            ("rows json 紧凑", lambda: json.dumps(rows_result, ensure_ascii=False,
+                                                 separators=(',', ':')).encode('utf-8')),
+            ("rows serialization.dumps", lambda: serialization.dumps(rows_result)),
+            ("columnar serialization.dumps", lambda: serialization.dumps(cols_result)),
+        ]
+        encoded = {}
+        for name, func in encoders:
+            ms, payload = best_of(func, args.repeat)
+            encoded[name] = payload
+            measurements.append((f"编码 {name}", ms, len(payload)))
+
+        measurements.append(("解码 rows json.loads",
+                             best_of(lambda: json.loads(encoded["rows json.dumps(indent=2)"]), args.repeat)[0], None))
+        measurements.append(("解码 rows serialization.loads",
+                             best_of(lambda: serialization.loads(encoded["rows serialization.dumps"]),
+                                     args.repeat)[0], None))
+        measurements.append(("解码 columnar serialization.loads",
+                             best_of(lambda: serialization.loads(encoded["columnar serialization.dumps"]),
+                                     args.repeat)[0], None))
+
+        for name, ms, size in measurements:
+            size_text = f"{size / 1024:>10.1f}" if size is not None else f"{'':>10}"
+            print(f"{n_strokes:>7} {name:>34} {ms:>10.2f} {size_text}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
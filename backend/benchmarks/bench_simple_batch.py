@@ -0,0 +1,61 @@
+"""
+简单分析接口：逐样本请求 vs 批量请求 的单样本开销对比
+
+用法:
+    python benchmarks/bench_simple_batch.py [--samples 10000] [--single 200]
+
+使用 Flask test_client 在进程内调用，不含网络延迟，只衡量框架和计算开销。
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="简单分析批量接口基准")
+    parser.add_argument('--samples', type=int, default=10000, help="批量请求的样本数")
+    parser.add_argument('--single', type=int, default=200, help="逐样本请求的次数")
+    args = parser.parse_args()
+
+    # app 导入和逐样本接口都会打印调试信息，这里屏蔽掉
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as server
+    client = server.app.test_client()
+
+    rng = np.random.default_rng(0)
+    acc = rng.normal(0.0, 2.0, size=(args.samples, 3))
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for x, y, z in acc[:args.single]:
+            client.post('/api/analyze/simple', json={"sensor_data": {"acc_x": x, "acc_y": y, "acc_z": z}})
+    single_us = (time.perf_counter() - start) / args.single * 1e6
+
+    start = time.perf_counter()
+    client.post('/api/analyze/simple/batch', json={"samples": {
+        "acc_x": acc[:, 0].tolist(), "acc_y": acc[:, 1].tolist(), "acc_z": acc[:, 2].tolist()
+    }})
+    json_us = (time.perf_counter() - start) / args.samples * 1e6
+
+    raw = acc.astype('<f4').tobytes()
+    start = time.perf_counter()
+    client.post('/api/analyze/simple/batch?format=binary', data=raw,
+                content_type='application/octet-stream')
+    binary_us = (time.perf_counter() - start) / args.samples * 1e6
+
+    print(f"逐样本请求          : {single_us:10.2f} µs / 样本")
+    print(f"批量JSON ({args.samples}个)  : {json_us:10.2f} µs / 样本")
+    print(f"批量二进制 ({args.samples}个): {binary_us:10.2f} µs / 样本")
+
+
+if __name__ == "__main__":
+    main()
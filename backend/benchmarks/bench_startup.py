@@ -0,0 +1,110 @@
+"""
+冷启动性能基准
+
+用法:
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--backend-dir DIR]
+
+1. 用 python -X importtime 导入 app，列出累计耗时最多的模块
+2. 每次在全新的子进程中测量：导入 app 的耗时，以及第一个请求完成时的总耗时
+   （/api/health 和 /api/analyze/tennis 各测一次），模拟 serverless 冷启动
+
+--backend-dir 可以指向另一份代码（例如旧版本的 git worktree）做对比。
+结果受 .pyc 缓存影响（PYTHONDONTWRITEBYTECODE 时每次都要重新编译），
+部署镜像中建议先执行 python -m compileall。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中执行：导入 app 并发出第一个请求
+FIRST_REQUEST_SCRIPT = r"""
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as server
+imported = time.perf_counter()
+client = server.app.test_client()
+
+def call():
+    with contextlib.redirect_stdout(io.StringIO()):
+        if sys.argv[1] == 'health':
+            return client.get('/api/health')
+        return client.post('/api/analyze/tennis', json={"csv_content": sys.argv[2]})
+
+response = call()
+done = time.perf_counter()
+call()
+second = time.perf_counter()
+print(json.dumps({"status": response.status_code,
+                  "import_ms": (imported - start) * 1000,
+                  "first_request_ms": (done - start) * 1000,
+                  "second_request_ms": (second - done) * 1000}))
+"""
+
+TEST_CSV = """Timestamp,DeviceName,Mac,AX,AY,AZ,GX,GY,GZ,AngX,AngY,AngZ,HX,HY,HZ,Electric,Temp
+2024-01-01 10:00:00.000,Device1,AA:BB:CC:DD:EE:FF,0.1,0.2,0.9,10.2,8.3,5.1,5.2,3.1,12.5,0,0,0,100,25
+2024-01-01 10:00:00.200,Device1,AA:BB:CC:DD:EE:FF,0.2,0.1,0.8,15.1,9.2,6.3,5.3,3.2,12.6,0,0,0,100,25
+2024-01-01 10:00:00.400,Device1,AA:BB:CC:DD:EE:FF,0.3,0.3,1.2,350.5,280.3,310.2,5.1,3.0,12.4,0,0,0,100,25"""
+
+
+def import_profile(backend_dir, top):
+    """解析 -X importtime 输出，返回 (总耗时ms, 累计耗时最多的模块)"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                          cwd=backend_dir, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    total_ms = next((c / 1000 for c, _, name in rows if name.strip() == 'app'), float('nan'))
+    rows.sort(reverse=True)
+    return total_ms, rows[:top]
+
+
+def first_request(backend_dir, endpoint, runs):
+    """多次冷启动，返回各指标的中位数"""
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-c', FIRST_REQUEST_SCRIPT, endpoint, TEST_CSV],
+                              cwd=backend_dir, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr[-2000:])
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "first_request_ms": statistics.median(s["first_request_ms"] for s in samples),
+        "second_request_ms": statistics.median(s["second_request_ms"] for s in samples),
+        "status": samples[-1]["status"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动基准")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--backend-dir', default=DEFAULT_BACKEND_DIR)
+    args = parser.parse_args()
+
+    total_ms, rows = import_profile(args.backend_dir, args.top)
+    print(f"import app 累计耗时: {total_ms:.1f} ms（-X importtime）")
+    print(f"{'累计(ms)':>10} {'自身(ms)':>10}  模块")
+    for cumulative_us, self_us, name in rows:
+        print(f"{cumulative_us / 1000:10.1f} {self_us / 1000:10.1f}  {name}")
+
+    print()
+    for endpoint in ('health', 'tennis'):
+        result = first_request(args.backend_dir, endpoint, args.runs)
+        print(f"冷启动 [{endpoint:6}] 导入 {result['import_ms']:7.1f} ms, "
+              f"首个请求完成 {result['first_request_ms']:7.1f} ms, "
+              f"第二个请求 {result['second_request_ms']:6.1f} ms (HTTP {result['status']}, "
+              f"{args.runs} 次中位数)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+击球特征提取性能基准
+
+用法:
+    python benchmarks/bench_stroke_features.py [--strokes 1000] [--window 200] [--repeat 20]
+
+输出每1000个击球的特征提取耗时，并与逐击球循环的旧实现对比。
+超出延迟预算时返回非零退出码，方便在CI中使用。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# 与 app.py 相同：把 analyzers 目录加入路径
+analyzers_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'analyzers')
+if analyzers_dir not in sys.path:
+    sys.path.insert(0, analyzers_dir)
+
+from stroke_features import extract_stroke_features  # noqa: E402
+from tennis_stroke_analyzer import TennisStrokeAnalyzer  # noqa: E402
+
+# 每1000个击球的特征提取延迟预算（毫秒）
+LATENCY_BUDGET_MS = 100.0
+
+
+def make_windows(strokes, window, seed=0):
+    """生成随机击球窗口张量"""
+    rng = np.random.default_rng(seed)
+    acc = rng.normal(0.0, 3.0, size=(strokes, window, 3))
+    gyro = rng.normal(0.0, 400.0, size=(strokes, window, 3))
+    ang = rng.uniform(-180.0, 180.0, size=(strokes, window, 3))
+    return acc, gyro, ang
+
+
+def legacy_analyze(acc_slices, gyro_slices):
+    """旧实现：逐击球计算峰值/均值/力量"""
+    result = []
+    for acc_slice, gyro_slice in zip(acc_slices, gyro_slices):
+        acc_magnitude = np.sqrt(np.sum(np.array(acc_slice) ** 2, axis=1))
+        gyro_magnitude = np.sqrt(np.sum(np.array(gyro_slice) ** 2, axis=1))
+        result.append({
+            "peak_acceleration": float(np.max(acc_magnitude)),
+            "peak_rotation": float(np.max(gyro_magnitude)),
+            "avg_acceleration": float(np.mean(acc_magnitude)),
+            "avg_rotation": float(np.mean(gyro_magnitude)),
+            "stroke_power": float(np.max(acc_magnitude) * np.max(gyro_magnitude)),
+        })
+    return result
+
+
+def timeit(func, repeat):
+    """返回多次运行中的最短耗时（毫秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="击球特征提取基准")
+    parser.add_argument('--strokes', type=int, default=1000)
+    parser.add_argument('--window', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    acc, gyro, ang = make_windows(args.strokes, args.window)
+    analyzer = TennisStrokeAnalyzer()
+    scale = 1000.0 / args.strokes
+
+    fused_ms = timeit(lambda: extract_stroke_features(acc, gyro, ang), args.repeat)
+    full_ms = timeit(lambda: analyzer._analyze_strokes(acc, gyro, ang), args.repeat)
+    legacy_ms = timeit(lambda: legacy_analyze(acc, gyro), max(1, args.repeat // 4))
+
+    print(f"击球数: {args.strokes}, 窗口长度: {args.window}")
+    print(f"融合特征提取        : {fused_ms * scale:8.2f} ms / 1000 击球")
+    print(f"_analyze_strokes 全流程: {full_ms * scale:8.2f} ms / 1000 击球")
+    print(f"旧逐击球实现(5个特征): {legacy_ms * scale:8.2f} ms / 1000 击球")
+    print(f"延迟预算            : {LATENCY_BUDGET_MS:8.2f} ms / 1000 击球")
+
+    if full_ms * scale > LATENCY_BUDGET_MS:
+        print("❌ 超出延迟预算")
+        return 1
+    print("✅ 在延迟预算内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+击球检测准确率 / 吞吐量评估
+
+用法:
+    python benchmarks/eval_detection.py [--labels-dir sensor_data_uploads] [--tolerance-ms 1000]
+                                        [--detector tennis_stroke_analyzer] [--baseline 模块:函数]
+                                        [--min-f1 0.9] [--repeat 3] [--json]
+    python benchmarks/eval_detection.py --bootstrap sensor_data_uploads/session_xxx.csv
+
+在所有带 <会话名>_labels.json 标注的会话上运行检测器，输出 precision/recall/F1（时间容差内一对一匹配）
+和采样点/秒。指定 --baseline 时并排对比两个检测器，方便确认更快的实现没有降低检测质量。
+--min-f1 未达标时返回非零退出码。标注格式见 analyzers/detection_eval.py。
+"""
+import argparse
+import json
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 与 app.py 相同：把 analyzers 目录加入路径
+analyzers_dir = os.path.join(BACKEND_DIR, 'analyzers')
+if analyzers_dir not in sys.path:
+    sys.path.insert(0, analyzers_dir)
+
+from detection_eval import (DEFAULT_TOLERANCE_MS, bootstrap_labels, evaluate_detector,  # noqa: E402
+                            find_labeled_sessions, load_detector)
+
+
+def print_report(name, report):
+    print(f"== {name} (容差 ±{report['tolerance_ms']:g} 毫秒) ==")
+    print(f"{'会话':40} {'标注':>5} {'检测':>5} {'命中':>5} {'precision':>10} {'recall':>7} {'F1':>6} {'耗时ms':>8}")
+    for s in report["sessions"]:
+        print(f"{s['csv_file']:40} {s['labeled']:>5} {s['detected']:>5} {s['true_positives']:>5} "
+              f"{s['precision']:>10.3f} {s['recall']:>7.3f} {s['f1']:>6.3f} {s['detect_ms']:>8.1f}")
+    overall = report["overall"]
+    print(f"{'总体':40} {'':>5} {'':>5} {overall['true_positives']:>5} "
+          f"{overall['precision']:>10.3f} {overall['recall']:>7.3f} {overall['f1']:>6.3f}")
+    print(f"吞吐量: {overall['samples_per_second']} 采样点/秒（共 {overall['samples']} 点）")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="击球检测准确率评估")
+    parser.add_argument('--labels-dir', default=os.path.join(BACKEND_DIR, 'sensor_data_uploads'))
+    parser.add_argument('--tolerance-ms', type=float, default=DEFAULT_TOLERANCE_MS,
+                        help="时间容差（毫秒，按标注的 sample_rate 换算成采样点）")
+    parser.add_argument('--sample-rate', type=float, help="--bootstrap 时的采样率 (Hz)，默认按时间戳计算")
+    parser.add_argument('--detector', default='tennis_stroke_analyzer')
+    parser.add_argument('--baseline', help="对比用的检测器（模块:函数）")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-f1', type=float, help="总体F1低于该值时返回非零退出码")
+    parser.add_argument('--include-unreviewed', action='store_true', help="包含 reviewed=false 的标注")
+    parser.add_argument('--bootstrap', metavar='CSV', help="用当前检测器为CSV生成待核对的标注模板")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    detector = load_detector(args.detector)
+
+    if args.bootstrap:
+        try:
+            labels_path = bootstrap_labels(args.bootstrap, detector, args.sample_rate)
+        except FileExistsError as e:
+            print(f"标注文件已存在，不会覆盖: {e}")
+            return 1
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"已生成标注模板（reviewed=false，核对后改为true）: {labels_path}")
+        return 0
+
+    sessions = find_labeled_sessions(args.labels_dir, include_unreviewed=args.include_unreviewed)
+    if not sessions:
+        print(f"{args.labels_dir} 中没有可用的标注会话（*_labels.json）")
+        return 1
+
+    reports = {args.detector: evaluate_detector(detector, sessions, args.tolerance_ms, args.repeat)}
+    if args.baseline:
+        reports[args.baseline] = evaluate_detector(load_detector(args.baseline), sessions,
+                                                   args.tolerance_ms, args.repeat)
+
+    if args.json:
+        print(json.dumps(reports, indent=2, ensure_ascii=False))
+    else:
+        for name, report in reports.items():
+            print_report(name, report)
+
+    f1 = reports[args.detector]["overall"]["f1"]
+    if args.min_f1 is not None and f1 < args.min_f1:
+        print(f"❌ F1 {f1:.3f} 低于要求的 {args.min_f1:.3f}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
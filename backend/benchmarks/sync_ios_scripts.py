@@ -0,0 +1,59 @@
+"""
+把击球检测模块同步到 iOS PythonBridge 的脚本目录
+
+用法:
+    python benchmarks/sync_ios_scripts.py          # 复制 analyzers 中的模块到 PythonScripts
+    python benchmarks/sync_ios_scripts.py --check  # 只检查副本是否与服务器一致，不一致时返回非零
+
+手机端的增量分析（AnalyzeExample.py -> stroke_stream.StrokeStream）与服务器共用同一份检测和特征代码；
+PythonScripts 目录会被 Xcode 自动打包进 App，这里保证打包的副本和 backend/analyzers 完全一致。
+"""
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANALYZERS_DIR = os.path.join(BACKEND_DIR, 'analyzers')
+IOS_SCRIPTS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'IOS_frontend', 'BleExample',
+                               'PythonBridge', 'PythonScripts')
+
+# StrokeStream 的全部依赖（只需要 numpy）
+SHARED_MODULES = [
+    'logger.py',
+    'stroke_core.py',
+    'stroke_features.py',
+    'tennis_stroke_analyzer.py',
+    'stroke_stream.py',
+    'memory_profile.py',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步击球检测模块到 iOS PythonScripts")
+    parser.add_argument('--check', action='store_true', help="只检查，不复制")
+    args = parser.parse_args()
+
+    outdated = [name for name in SHARED_MODULES
+                if not os.path.exists(os.path.join(IOS_SCRIPTS_DIR, name))
+                or not filecmp.cmp(os.path.join(ANALYZERS_DIR, name), os.path.join(IOS_SCRIPTS_DIR, name),
+                                   shallow=False)]
+
+    if args.check:
+        for name in outdated:
+            print(f"❌ {name} 与 backend/analyzers 不一致")
+        if not outdated:
+            print(f"✅ {len(SHARED_MODULES)} 个模块已同步")
+        return 1 if outdated else 0
+
+    for name in outdated:
+        shutil.copyfile(os.path.join(ANALYZERS_DIR, name), os.path.join(IOS_SCRIPTS_DIR, name))
+        print(f"📋 已同步 {name}")
+    if not outdated:
+        print(f"✅ {len(SHARED_MODULES)} 个模块已是最新")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+合成 WT901BLE 会话生成器（确定性，给基准和压测用）
+
+用法:
+    python benchmarks/synthetic_sessions.py OUT_DIR [--minutes 10] [--devices 1] [--seed 0]
+                                            [--stroke-interval 4.0] [--duplicate-rate 0.03]
+
+每个设备生成一个与真实上传完全同格式的CSV（17列，表头与 iOS 端导出一致）:
+  - 静止时加速度为重力方向 + 量化噪声，角速度大多为 0.000（与真实录制一致）
+  - 在已知位置注入击球：双极性挥拍 + 击球瞬间的冲击振荡（会被 TennisStrokeAnalyzer 检测到）
+  - 重复包：整行原样重复（真实数据约 2~4%），时间戳抖动（同一时间戳 / 10ms 间隔）和偶发丢包间隔
+  - 角度、磁场、电量、温度缓慢漂移
+同时写出 <会话名>_labels.json（detection_eval 的标注格式，reviewed=true），
+击球下标已计入插入的重复行，可直接用 benchmarks/eval_detection.py 评估。
+
+相同参数和 seed 生成的文件逐字节相同；按块生成和写出，数小时的会话也只占用常数内存。
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+HEADER = "Timestamp,DeviceName,Mac,AX,AY,AZ,GX,GY,GZ,AngX,AngY,AngZ,HX,HY,HZ,Electric,Temp"
+
+# 真实录制的时间戳间隔中位数为 5ms
+DEFAULT_SAMPLE_INTERVAL_MS = 5
+
+# WT901BLE 量程与分辨率：±16g、±2000°/s，16位
+ACC_RESOLUTION = 16.0 / 32768
+GYRO_RESOLUTION = 2000.0 / 32768
+
+# 击球形状（采样点）：挥拍持续时间、冲击振荡长度
+SWING_WIDTH = 60
+IMPACT_RING = 4
+
+CHUNK_ROWS = 100_000
+
+# 数值列输出格式（与真实CSV的小数位一致）
+ROW_FORMAT = "%s,%s,%s,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%d,%.2f\n"
+
+
+def device_identity(seed, device_index):
+    """确定性的设备名和 MAC（iOS 上是 CoreBluetooth 的 UUID 形式）"""
+    digest = hashlib.sha1(f"{seed}:{device_index}".encode()).hexdigest().upper()
+    name = f"WT901BLE{int(digest[:2], 16) % 90 + 10}"
+    mac = f"{digest[0:8]}-{digest[8:12]}-{digest[12:16]}-{digest[16:20]}-{digest[20:32]}"
+    return name, mac
+
+
+def plan_strokes(rng, n_rows, sample_interval_ms, stroke_interval_s, min_stroke_gap_s=1.5):
+    """在干净数据（插入重复行之前）中安排击球位置：指数分布的间隔 + 最小间隔"""
+    samples_per_s = 1000.0 / sample_interval_ms
+    margin = SWING_WIDTH
+    if stroke_interval_s <= 0 or n_rows <= 2 * margin:
+        return np.array([], dtype=np.int64)
+
+    expected = int(n_rows / (stroke_interval_s * samples_per_s)) + 16
+    gaps = min_stroke_gap_s + rng.exponential(max(stroke_interval_s - min_stroke_gap_s, 0.1), expected)
+    positions = margin + np.cumsum(np.round(gaps * samples_per_s)).astype(np.int64)
+    return positions[positions < n_rows - margin]
+
+
+def stroke_profiles(rng, count):
+    """每个击球的幅度和方向：挥拍峰值角速度 600~1500°/s，冲击 600~1200°/s，加速度 3~8g"""
+    axes = rng.normal(size=(count, 3))
+    axes /= np.linalg.norm(axes, axis=1, keepdims=True)
+    return {
+        "axis": axes,
+        "swing_dps": rng.uniform(600, 1500, count),
+        "impact_dps": rng.uniform(600, 1200, count),
+        "acc_g": rng.uniform(3, 8, count)
+    }
+
+
+def _swing_shape():
+    """双极性挥拍波形（高斯导数），中心为击球点；以及冲击振荡（正负交替、快速衰减）"""
+    t = np.arange(-SWING_WIDTH, SWING_WIDTH + 1) / (SWING_WIDTH / 3)
+    swing = -t * np.exp(-t ** 2 / 2)
+    swing /= np.abs(swing).max()
+    ring = np.array([(-0.55) ** k for k in range(IMPACT_RING)])
+    return swing, ring
+
+
+def _add_strokes(acc, gyro, chunk_start, strokes, profiles):
+    """把与当前块重叠的击球叠加到块上（击球可以跨块）"""
+    swing, ring = _swing_shape()
+    chunk_end = chunk_start + len(acc)
+    lo = np.searchsorted(strokes, chunk_start - SWING_WIDTH)
+    hi = np.searchsorted(strokes, chunk_end + SWING_WIDTH)
+
+    for k in range(lo, hi):
+        center = strokes[k]
+        axis = profiles["axis"][k]
+
+        # 挥拍
+        idx = center + np.arange(-SWING_WIDTH, SWING_WIDTH + 1) - chunk_start
+        keep = (idx >= 0) & (idx < len(acc))
+        gyro[idx[keep]] += swing[keep, None] * profiles["swing_dps"][k] * axis
+        acc[idx[keep]] += swing[keep, None] * profiles["acc_g"][k] * 0.4 * axis[::-1]
+
+        # 击球冲击：从击球点开始的正负交替振荡
+        idx = center + np.arange(IMPACT_RING) - chunk_start
+        keep = (idx >= 0) & (idx < len(acc))
+        gyro[idx[keep]] += ring[keep, None] * profiles["impact_dps"][k] * axis
+        acc[idx[keep]] += ring[keep, None] * profiles["acc_g"][k] * axis[::-1]
+
+
+def generate_session(out_dir, duration_s=600.0, seed=0, device_index=0,
+                     sample_interval_ms=DEFAULT_SAMPLE_INTERVAL_MS, stroke_interval_s=4.0,
+                     duplicate_rate=0.03, gap_rate=0.002, start_time="2025-12-11 22:15:37.267",
+                     write_labels=True):
+    """
+    生成一个会话CSV（和标注），返回 {csv_path, labels_path, rows, strokes}
+
+    所有随机量都来自 (seed, device_index) 派生的随机数生成器
+    """
+    rng = np.random.default_rng([seed, device_index])
+    n_rows = int(round(duration_s * 1000.0 / sample_interval_ms))
+    device_name, device_mac = device_identity(seed, device_index)
+
+    strokes = plan_strokes(rng, n_rows, sample_interval_ms, stroke_interval_s)
+    profiles = stroke_profiles(rng, len(strokes))
+
+    # 会话级别的常量：传感器朝向（重力方向）、磁场、初始温度/电量
+    gravity = rng.normal(size=3)
+    gravity /= np.linalg.norm(gravity)
+    magnetic = rng.uniform(-60, 60, 3)
+    temp_start = rng.uniform(26.0, 30.0)
+
+    start_ms = np.datetime64(start_time.replace(' ', 'T'), 'ms')
+    stamp = start_ms.astype(np.int64) + 37 * device_index  # 多设备时错开几十毫秒
+    digest = hashlib.sha1(f"{seed}:{device_index}:{duration_s}".encode()).hexdigest()[:8]
+    session_time = datetime.strptime(start_time[:19], '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d_%H%M%S')
+    name = f"session_{session_time}_{digest}"
+    csv_path = os.path.join(out_dir, f"{name}.csv")
+
+    ang = np.zeros(3)
+    labels = []
+    duplicates_so_far = 0
+    rows_written = 0
+    stroke_cursor = 0
+
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(HEADER + "\n")
+        for chunk_start in range(0, n_rows, CHUNK_ROWS):
+            k = min(CHUNK_ROWS, n_rows - chunk_start)
+
+            acc = gravity + rng.normal(0.0, 0.01, (k, 3))
+            # 静止时角速度读数大多为0，偶有小幅抖动
+            gyro = rng.normal(0.0, 0.8, (k, 3)) * (rng.random((k, 1)) < 0.15)
+            _add_strokes(acc, gyro, chunk_start, strokes, profiles)
+
+            # 量化到传感器分辨率（+ 0.0 把 -0.0 变成 0.0，输出与真实数据一样是 0.000）
+            acc = np.round(acc / ACC_RESOLUTION) * ACC_RESOLUTION + 0.0
+            gyro = np.round(np.clip(gyro, -2000, 2000) / GYRO_RESOLUTION) * GYRO_RESOLUTION + 0.0
+
+            # 角度：角速度积分（取整体的一小部分）+ 随机游走，包到 [-180, 180)
+            ang_path = ang + np.cumsum(gyro * (sample_interval_ms / 1000.0) * 0.2
+                                       + rng.normal(0.0, 0.02, (k, 3)), axis=0)
+            ang_path = (ang_path + 180.0) % 360.0 - 180.0
+            ang = ang_path[-1]
+
+            mag = magnetic + rng.normal(0.0, 0.3, (k, 3))
+            progress = (chunk_start + np.arange(k)) / max(n_rows, 1)
+            electric = np.maximum(100 - np.floor(progress * duration_s / 3600.0 * 8), 0).astype(int)
+            temp = np.round(temp_start + 3.0 * progress + rng.normal(0.0, 0.05, k), 2)
+
+            # 时间戳：大多 5ms，部分同一时间戳或 10ms（批量到达），偶发丢包间隔
+            step = np.full(k, sample_interval_ms, dtype=np.int64)
+            jitter = rng.random(k)
+            step[jitter < 0.08] = 0
+            step[jitter > 0.92] = 2 * sample_interval_ms
+            gaps = rng.random(k) < gap_rate
+            step[gaps] += rng.integers(3, 40, gaps.sum()) * sample_interval_ms
+            times = stamp + np.cumsum(step) - step[0]
+            stamp = times[-1] + sample_interval_ms
+            time_text = np.char.replace(np.datetime_as_string(times.astype('datetime64[ms]'), unit='ms'), 'T', ' ')
+
+            # 重复包：整行紧跟原行再写一次
+            repeat = 1 + (rng.random(k) < duplicate_rate)
+
+            # 击球点在输出文件中的行下标 = 干净下标 + 之前插入的重复行数
+            dup_before = duplicates_so_far + np.concatenate(([0], np.cumsum(repeat - 1)[:-1]))
+            while stroke_cursor < len(strokes) and strokes[stroke_cursor] < chunk_start + k:
+                clean = strokes[stroke_cursor]
+                labels.append({"index": int(clean + dup_before[clean - chunk_start])})
+                stroke_cursor += 1
+            duplicates_so_far += int((repeat - 1).sum())
+
+            lines = []
+            for i in range(k):
+                line = ROW_FORMAT % (time_text[i], device_name, device_mac,
+                                     acc[i, 0], acc[i, 1], acc[i, 2],
+                                     gyro[i, 0], gyro[i, 1], gyro[i, 2],
+                                     ang_path[i, 0], ang_path[i, 1], ang_path[i, 2],
+                                     mag[i, 0], mag[i, 1], mag[i, 2],
+                                     electric[i], temp[i])
+                lines.append(line * repeat[i])
+            f.write(''.join(lines))
+            rows_written += int(repeat.sum())
+
+    labels_path = None
+    if write_labels:
+        labels_path = os.path.join(out_dir, f"{name}_labels.json")
+        with open(labels_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "csv_file": os.path.basename(csv_path),
+                "sample_rate": 1000.0 / sample_interval_ms,
+                "reviewed": True,
+                "synthetic": {
+                    "seed": seed,
+                    "device_index": device_index,
+                    "duration_s": duration_s,
+                    "duplicate_rate": duplicate_rate,
+                    "gap_rate": gap_rate,
+                    "stroke_interval_s": stroke_interval_s
+                },
+                "strokes": labels
+            }, f, ensure_ascii=False)
+
+    return {
+        "csv_path": csv_path,
+        "labels_path": labels_path,
+        "device_name": device_name,
+        "device_mac": device_mac,
+        "rows": rows_written,
+        "strokes": len(labels)
+    }
+
+
+def generate_sessions(out_dir, devices=1, **kwargs):
+    """每个设备生成一个会话"""
+    os.makedirs(out_dir, exist_ok=True)
+    return [generate_session(out_dir, device_index=i, **kwargs) for i in range(devices)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成 WT901BLE 会话生成器")
+    parser.add_argument('out_dir')
+    parser.add_argument('--minutes', type=float, default=10.0)
+    parser.add_argument('--devices', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample-interval-ms', type=int, default=DEFAULT_SAMPLE_INTERVAL_MS)
+    parser.add_argument('--stroke-interval', type=float, default=4.0, help="平均击球间隔（秒），0表示不注入击球")
+    parser.add_argument('--duplicate-rate', type=float, default=0.03)
+    parser.add_argument('--gap-rate', type=float, default=0.002)
+    parser.add_argument('--no-labels', action='store_true')
+    args = parser.parse_args()
+
+    sessions = generate_sessions(args.out_dir, devices=args.devices, duration_s=args.minutes * 60.0,
+                                 seed=args.seed, sample_interval_ms=args.sample_interval_ms,
+                                 stroke_interval_s=args.stroke_interval,
+                                 duplicate_rate=args.duplicate_rate, gap_rate=args.gap_rate,
+                                 write_labels=not args.no_labels)
+    for s in sessions:
+        print(f"{s['csv_path']}: {s['rows']} 行, {s['strokes']} 次击球 ({s['device_name']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
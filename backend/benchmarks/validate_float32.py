@@ -0,0 +1,150 @@
+"""
+float32 分析模式校验与基准
+
+用法:
+    python benchmarks/validate_float32.py [--minutes 10 60] [--rtol 1e-4] [--repeat 3] [--no-stored]
+
+对已存储的会话和合成会话（synthetic_sessions）分别用 float64 和 float32 跑完整分析，检查:
+  - 击球下标完全一致
+  - 每个数值特征在相对容差内一致（|a-b| <= atol + rtol*|b|），击球类型一致
+并输出两种精度下的数组内存占用和解析/检测/特征各阶段耗时。
+有任何不一致时返回非零退出码。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 与 app.py 相同：把 analyzers 目录加入路径
+analyzers_dir = os.path.join(BACKEND_DIR, 'analyzers')
+if analyzers_dir not in sys.path:
+    sys.path.insert(0, analyzers_dir)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_sessions import generate_session  # noqa: E402
+
+# 只比较数值特征；stroke_id / duration_points 与精度无关
+SKIPPED_FEATURES = {"stroke_id", "duration_points", "estimated_type"}
+
+
+def compare_results(result64, result32, rtol, atol):
+    """返回 (问题列表, 各特征的最大相对误差)"""
+    problems = []
+    max_rel = {}
+
+    ts64 = result64["data"]["timestamps"]
+    ts32 = result32["data"]["timestamps"]
+    if ts64 != ts32:
+        differing = sorted(set(ts64) ^ set(ts32))
+        problems.append(f"击球下标不一致: float64 {len(ts64)} 个, float32 {len(ts32)} 个, 差异 {differing[:10]}")
+        return problems, max_rel
+
+    for s64, s32 in zip(result64["data"]["stroke_analysis"], result32["data"]["stroke_analysis"]):
+        if s64["estimated_type"] != s32["estimated_type"]:
+            problems.append(f"击球 {s64['stroke_id']} 类型不一致: {s64['estimated_type']} / {s32['estimated_type']}")
+        for name, value in s64.items():
+            if name in SKIPPED_FEATURES:
+                continue
+            a = np.asarray(s32[name], dtype=float)
+            b = np.asarray(value, dtype=float)
+            rel = float(np.max(np.abs(a - b) / np.maximum(np.abs(b), 1e-12)))
+            max_rel[name] = max(max_rel.get(name, 0.0), rel)
+            if not np.allclose(a, b, rtol=rtol, atol=atol):
+                problems.append(f"击球 {s64['stroke_id']} 特征 {name} 超出容差: {b} / {a}")
+    return problems, max_rel
+
+
+def stage_timings(csv_content, dtype, repeat):
+    """解析 / 检测 / 特征 各阶段最短耗时（毫秒）和数组内存占用（字节）"""
+    from stroke_core import (load_imu_csv, compute_derived_channels, detect_stroke_timestamps,
+                             filter_timestamps, extract_stroke_windows)
+    from stroke_features import extract_stroke_features
+
+    def best(func):
+        elapsed = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            value = func()
+            elapsed = min(elapsed, time.perf_counter() - start)
+        return elapsed * 1000, value
+
+    parse_ms, (acc, gyro, ang) = best(lambda: load_imu_csv(csv_content, dtype=dtype))
+
+    def detect():
+        derived = compute_derived_channels(gyro, acc)
+        return derived, filter_timestamps(detect_stroke_timestamps(gyro, acc, derived=derived))
+
+    detect_ms, (derived, timestamps) = best(detect)
+    windows = extract_stroke_windows(acc, gyro, timestamps, 200, ang)
+    features_ms, _ = best(lambda: extract_stroke_features(*windows))
+
+    nbytes = sum(a.nbytes for a in (acc, gyro, ang) if a is not None)
+    nbytes += sum(v.nbytes for v in derived.values())
+    nbytes += sum(w.nbytes for w in windows if w is not None)
+    return {"parse_ms": parse_ms, "detect_ms": detect_ms, "features_ms": features_ms, "bytes": nbytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="float32 分析模式校验")
+    parser.add_argument('--minutes', type=float, nargs='*', default=[10, 60], help="合成会话时长")
+    parser.add_argument('--rtol', type=float, default=1e-4)
+    parser.add_argument('--atol', type=float, default=1e-3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-stored', action='store_true', help="不校验 sensor_data_uploads 中的会话")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from tennis_stroke_analyzer import TennisStrokeAnalyzer
+    analyzer = TennisStrokeAnalyzer()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        sources = []
+        stored_dir = os.path.join(BACKEND_DIR, 'sensor_data_uploads')
+        if not args.no_stored and os.path.isdir(stored_dir):
+            sources += [os.path.join(stored_dir, f) for f in sorted(os.listdir(stored_dir))
+                        if f.startswith('session_') and f.endswith('.csv')]
+        for i, minutes in enumerate(args.minutes):
+            sources.append(generate_session(data_dir, duration_s=minutes * 60.0, seed=i, write_labels=False)["csv_path"])
+
+        failed = False
+        worst = {}
+        print(f"{'会话':40} {'行数':>8} {'击球':>5} {'内存64/32 MB':>14} {'解析ms 64/32':>16} "
+              f"{'检测ms 64/32':>14} {'特征ms 64/32':>14}  结果")
+        for csv_path in sources:
+            with open(csv_path, 'r', encoding='utf-8') as f:
+                csv_content = f.read()
+
+            result64 = analyzer.analyze_stroke_from_csv_content(csv_content, dtype='float64')
+            result32 = analyzer.analyze_stroke_from_csv_content(csv_content, dtype='float32')
+            problems, max_rel = compare_results(result64, result32, args.rtol, args.atol)
+            for name, rel in max_rel.items():
+                worst[name] = max(worst.get(name, 0.0), rel)
+
+            t64 = stage_timings(csv_content, 'float64', args.repeat)
+            t32 = stage_timings(csv_content, 'float32', args.repeat)
+            status = "✅" if not problems else f"❌ {len(problems)} 处不一致"
+            print(f"{os.path.basename(csv_path)[:40]:40} {result64['data']['statistics']['total_data_points']:>8} "
+                  f"{result64['data']['strokes_detected']:>5} "
+                  f"{t64['bytes'] / 1e6:>6.1f}/{t32['bytes'] / 1e6:<7.1f} "
+                  f"{t64['parse_ms']:>7.1f}/{t32['parse_ms']:<8.1f} "
+                  f"{t64['detect_ms']:>6.1f}/{t32['detect_ms']:<7.1f} "
+                  f"{t64['features_ms']:>6.1f}/{t32['features_ms']:<7.1f}  {status}")
+            for problem in problems[:5]:
+                print(f"    {problem}")
+            failed = failed or bool(problems)
+
+    print("\n各特征最大相对误差 (float32 vs float64):")
+    for name, rel in sorted(worst.items(), key=lambda item: -item[1]):
+        print(f"    {name:28} {rel:.2e}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
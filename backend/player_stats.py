@@ -0,0 +1,348 @@
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+from session_summary import iter_stored_sessions
+
+try:
+    import fcntl  # 多个 worker 进程之间的文件锁（Windows 上没有，只能保证单进程内互斥）
+except ImportError:
+    fcntl = None
+
+# 统计状态文件名
+PLAYER_STATS_FILENAME = 'player_stats.json'
+
+# 已计入统计的会话ID（每行一个，只追加），与状态文件分开，合并时不用整份重写
+FOLDED_SESSIONS_FILENAME = 'player_stats_sessions.log'
+
+# 读取-合并-写回期间持有的锁文件
+PLAYER_STATS_LOCK_FILENAME = 'player_stats.lock'
+
+# 每次写入时预先计算好的分位数，查询时直接返回
+REPORTED_QUANTILES = (0.5, 0.75, 0.9, 0.99)
+
+# 击球类型分布按天分桶，只保留最近的天数
+MAX_DAILY_BUCKETS = 90
+
+# 每场击球数的指数滑动平均系数
+EWMA_ALPHA = 0.2
+
+
+class QuantileSketch:
+    """
+    流式分位数草图（对数分桶，相对误差有界）
+
+    正数按 gamma = (1+a)/(1-a) 的对数区间计数，任意分位数的相对误差不超过 a；
+    内存只与数值跨度的对数成正比，和样本数无关，并且可以直接合并。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, buckets: Optional[Dict[int, int]] = None,
+                 zero_count: int = 0, count: int = 0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = buckets or {}
+        self.zero_count = zero_count
+        self.count = count
+
+    def add(self, value: float):
+        if value is None or value != value:  # 跳过 None / NaN
+            return
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+
+    def merge(self, other: 'QuantileSketch'):
+        """合并另一个相同精度的草图"""
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # 取区间 (gamma^(k-1), gamma^k] 的中点估计
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(k): v for k, v in self.buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'QuantileSketch':
+        return cls(
+            relative_accuracy=data.get('relative_accuracy', 0.01),
+            buckets={int(k): v for k, v in data.get('buckets', {}).items()},
+            zero_count=data.get('zero_count', 0),
+            count=data.get('count', 0)
+        )
+
+
+def _new_device_stats(device: str) -> Dict[str, Any]:
+    return {
+        "device": device,
+        "sessions": 0,
+        "analyzed_sessions": 0,
+        "total_strokes": 0,
+        "strokes_per_session": {"mean": 0.0, "m2": 0.0, "min": None, "max": None, "ewma": None},
+        "power": {"count": 0, "max": None, "quantiles": {}},
+        "type_mix": {},
+        "daily_type_mix": {},
+        "first_session": None,
+        "last_session": None
+    }
+
+
+class PlayerStatsAggregator:
+    """
+    跨会话设备统计
+
+    每次分析完成后把结果增量合并进该设备的统计状态（均值/方差用 Welford 算法，
+    力量分布用 QuantileSketch），并预先算好对外展示的字段，查询时 O(1) 返回。
+
+    多个 gunicorn worker 共用同一份状态文件：读取-合并-写回在文件锁内完成，
+    加载前检查文件是否被其他进程替换过。已计入的会话ID单独追加到日志中，只增量读取新增的行。
+
+    先写状态再追加日志：状态文件中的 pending_sessions 记录最近一次写入包含的会话，
+    加载时把日志里缺少的补上，两步之间崩溃既不会漏计也不会重复计入。
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.path = os.path.join(folder, PLAYER_STATS_FILENAME)
+        self.sessions_path = os.path.join(folder, FOLDED_SESSIONS_FILENAME)
+        self.lock_path = os.path.join(folder, PLAYER_STATS_LOCK_FILENAME)
+        self._lock = threading.Lock()
+        self._state = None
+        self._version = None
+        self._folded = set()
+        self._folded_offset = 0
+        self._folded_inode = None
+
+    def fold(self, metadata: Dict[str, Any], analysis: Optional[Dict[str, Any]]):
+        """把一个会话的分析结果合并进设备统计（同一会话只会计入一次）"""
+        with self._locked():
+            self._load()
+            if self._fold(metadata, analysis):
+                self._commit([metadata.get('session_id', 'unknown')])
+
+    def get_device(self, device: str) -> Optional[Dict[str, Any]]:
+        with self._locked():
+            self._load()
+            stats = self._state["devices"].get(device)
+            return self._public(stats) if stats else None
+
+    def list_devices(self) -> Dict[str, Any]:
+        with self._locked():
+            self._load()
+            return {device: self._public(stats) for device, stats in self._state["devices"].items()}
+
+    def rebuild(self):
+        """从已有会话和分析文件重建全部统计"""
+        with self._locked():
+            self._rebuild()
+
+    @contextmanager
+    def _locked(self):
+        """线程锁 + 跨进程文件锁；中途出错时丢弃内存中改了一半的状态"""
+        with self._lock:
+            fd = None
+            try:
+                if fcntl is not None:
+                    fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            except Exception:
+                self._discard()
+                raise
+            finally:
+                if fd is not None:
+                    os.close(fd)  # 关闭时释放锁
+
+    def _fold(self, metadata, analysis) -> bool:
+        session_id = metadata.get('session_id', 'unknown')
+        if session_id in self._folded:
+            return False
+        self._folded.add(session_id)  # 写入日志在 _commit 中，状态保存之后
+
+        device = metadata.get('device_name', 'unknown')
+        stats = self._state["devices"].setdefault(device, _new_device_stats(device))
+        sketches = self._state["sketches"].setdefault(device, QuantileSketch().to_dict())
+
+        upload_time = metadata.get('upload_timestamp', '')
+        stats["sessions"] += 1
+        if upload_time:
+            stats["first_session"] = min(filter(None, [stats["first_session"], upload_time]))
+            stats["last_session"] = max(filter(None, [stats["last_session"], upload_time]))
+
+        if not analysis or not analysis.get('success'):
+            return True
+
+        data = analysis.get('data', {})
+        strokes = data.get('stroke_analysis', [])
+        stroke_count = data.get('strokes_detected', len(strokes))
+
+        # 每场击球数：Welford 在线均值/方差 + 指数滑动平均
+        per_session = stats["strokes_per_session"]
+        stats["analyzed_sessions"] += 1
+        stats["total_strokes"] += stroke_count
+        n = stats["analyzed_sessions"]
+        delta = stroke_count - per_session["mean"]
+        per_session["mean"] += delta / n
+        per_session["m2"] += delta * (stroke_count - per_session["mean"])
+        per_session["min"] = stroke_count if per_session["min"] is None else min(per_session["min"], stroke_count)
+        per_session["max"] = stroke_count if per_session["max"] is None else max(per_session["max"], stroke_count)
+        per_session["ewma"] = (stroke_count if per_session["ewma"] is None
+                               else EWMA_ALPHA * stroke_count + (1 - EWMA_ALPHA) * per_session["ewma"])
+
+        # 击球力量分布
+        sketch = QuantileSketch.from_dict(sketches)
+        for stroke in strokes:
+            sketch.add(stroke.get('stroke_power'))
+        self._state["sketches"][device] = sketch.to_dict()
+        powers = [s.get('stroke_power') for s in strokes if s.get('stroke_power') is not None]
+        if powers:
+            current_max = stats["power"]["max"]
+            stats["power"]["max"] = max(powers) if current_max is None else max(current_max, max(powers))
+        stats["power"]["count"] = sketch.count
+        stats["power"]["quantiles"] = {f"p{int(q * 100)}": sketch.quantile(q) for q in REPORTED_QUANTILES}
+
+        # 击球类型分布（总计 + 按天）
+        day = upload_time[:10] or 'unknown'
+        daily = stats["daily_type_mix"].setdefault(day, {})
+        for stroke in strokes:
+            stroke_type = stroke.get('estimated_type', 'unknown')
+            stats["type_mix"][stroke_type] = stats["type_mix"].get(stroke_type, 0) + 1
+            daily[stroke_type] = daily.get(stroke_type, 0) + 1
+        for old_day in sorted(stats["daily_type_mix"])[:-MAX_DAILY_BUCKETS]:
+            del stats["daily_type_mix"][old_day]
+
+        return True
+
+    def _public(self, stats):
+        """对外展示的统计（标准差由 m2 换算）"""
+        per_session = dict(stats["strokes_per_session"])
+        n = stats["analyzed_sessions"]
+        per_session["std"] = math.sqrt(per_session.pop("m2") / (n - 1)) if n > 1 else 0.0
+        return dict(stats, strokes_per_session=per_session)
+
+    def _empty_state(self):
+        return {"devices": {}, "sketches": {}}
+
+    @staticmethod
+    def _file_version(st):
+        # os.replace 每次都换成新的 inode，mtime 精度不够时也能发现其他进程的写入
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load(self):
+        """文件被其他进程更新过时重新加载（调用方持有锁）"""
+        try:
+            version = self._file_version(os.stat(self.path))
+        except OSError:
+            self._rebuild()
+            return
+        if self._state is None or version != self._version:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                self._rebuild()
+                return
+            self._state = state
+            self._version = version
+            legacy = self._state.pop("folded_sessions", None)
+            if legacy:
+                # 旧格式：会话ID存在状态文件里，迁移到单独的日志
+                self._read_folded()
+                self._mark_folded([sid for sid in legacy if sid not in self._folded])
+                self._save()
+        self._read_folded()
+        # 上次保存状态后、追加日志前中断：补上日志
+        self._mark_folded([sid for sid in self._state.get("pending_sessions", []) if sid not in self._folded])
+
+    def _read_folded(self):
+        """增量读取其他进程新追加的会话ID（日志被其他进程重建过时从头读）"""
+        try:
+            with open(self.sessions_path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != self._folded_inode:
+                    self._folded, self._folded_offset, self._folded_inode = set(), 0, inode
+                f.seek(self._folded_offset)
+                chunk = f.read()
+        except OSError:
+            return
+        complete = chunk.rfind(b'\n') + 1  # 只处理写完整的行
+        self._folded.update(line for line in chunk[:complete].decode('utf-8').split('\n') if line)
+        self._folded_offset += complete
+
+    def _mark_folded(self, session_ids):
+        """追加会话ID（单次 write，O_APPEND）"""
+        if not session_ids:
+            return
+        data = ''.join(f"{sid}\n" for sid in session_ids).encode('utf-8')
+        fd = os.open(self.sessions_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_ino != self._folded_inode:
+                self._folded_inode, self._folded_offset = os.fstat(fd).st_ino, 0
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        self._folded.update(session_ids)
+        self._folded_offset += len(data)
+
+    def _commit(self, session_ids):
+        """保存状态（记下本次计入的会话），成功后再追加日志"""
+        self._state["pending_sessions"] = session_ids
+        self._save()
+        self._mark_folded(session_ids)
+
+    def _discard(self):
+        """下次访问时从磁盘重新加载状态和日志"""
+        self._state = None
+        self._version = None
+        self._folded, self._folded_offset, self._folded_inode = set(), 0, None
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self._version = self._file_version(os.stat(self.path))
+
+    def _rebuild(self):
+        self._state = self._empty_state()
+        self._folded = set()
+        sessions = list(iter_stored_sessions(self.folder))
+
+        # 按上传时间顺序合并，滑动平均才有意义
+        sessions.sort(key=lambda item: item[0].get('upload_timestamp', ''))
+        folded = [metadata.get('session_id', 'unknown') for metadata, analysis in sessions
+                  if self._fold(metadata, analysis)]
+
+        # 同样先保存状态，再整体替换日志
+        self._state["pending_sessions"] = folded
+        self._save()
+        tmp_path = f"{self.sessions_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(''.join(f"{sid}\n" for sid in folded).encode('utf-8'))
+        os.replace(tmp_path, self.sessions_path)
+        st = os.stat(self.sessions_path)
+        self._folded_inode, self._folded_offset = st.st_ino, st.st_size
@@ -0,0 +1,114 @@
+import json
+import math
+from typing import Dict, Any, List, Optional
+
+from flask import Response
+
+# orjson 可选：安装了就用（比标准库快一个数量级，且直接输出UTF-8字节），否则退回标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = orjson is not None
+
+# 击球结果的两种布局:
+#   rows      每个击球一个字典（默认，兼容现有客户端和存储文件）
+#   columnar  每个特征一个数组，strokes 长度相同，体积更小、编码更快
+LAYOUTS = ('rows', 'columnar')
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """
+    序列化为UTF-8 JSON字节；默认紧凑输出（写盘和响应都不需要缩进）
+
+    numpy 标量和数组会被转换；NaN/Inf 按 orjson 的规则输出为 null，两条路径输出相同的字节
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option, default=_default)
+    # 标准库遇到 NaN 会写出非法的 NaN 标记，先把非有限浮点数换成 None，再用 allow_nan=False 兜底
+    obj = _finite(obj)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False, allow_nan=False).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+
+def loads(data) -> Any:
+    """解析JSON字节或字符串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _finite(obj):
+    """递归转换 numpy 类型，并把 NaN/Inf 替换为 None（仅标准库路径使用）"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if isinstance(obj, (str, int, bool)) or obj is None:
+        return obj
+    return _finite(_default(obj))
+
+
+def _default(obj):
+    """标准库不认识的类型（numpy 标量/数组）"""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"无法序列化类型 {type(obj).__name__}")
+
+
+def json_response(obj: Any, status: int = 200) -> Response:
+    """与 jsonify 相同用途的响应，走快速编码器且不做美化输出"""
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+def resolve_layout(layout: Optional[str]) -> str:
+    """校验布局参数，None 表示默认的 rows"""
+    layout = layout or 'rows'
+    if layout not in LAYOUTS:
+        raise ValueError(f"不支持的布局: {layout}，可选 {', '.join(LAYOUTS)}")
+    return layout
+
+
+def rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """list-of-dicts -> struct-of-arrays；某个击球缺少的字段填 None"""
+    names = []
+    for row in rows:
+        for name in row:
+            if name not in names:
+                names.append(name)
+    return {name: [row.get(name) for row in rows] for name in names}
+
+
+def columns_to_rows(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """struct-of-arrays -> list-of-dicts"""
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def with_layout(result: Optional[Dict[str, Any]], layout: str) -> Optional[Dict[str, Any]]:
+    """
+    把分析结果中的 stroke_analysis 转成指定布局（返回浅拷贝，不修改原结果）
+
+    已经是目标布局的结果原样返回
+    """
+    if not result or not isinstance(result.get('data'), dict):
+        return result
+    strokes = result['data'].get('stroke_analysis')
+    if strokes is None:
+        return result
+
+    is_columnar = isinstance(strokes, dict)
+    if (layout == 'columnar') == is_columnar:
+        return result
+
+    data = dict(result['data'])
+    data['stroke_analysis'] = rows_to_columns(strokes) if layout == 'columnar' else columns_to_rows(strokes)
+    data['layout'] = layout
+    return {**result, 'data': data}
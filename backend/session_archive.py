@@ -0,0 +1,491 @@
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Callable, Iterator, Tuple
+from session_summary import is_session_metadata_file
+
+# 归档目录（在存储目录下）和归档索引文件名
+ARCHIVE_DIRNAME = 'archive'
+ARCHIVE_INDEX_FILENAME = 'archive_index.json'
+
+# 属于一个会话的文件后缀（长的放前面，先匹配 _analysis.json 再匹配 .json）
+# _derived.npz 是可重新计算的缓存（见 analyzers/session_arrays.py）：计入容量、压缩时随会话删除，不进归档
+SESSION_FILE_SUFFIXES = ('_analysis.json', '_manifest.json', '_derived.npz', '.json', '.csv')
+
+# 归档段：LZMA 压缩的 zip，每个成员可以单独解压读取
+SEGMENT_COMPRESSION = zipfile.ZIP_LZMA
+MAX_SEGMENT_BYTES = 256 * 1024 * 1024
+
+# 按容量压缩时也不动最近这段时间内的会话（可能还在上传/分析中）
+MIN_COMPACT_AGE = timedelta(hours=1)
+
+
+class RetentionPolicy:
+    """
+    存储保留策略
+
+    compact_after_days  超过该天数的会话压缩进归档段
+    max_live_bytes      存储目录中未压缩会话的容量上限，超出时从最旧的开始压缩
+    delete_after_days   超过该天数的归档段整段删除（None 表示不删除）
+    max_total_bytes     存储目录 + 归档的总容量上限，超出时从最旧的归档段开始删除
+    """
+
+    def __init__(self, compact_after_days: Optional[float] = 7.0, max_live_bytes: Optional[int] = None,
+                 delete_after_days: Optional[float] = None, max_total_bytes: Optional[int] = None,
+                 max_segment_bytes: int = MAX_SEGMENT_BYTES):
+        self.compact_after_days = compact_after_days
+        self.max_live_bytes = max_live_bytes
+        self.delete_after_days = delete_after_days
+        self.max_total_bytes = max_total_bytes
+        self.max_segment_bytes = max_segment_bytes
+
+    @classmethod
+    def from_env(cls) -> 'RetentionPolicy':
+        """从环境变量读取：RETENTION_COMPACT_AFTER_DAYS / RETENTION_MAX_LIVE_MB /
+        RETENTION_DELETE_AFTER_DAYS / RETENTION_MAX_TOTAL_MB"""
+        def number(name, default=None, scale=1):
+            value = os.environ.get(name)
+            return float(value) * scale if value not in (None, '') else default
+
+        max_live = number('RETENTION_MAX_LIVE_MB', scale=1024 * 1024)
+        max_total = number('RETENTION_MAX_TOTAL_MB', scale=1024 * 1024)
+        return cls(
+            compact_after_days=number('RETENTION_COMPACT_AFTER_DAYS', 7.0),
+            max_live_bytes=int(max_live) if max_live is not None else None,
+            delete_after_days=number('RETENTION_DELETE_AFTER_DAYS'),
+            max_total_bytes=int(max_total) if max_total is not None else None
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+def session_name_of(filename: str) -> Optional[str]:
+    """由文件名得到会话名（session_<时间>_<ID>），不是会话文件时返回None"""
+    if not filename.startswith('session_'):
+        return None
+    for suffix in SESSION_FILE_SUFFIXES:
+        if filename.endswith(suffix):
+            name = filename[:-len(suffix)]
+            # 标注文件（_labels.json）不属于会话存储，不参与压缩
+            return None if name.endswith('_labels') else name
+    return None
+
+
+def session_time(name: str, fallback_path: Optional[str] = None) -> datetime:
+    """从会话名中的时间戳得到会话时间，解析失败时用文件修改时间"""
+    parts = name.split('_')
+    if len(parts) >= 3:
+        try:
+            return datetime.strptime(f"{parts[1]}_{parts[2]}", '%Y%m%d_%H%M%S')
+        except ValueError:
+            pass
+    if fallback_path and os.path.exists(fallback_path):
+        return datetime.fromtimestamp(os.path.getmtime(fallback_path))
+    return datetime.now()
+
+
+def list_live_sessions(folder: str) -> List[Dict[str, Any]]:
+    """按会话分组列出存储目录中的文件，返回按时间从旧到新排序的 [{name, time, files, bytes}]"""
+    sessions: Dict[str, Dict[str, Any]] = {}
+    for filename in os.listdir(folder):
+        name = session_name_of(filename)
+        if name is None:
+            continue
+        path = os.path.join(folder, filename)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        entry = sessions.setdefault(name, {"name": name, "files": {}, "bytes": 0})
+        entry["files"][filename[len(name):]] = path
+        entry["bytes"] += size
+
+    for entry in sessions.values():
+        entry["time"] = session_time(entry["name"], next(iter(entry["files"].values())))
+    return sorted(sessions.values(), key=lambda e: e["time"])
+
+
+def _fsync_path(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # 部分平台不支持对目录 fsync
+    finally:
+        os.close(fd)
+
+
+class SessionArchive:
+    """
+    会话归档（压缩段）
+
+    旧会话被打包进 archive/segment_*.zip（LZMA），每个会话保存 CSV、去掉冗余 csv_content 的元数据
+    和分析结果；archive_index.json 记录会话在哪个段以及元数据，列表查询不需要打开压缩包。
+    存储目录和归档对读取方透明：先找存储目录，找不到再找归档。
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.archive_dir = os.path.join(folder, ARCHIVE_DIRNAME)
+        self.index_path = os.path.join(self.archive_dir, ARCHIVE_INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+
+    # ------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------
+    def find(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """按会话ID（短ID或完整会话名）查找归档会话"""
+        with self._lock:
+            self._load()
+            sessions = self._index["sessions"]
+            if session_id in sessions:
+                return dict(sessions[session_id], name=session_id)
+            for name, entry in sessions.items():
+                if name.endswith(f"_{session_id}"):
+                    return dict(entry, name=name)
+        return None
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            return [dict(entry, name=name) for name, entry in self._index["sessions"].items()]
+
+    def read_member(self, entry: Dict[str, Any], suffix: str) -> Optional[bytes]:
+        """读取归档会话中的一个文件（suffix 为 .csv / .json / _analysis.json），不存在时返回None"""
+        member = f"{entry['name']}{suffix}"
+        if member not in entry.get("members", []):
+            return None
+        with zipfile.ZipFile(os.path.join(self.archive_dir, entry["segment"])) as zf:
+            return zf.read(member)
+
+    def iter_archived_sessions(self) -> Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """产出归档会话的 (元数据, 分析结果)，用于重建摘要索引和设备统计"""
+        by_segment: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in self.list_sessions():
+            by_segment.setdefault(entry["segment"], []).append(entry)
+
+        for segment, entries in by_segment.items():
+            try:
+                zf = zipfile.ZipFile(os.path.join(self.archive_dir, segment))
+            except (OSError, zipfile.BadZipFile):
+                continue
+            with zf:
+                for entry in entries:
+                    analysis = None
+                    member = f"{entry['name']}_analysis.json"
+                    if member in entry.get("members", []):
+                        try:
+                            analysis = json.loads(zf.read(member))
+                        except (KeyError, ValueError):
+                            pass
+                    yield entry["metadata"], analysis
+
+    def usage(self) -> Dict[str, Any]:
+        live = list_live_sessions(self.folder)
+        with self._lock:
+            self._load()
+            segments = dict(self._index["segments"])
+            archived = len(self._index["sessions"])
+        return {
+            "live_sessions": len(live),
+            "live_bytes": sum(s["bytes"] for s in live),
+            "archived_sessions": archived,
+            "archive_segments": len(segments),
+            "archive_bytes": sum(seg["size"] for seg in segments.values())
+        }
+
+    # ------------------------------------------------------------
+    # 压缩与保留
+    # ------------------------------------------------------------
+    def compact(self, sessions: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        把一组存储目录中的会话（list_live_sessions 的条目）打包成一个归档段
+
+        顺序：写临时段文件并落盘 → rename → 更新索引 → 删除原文件。
+        任一步骤中断都不会丢数据：段已写入但索引未更新时，原文件仍在存储目录中，下次重新压缩。
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        segment = f"segment_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.zip"
+        segment_path = os.path.join(self.archive_dir, segment)
+        temp_path = os.path.join(self.archive_dir, f".{segment}.tmp")
+
+        entries = {}
+        try:
+            with zipfile.ZipFile(temp_path, 'w', compression=SEGMENT_COMPRESSION) as zf:
+                for session in sessions:
+                    entry = self._add_session(zf, session)
+                    if entry is not None:
+                        entries[session["name"]] = dict(entry, segment=segment)
+            if not entries:
+                os.remove(temp_path)
+                return None
+            _fsync_path(temp_path)
+            os.replace(temp_path, segment_path)
+            _fsync_path(self.archive_dir)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            self._load()
+            self._index["sessions"].update(entries)
+            self._index["segments"][segment] = {
+                "size": os.path.getsize(segment_path),
+                "created_at": datetime.now().isoformat(),
+                "newest_session": max(e["session_time"] for e in entries.values()),
+                "sessions": sorted(entries)
+            }
+            self._save()
+
+        # 索引落盘后才删除原文件
+        for session in sessions:
+            if session["name"] in entries:
+                for path in session["files"].values():
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+        return segment
+
+    def _add_session(self, zf: zipfile.ZipFile, session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """把一个会话写入压缩包，不完整的会话跳过"""
+        files = session["files"]
+        if '.json' not in files or '.csv' not in files:
+            return None
+        try:
+            with open(files['.json'], 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        metadata = stored.get('metadata', {})
+        # 元数据声明有清单但清单不存在：写入未完成，不压缩
+        if metadata.get('manifest') and '_manifest.json' not in files:
+            return None
+
+        name = session["name"]
+        members = []
+
+        # CSV 直接从磁盘流式写入压缩包，不整体读入内存
+        zf.write(files['.csv'], arcname=f"{name}.csv")
+        members.append(f"{name}.csv")
+
+        # 去掉与 CSV 重复的 raw_data.csv_content
+        raw_data = {k: v for k, v in stored.get('raw_data', {}).items() if k != 'csv_content'}
+        zf.writestr(f"{name}.json", json.dumps({"metadata": metadata, "raw_data": raw_data},
+                                               ensure_ascii=False, separators=(',', ':')))
+        members.append(f"{name}.json")
+
+        if '_analysis.json' in files:
+            zf.write(files['_analysis.json'], arcname=f"{name}_analysis.json")
+            members.append(f"{name}_analysis.json")
+
+        return {
+            "members": members,
+            "metadata": metadata,
+            "session_time": session["time"].isoformat(),
+            "archived_at": datetime.now().isoformat()
+        }
+
+    def delete_segment(self, segment: str) -> List[str]:
+        """删除整个归档段，返回被删除的会话名"""
+        with self._lock:
+            self._load()
+            info = self._index["segments"].pop(segment, None)
+            if info is None:
+                return []
+            for name in info["sessions"]:
+                # 会话可能在崩溃恢复后被重新压缩进了更新的段，只删除仍指向本段的索引项
+                if self._index["sessions"].get(name, {}).get("segment") == segment:
+                    del self._index["sessions"][name]
+            self._save()
+        try:
+            os.remove(os.path.join(self.archive_dir, segment))
+        except FileNotFoundError:
+            pass
+        return info["sessions"]
+
+    def run_retention(self, policy: RetentionPolicy, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        执行一轮保留策略：先按时间/容量压缩，再按时间/总容量删除归档段
+        """
+        now = now or datetime.now()
+        report = {"compacted_sessions": 0, "segments_created": [], "deleted_sessions": [],
+                  "segments_deleted": [], "quota_unattainable": False}
+
+        # 1. 压缩：超龄会话 + 容量超限时从最旧的开始
+        live = list_live_sessions(self.folder)
+        live_bytes = sum(s["bytes"] for s in live)
+        candidates = []
+        for session in live:
+            age = now - session["time"]
+            too_old = policy.compact_after_days is not None and age >= timedelta(days=policy.compact_after_days)
+            over_quota = (policy.max_live_bytes is not None and live_bytes > policy.max_live_bytes
+                          and age >= MIN_COMPACT_AGE)
+            if too_old or over_quota:
+                candidates.append(session)
+                live_bytes -= session["bytes"]
+
+        batch, batch_bytes = [], 0
+        for session in candidates + [None]:
+            if session is not None:
+                batch.append(session)
+                batch_bytes += session["bytes"]
+            if batch and (session is None or batch_bytes >= policy.max_segment_bytes):
+                segment = self.compact(batch)
+                if segment:
+                    report["segments_created"].append(segment)
+                    report["compacted_sessions"] += len(self._segment_info(segment)["sessions"])
+                batch, batch_bytes = [], 0
+
+        # 2. 删除：超龄归档段 + 总容量超限时从最旧的段开始
+        with self._lock:
+            self._load()
+            segments = sorted(self._index["segments"].items(), key=lambda item: item[1]["newest_session"])
+        usage = self.usage()
+        total_bytes = usage["live_bytes"] + usage["archive_bytes"]
+        # 只删归档段无法让总量降到配额以下时（未压缩的会话本身就超了），不为配额删除任何归档
+        quota_unattainable = policy.max_total_bytes is not None and usage["live_bytes"] > policy.max_total_bytes
+        report["quota_unattainable"] = quota_unattainable
+        for segment, info in segments:
+            too_old = (policy.delete_after_days is not None and
+                       now - datetime.fromisoformat(info["newest_session"]) >= timedelta(days=policy.delete_after_days))
+            over_quota = (policy.max_total_bytes is not None and not quota_unattainable
+                          and total_bytes > policy.max_total_bytes)
+            if too_old or over_quota:
+                report["deleted_sessions"].extend(self.delete_segment(segment))
+                report["segments_deleted"].append(segment)
+                total_bytes -= info["size"]
+
+        report["usage"] = self.usage()
+        return report
+
+    def _segment_info(self, segment: str) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            return self._index["segments"].get(segment, {"sessions": []})
+
+    # ------------------------------------------------------------
+    # 索引持久化
+    # ------------------------------------------------------------
+    def _load(self):
+        """索引被其他进程更新过时重新加载"""
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            if self._index is None:
+                self._index = {"sessions": {}, "segments": {}}
+            return
+        if self._index is not None and mtime == self._mtime:
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+            self._mtime = mtime
+        except (OSError, ValueError):
+            self._index = self._rebuild_index()
+
+    def _rebuild_index(self) -> Dict[str, Any]:
+        """索引损坏时从各归档段重建"""
+        index = {"sessions": {}, "segments": {}}
+        if not os.path.isdir(self.archive_dir):
+            return index
+        for segment in sorted(os.listdir(self.archive_dir)):
+            if not (segment.startswith('segment_') and segment.endswith('.zip')):
+                continue
+            path = os.path.join(self.archive_dir, segment)
+            try:
+                with zipfile.ZipFile(path) as zf:
+                    names = zf.namelist()
+                    sessions = {}
+                    for member in names:
+                        if not is_session_metadata_file(member):
+                            continue
+                        name = member[:-len('.json')]
+                        stored = json.loads(zf.read(member))
+                        sessions[name] = {
+                            "segment": segment,
+                            "members": [m for m in names if session_name_of(m) == name],
+                            "metadata": stored.get('metadata', {}),
+                            "session_time": session_time(name).isoformat(),
+                            "archived_at": datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+                        }
+            except (OSError, ValueError, zipfile.BadZipFile):
+                continue
+            if sessions:
+                index["sessions"].update(sessions)
+                index["segments"][segment] = {
+                    "size": os.path.getsize(path),
+                    "created_at": datetime.fromtimestamp(os.path.getmtime(path)).isoformat(),
+                    "newest_session": max(s["session_time"] for s in sessions.values()),
+                    "sessions": sorted(sessions)
+                }
+        return index
+
+    def _save(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+        self._mtime = os.stat(self.index_path).st_mtime_ns
+
+
+class RetentionService:
+    """
+    后台保留/压缩服务：每隔 interval 秒执行一轮 run_retention，
+    有会话被删除时调用 on_deleted（例如重建摘要索引）
+    """
+
+    def __init__(self, archive: SessionArchive, policy: RetentionPolicy, interval: float = 3600.0,
+                 on_deleted: Optional[Callable[[List[str]], None]] = None):
+        self.archive = archive
+        self.policy = policy
+        self.interval = interval
+        self.on_deleted = on_deleted
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name='session-retention', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self) -> Dict[str, Any]:
+        """执行一轮（与后台线程互斥）"""
+        with self._run_lock:
+            start = time.perf_counter()
+            report = self.archive.run_retention(self.policy)
+            report["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            report["finished_at"] = datetime.now().isoformat()
+            self.last_report = report
+        if report["deleted_sessions"] and self.on_deleted:
+            self.on_deleted(report["deleted_sessions"])
+        return report
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                report = self.run_once()
+                if report["compacted_sessions"] or report["deleted_sessions"]:
+                    print(f"🗄️  保留策略: 压缩 {report['compacted_sessions']} 个会话, "
+                          f"删除 {len(report['deleted_sessions'])} 个会话")
+                if report["quota_unattainable"]:
+                    print(f"⚠️  保留策略: 未压缩会话 {report['usage']['live_bytes']} 字节已超过总配额，"
+                          f"删除归档无法达到配额，未按容量删除归档")
+            except Exception as e:
+                print(f"⚠️  保留策略执行失败: {e}")
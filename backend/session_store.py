@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+# 每个会话写完所有文件后最后写入的清单，存在即表示会话完整
+MANIFEST_SUFFIX = '_manifest.json'
+
+# 临时文件以 . 开头，不会被任何按 session_ 前缀扫描的代码看到
+TEMP_PREFIX = '.'
+TEMP_SUFFIX = '.tmp'
+
+# 清理超过该时长的临时文件和孤立CSV（写入中途崩溃留下的）；写入时最多每隔这么久扫描一次目录
+STALE_TEMP_SECONDS = 3600
+
+
+class _Ticket:
+    """一组等待持久化的文件，提交线程完成后唤醒等待者"""
+
+    def __init__(self, items: List[Tuple[str, str]]):
+        self.items = items
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class GroupCommitter:
+    """
+    组提交：把多个上传的 fsync 合并成批
+
+    写入方在自己的线程里写临时文件并 fsync（各上传的数据落盘互相并行），再调用 commit()；
+    后台线程只按提交顺序 rename 到目标路径、对每个目录 fsync 一次，最后唤醒这一批的所有等待者。
+    高并发上传时目录 fsync 被整批分摊。
+    """
+
+    def __init__(self, max_delay: float = 0.005, max_batch: int = 64, fsync: bool = True):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._pending: List[_Ticket] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.files_committed = 0
+
+    def commit(self, items: List[Tuple[str, str]]):
+        """提交 [(已落盘的临时文件, 目标路径)]，阻塞到这些文件已原子替换且目录落盘"""
+        ticket = _Ticket(items)
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='session-group-commit', daemon=True)
+                self._thread.start()
+            self._pending.append(ticket)
+            self._cond.notify()
+        ticket.done.wait()
+        if ticket.error is not None:
+            raise ticket.error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # 稍等片刻，让同时到达的上传进入同一批
+            if self.max_delay > 0:
+                time.sleep(self.max_delay)
+            with self._cond:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            self._flush(batch)
+
+    def _flush(self, batch: List[_Ticket]):
+        directories = set()
+        for ticket in batch:
+            try:
+                for temp_path, final_path in ticket.items:
+                    os.replace(temp_path, final_path)
+                    directories.add(os.path.dirname(os.path.abspath(final_path)))
+            except BaseException as e:
+                ticket.error = e
+
+        if self.fsync:
+            for directory in directories:
+                try:
+                    _fsync_path(directory)
+                except OSError:
+                    pass  # 部分平台不支持对目录 fsync
+
+        self.batches += 1
+        for ticket in batch:
+            if ticket.error is None:
+                self.files_committed += len(ticket.items)
+            ticket.done.set()
+
+
+def _fsync_path(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _temp_path_for(final_path: str) -> str:
+    directory, name = os.path.split(final_path)
+    return os.path.join(directory, f"{TEMP_PREFIX}{name}.{uuid.uuid4().hex[:12]}{TEMP_SUFFIX}")
+
+
+class SessionStore:
+    """
+    会话文件的原子写入
+
+    每个文件先写到同目录的临时文件，再经 GroupCommitter 落盘并 rename；
+    会话的最后一批文件与 <会话名>_manifest.json 一起提交，清单记录各文件大小和 sha256。
+    读取方据此区分完整会话、旧版（无清单）会话和不完整会话。
+    """
+
+    def __init__(self, folder: str, fsync: bool = True, max_delay: float = 0.005):
+        self.folder = folder
+        self.committer = GroupCommitter(max_delay=max_delay, fsync=fsync)
+        self._last_cleanup = None
+
+    def write_files(self, files: Dict[str, bytes]) -> Dict[str, str]:
+        """
+        原子写入一组文件 {文件名: 内容}，全部落盘后返回 {文件名: 路径}
+        """
+        if self._last_cleanup is None or time.monotonic() - self._last_cleanup > STALE_TEMP_SECONDS:
+            # 第一次写入时（之后每隔一段时间）顺带清理崩溃遗留的文件（不在导入时扫描目录）
+            self._last_cleanup = time.monotonic()
+            self.cleanup_stale_temp_files()
+            self.cleanup_orphaned_uploads()
+
+        items = []
+        try:
+            for name, content in files.items():
+                final_path = os.path.join(self.folder, name)
+                temp_path = _temp_path_for(final_path)
+                items.append((temp_path, final_path))
+                with open(temp_path, 'wb') as f:
+                    f.write(content)
+                    if self.committer.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+            self.committer.commit(items)
+        except BaseException:
+            for temp_path, _ in items:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+        return {name: final for name, (_, final) in zip(files, items)}
+
+    def commit_session(self, filename: str, files: Dict[str, bytes],
+                       committed: Optional[Dict[str, bytes]] = None) -> Dict[str, str]:
+        """
+        写入会话的最后一批文件，并在同一批中最后写入清单
+
+        committed 为之前已经用 write_files 提交过的文件 {文件名: 内容}，一并记入清单
+        """
+        entries = {name: {"size": len(content), "sha256": hashlib.sha256(content).hexdigest()}
+                   for name, content in {**(committed or {}), **files}.items()}
+        manifest = {
+            "session": filename,
+            "complete": True,
+            "files": entries,
+            "committed_at": datetime.now().isoformat()
+        }
+        manifest_name = f"{filename}{MANIFEST_SUFFIX}"
+        # 字典保持插入顺序：清单最后 rename
+        return self.write_files({**files, manifest_name: json.dumps(manifest, ensure_ascii=False).encode('utf-8')})
+
+    def session_state(self, filename: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        返回会话状态:
+            complete   有清单且清单中的文件都在、大小一致
+            legacy     没有清单（引入清单之前写入的会话）
+            incomplete 有清单但文件缺失或大小不符，或元数据声明有清单但清单不存在
+        """
+        manifest_path = os.path.join(self.folder, f"{filename}{MANIFEST_SUFFIX}")
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return 'incomplete' if (metadata or {}).get('manifest') else 'legacy'
+        except (OSError, ValueError):
+            return 'incomplete'
+
+        for name, entry in manifest.get('files', {}).items():
+            try:
+                if os.path.getsize(os.path.join(self.folder, name)) != entry.get('size'):
+                    return 'incomplete'
+            except OSError:
+                return 'incomplete'
+        return 'complete'
+
+    def cleanup_stale_temp_files(self, max_age: float = STALE_TEMP_SECONDS) -> int:
+        """删除崩溃后遗留的临时文件，返回删除数量"""
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.folder):
+            if not (name.startswith(TEMP_PREFIX) and name.endswith(TEMP_SUFFIX)):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def cleanup_orphaned_uploads(self, max_age: float = STALE_TEMP_SECONDS) -> List[str]:
+        """
+        删除孤立的上传CSV，返回删除的文件名
+
+        上传先单独提交CSV，再提交元数据和清单；两次提交之间崩溃会留下既没有元数据也没有清单的CSV。
+        这种上传没有返回成功，客户端会重新上传，所以可以直接删除。
+        只处理超过 max_age 的文件，不会碰到正在上传的会话
+        """
+        removed = []
+        now = time.time()
+        names = set(os.listdir(self.folder))
+        for name in names:
+            if not (name.startswith('session_') and name.endswith('.csv')):
+                continue
+            session = name[:-len('.csv')]
+            if f"{session}.json" in names or f"{session}{MANIFEST_SUFFIX}" in names:
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed.append(name)
+            except OSError:
+                pass
+        return removed
@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+from typing import Dict, Any, Optional, Iterator, Tuple
+
+# 摘要索引文件名（JSON Lines，每个会话一行；后写入的同ID记录覆盖先前的）
+SUMMARY_INDEX_FILENAME = 'summary_index.jsonl'
+
+# 与分析器保持一致：假设5Hz采样率
+SAMPLE_RATE = 5.0
+
+# 存储目录中与会话元数据同为 .json、但不是元数据的文件后缀（分析结果、击球标注、完整性清单）
+NON_METADATA_SUFFIXES = ('_analysis.json', '_labels.json', '_manifest.json')
+
+
+def is_session_metadata_file(filename: str) -> bool:
+    """判断存储目录中的文件是否为会话元数据（session_<时间>_<ID>.json）"""
+    return (filename.startswith('session_') and filename.endswith('.json')
+            and not filename.endswith(NON_METADATA_SUFFIXES))
+
+
+def iter_stored_sessions(folder: str) -> Iterator[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """
+    遍历存储目录和归档中的会话，产出 (元数据, 分析结果)；没有分析文件时分析结果为None
+    """
+    live_names = set()
+    for filename in os.listdir(folder):
+        if not is_session_metadata_file(filename):
+            continue
+        live_names.add(filename[:-len('.json')])
+        try:
+            with open(os.path.join(folder, filename), 'r', encoding='utf-8') as f:
+                metadata = json.load(f).get('metadata', {})
+        except (OSError, ValueError):
+            continue
+
+        analysis = None
+        analysis_path = os.path.join(folder, filename[:-len('.json')] + '_analysis.json')
+        if os.path.exists(analysis_path):
+            try:
+                with open(analysis_path, 'r', encoding='utf-8') as f:
+                    analysis = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        yield metadata, analysis
+
+    # 已压缩进归档段的会话（session_archive 依赖本模块，这里按需导入）
+    from session_archive import SessionArchive
+    for metadata, analysis in SessionArchive(folder).iter_archived_sessions():
+        if metadata.get('filename') not in live_names:
+            yield metadata, analysis
+
+
+def build_session_summary(metadata: Dict[str, Any], analysis: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    根据会话元数据和分析结果生成摘要记录
+    """
+    summary = {
+        "session_id": metadata.get('session_id', 'unknown'),
+        "filename": metadata.get('filename', ''),
+        "device": metadata.get('device_name', 'unknown'),
+        "device_mac": metadata.get('device_mac', 'unknown'),
+        "upload_timestamp": metadata.get('upload_timestamp', ''),
+        "recording_duration": metadata.get('recording_duration', 0),
+        "data_points": metadata.get('data_points', 0),
+        "file_size": metadata.get('file_size', 0),
+        "analysis_success": False,
+        "stroke_count": None,
+        "average_interval_s": None,
+        "peak_power": None,
+        "duration_s": None
+    }
+
+    if analysis and analysis.get('success'):
+        data = analysis.get('data', {})
+        timestamps = data.get('timestamps', [])
+        powers = [s.get('stroke_power', 0.0) for s in data.get('stroke_analysis', [])]
+
+        summary.update({
+            "analysis_success": True,
+            "stroke_count": data.get('strokes_detected', len(timestamps)),
+            "average_interval_s": (
+                round((timestamps[-1] - timestamps[0]) / (len(timestamps) - 1) / SAMPLE_RATE, 2)
+                if len(timestamps) >= 2 else None
+            ),
+            "peak_power": round(max(powers), 2) if powers else None,
+            "duration_s": data.get('statistics', {}).get('data_duration_seconds')
+        })
+
+    return summary
+
+
+class SessionSummaryIndex:
+    """
+    会话摘要索引
+
+    每次分析完成后追加一行摘要；读取时只增量解析文件新增的部分，
+    看板和列表接口直接从内存中的有序列表分页，不再逐个打开会话文件。
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.path = os.path.join(folder, SUMMARY_INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._ordered = []
+        self._offset = 0
+        self._inode = None
+
+    def append(self, summary: Dict[str, Any]):
+        """追加一条摘要（单次 write，O_APPEND 保证多进程追加不交错）"""
+        line = (json.dumps(summary, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock:
+            self._ensure_built()
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def page(self, page: int = 1, per_page: int = 50) -> Dict[str, Any]:
+        """按上传时间倒序分页"""
+        page = max(1, int(page))
+        per_page = max(1, min(int(per_page), 500))
+
+        with self._lock:
+            self._ensure_built()
+            self._refresh()
+            total = len(self._ordered)
+            start = (page - 1) * per_page
+            items = self._ordered[start:start + per_page]
+
+        return {
+            "items": items,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page
+        }
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """按会话ID查询摘要"""
+        with self._lock:
+            self._ensure_built()
+            self._refresh()
+            return self._by_id.get(session_id)
+
+    def rebuild(self):
+        """从已有会话文件重建索引（用于索引丢失或历史数据回填）"""
+        with self._lock:
+            self._rebuild()
+
+    def _ensure_built(self):
+        if not os.path.exists(self.path):
+            self._rebuild()
+
+    def _rebuild(self):
+        summaries = [build_session_summary(metadata, analysis)
+                     for metadata, analysis in iter_stored_sessions(self.folder)]
+
+        # 每个进程用自己的临时文件，多个 worker 同时重建时互不覆盖
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for summary in summaries:
+                f.write(json.dumps(summary, ensure_ascii=False, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.path)
+
+        self._inode = None
+        self._refresh()
+
+    def _refresh(self):
+        """只读取上次之后新追加的行；文件被（本进程或其他 worker）重建过时从头读取"""
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                self._by_id = {}
+                self._ordered = []
+                self._offset = 0
+                self._inode = st.st_ino
+            if st.st_size == self._offset:
+                return
+            f.seek(self._offset)
+            chunk = f.read(st.st_size - self._offset)
+
+        # 只处理完整的行，未写完的半行留到下次
+        end = chunk.rfind(b'\n') + 1
+        for line in chunk[:end].splitlines():
+            try:
+                summary = json.loads(line)
+            except ValueError:
+                continue
+            self._by_id[summary.get('session_id')] = summary
+        self._offset += end
+
+        self._ordered = sorted(self._by_id.values(),
+                               key=lambda s: s.get('upload_timestamp', ''), reverse=True)
@@ -0,0 +1,261 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+from session_summary import iter_stored_sessions
+
+# 击球索引数据库文件名（存储目录下）
+STROKE_INDEX_FILENAME = 'stroke_index.sqlite3'
+
+# 可以按范围过滤和排序的数值特征列（与 stroke_analysis 中的字段同名）
+FEATURE_COLUMNS = (
+    'peak_acceleration', 'peak_rotation', 'avg_acceleration', 'avg_rotation', 'stroke_power',
+    'swing_duration_s', 'time_to_peak_s', 'peak_jerk', 'spectral_energy', 'dominant_frequency_hz',
+    'orientation_change_deg'
+)
+
+# 除特征外还可以排序的列
+SORTABLE_COLUMNS = ('session_time', 'offset_s') + FEATURE_COLUMNS
+
+MAX_QUERY_LIMIT = 1000
+
+# 索引内容版本（PRAGMA user_version）；行的计算方式变化时递增，打开旧版本的数据库会自动重建
+# 2: offset_s 改为按数据质量中的实测采样间隔计算（之前按5Hz常量，数值偏大约40倍）
+# 3: 时长/频率类特征按实测采样率换算
+# 4: offset_s 直接取分析结果中按实际时间戳算出的值（重复行、丢包不再造成偏差）
+STROKE_INDEX_VERSION = 4
+
+# 与采样率有关的特征 -> 采样率的幂次（时长 ∝ 1/fs，急动度和主频 ∝ fs）
+RATE_DEPENDENT_FEATURES = {
+    'swing_duration_s': -1,
+    'time_to_peak_s': -1,
+    'peak_jerk': 1,
+    'dominant_frequency_hz': 1
+}
+
+# 分析结果中没有 analysis_info.sample_rate_hz 的旧分析，这些特征是按5Hz计算的
+LEGACY_FEATURE_SAMPLE_RATE = 5.0
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS strokes (
+    session_id TEXT NOT NULL,
+    session_name TEXT NOT NULL,
+    device TEXT NOT NULL,
+    device_mac TEXT,
+    session_time TEXT NOT NULL,
+    stroke_id INTEGER NOT NULL,
+    sample_index INTEGER,
+    offset_s REAL,
+    estimated_type TEXT,
+    {', '.join(f'{name} REAL' for name in FEATURE_COLUMNS)},
+    PRIMARY KEY (session_id, stroke_id)
+);
+CREATE INDEX IF NOT EXISTS strokes_device_time ON strokes (device, session_time);
+CREATE INDEX IF NOT EXISTS strokes_time ON strokes (session_time);
+CREATE INDEX IF NOT EXISTS strokes_power ON strokes (stroke_power);
+CREATE INDEX IF NOT EXISTS strokes_session_name ON strokes (session_name);
+CREATE TABLE IF NOT EXISTS indexed_sessions (
+    session_id TEXT PRIMARY KEY,
+    session_name TEXT NOT NULL,
+    strokes INTEGER NOT NULL
+);
+"""
+
+_INSERT = (f"INSERT INTO strokes (session_id, session_name, device, device_mac, session_time, stroke_id, "
+           f"sample_index, offset_s, estimated_type, {', '.join(FEATURE_COLUMNS)}) "
+           f"VALUES ({', '.join('?' * (9 + len(FEATURE_COLUMNS)))})")
+
+
+def stroke_rows(metadata: Dict[str, Any], analysis: Optional[Dict[str, Any]]) -> List[Tuple]:
+    """把一个会话的分析结果展开成索引行（rows / columnar 两种布局都支持）"""
+    if not analysis or not analysis.get('success'):
+        return []
+    data = analysis.get('data', {})
+    strokes = data.get('stroke_analysis') or []
+    if isinstance(strokes, dict):
+        names = list(strokes)
+        strokes = [dict(zip(names, values)) for values in zip(*strokes.values())]
+    # stroke_analysis 只包含窗口完整的击球，按同样的规则筛出对应的时间戳
+    timestamps = data.get('timestamps', [])
+    window = analysis.get('analysis_info', {}).get('window_size')
+    total = data.get('statistics', {}).get('total_data_points')
+    if window and total:
+        half = window // 2
+        timestamps = [t for t in timestamps if t - half >= 0 and t - half + window <= total]
+
+    # 时长/频率类特征：只有带时间戳的会话才知道实际采样间隔，否则留空
+    interval_ms = (data.get('data_quality') or {}).get('sample_interval_ms')
+    feature_scale = _rate_feature_scale(analysis, interval_ms)
+
+    session_id = metadata.get('session_id', 'unknown')
+    base = (session_id, metadata.get('filename', session_id), metadata.get('device_name', 'unknown'),
+            metadata.get('device_mac'), metadata.get('upload_timestamp', ''))
+    rows = []
+    for position, stroke in enumerate(strokes):
+        stroke_id = stroke.get('stroke_id', position + 1)
+        sample_index = stroke.get('index', timestamps[position] if position < len(timestamps) else None)
+        rows.append(base + (
+            stroke_id,
+            sample_index,
+            # 击球相对会话开始的时间：分析时按实际时间戳算出，没有时间戳的会话留空
+            stroke.get('offset_s'),
+            stroke.get('estimated_type'),
+            *(_scaled(stroke.get(name), feature_scale.get(name, 1.0)) for name in FEATURE_COLUMNS)
+        ))
+    return rows
+
+
+def _rate_feature_scale(analysis: Dict[str, Any], interval_ms: Optional[float]) -> Dict[str, Optional[float]]:
+    """
+    与采样率有关的特征需要乘的系数
+
+    新分析已经按实测采样率计算（系数1）；旧分析按5Hz计算，按实测采样率换算；
+    测不出采样率（没有时间戳）时这些特征不可信，系数为None（索引中留空）
+    """
+    if not interval_ms:
+        return {name: None for name in RATE_DEPENDENT_FEATURES}
+    computed_rate = analysis.get('analysis_info', {}).get('sample_rate_hz')
+    if computed_rate is not None:
+        return {}
+    ratio = (1000.0 / interval_ms) / LEGACY_FEATURE_SAMPLE_RATE
+    return {name: ratio ** power for name, power in RATE_DEPENDENT_FEATURES.items()}
+
+
+def _scaled(value, scale: Optional[float]):
+    return None if value is None or scale is None else value * scale
+
+
+class StrokeIndex:
+    """
+    击球级索引（SQLite，每个击球一行）
+
+    每次分析完成后写入该会话的全部击球，支持按设备、时间范围、击球类型和任意特征范围查询，
+    不用再逐个读取分析文件。数据库不存在时从已有会话（含归档）重建。
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.path = os.path.join(folder, STROKE_INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def add_session(self, metadata: Dict[str, Any], analysis: Optional[Dict[str, Any]]) -> int:
+        """写入（或替换）一个会话的击球，返回写入的行数"""
+        rows = stroke_rows(metadata, analysis)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._replace_session(conn, metadata, rows)
+        return len(rows)
+
+    def remove_sessions(self, session_names: Iterable[str]) -> int:
+        """删除会话（按会话名，如保留策略删除的归档段中的会话），返回删除的击球数"""
+        names = list(session_names)
+        if not names:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                removed = 0
+                for name in names:
+                    removed += conn.execute("DELETE FROM strokes WHERE session_name = ?", (name,)).rowcount
+                    conn.execute("DELETE FROM indexed_sessions WHERE session_name = ?", (name,))
+        return removed
+
+    def query(self, device: Optional[str] = None, session_id: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None,
+              stroke_type: Optional[str] = None,
+              ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+              order_by: str = 'session_time', descending: bool = True,
+              limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+        """
+        范围/过滤查询
+
+        since / until: 会话时间（上传时间，ISO格式）范围，包含 since、不包含 until；可以只写日期
+        ranges: {特征名: (最小值, 最大值)}，两端都包含，任一端为None表示不限
+        """
+        if order_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"不支持的排序字段: {order_by}")
+        limit = max(1, min(int(limit), MAX_QUERY_LIMIT))
+        offset = max(0, int(offset))
+
+        clauses, params = [], []
+        for column, value in (('device', device), ('session_id', session_id), ('estimated_type', stroke_type)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("session_time >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("session_time < ?")
+            params.append(until)
+        for name, (low, high) in (ranges or {}).items():
+            if name not in FEATURE_COLUMNS:
+                raise ValueError(f"不支持的过滤字段: {name}")
+            if low is not None:
+                clauses.append(f"{name} >= ?")
+                params.append(low)
+            if high is not None:
+                clauses.append(f"{name} <= ?")
+                params.append(high)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        direction = "DESC" if descending else "ASC"
+        # 同一会话内按击球顺序，保证分页稳定
+        order = f"ORDER BY {order_by} {direction}, session_id {direction}, stroke_id ASC"
+
+        with self._lock:
+            conn = self._connect()
+            total = conn.execute(f"SELECT COUNT(*) FROM strokes {where}", params).fetchone()[0]
+            cursor = conn.execute(f"SELECT * FROM strokes {where} {order} LIMIT ? OFFSET ?",
+                                  params + [limit, offset])
+            columns = [d[0] for d in cursor.description]
+            items = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        return {
+            "items": items,
+            "total": total,
+            "limit": limit,
+            "offset": offset
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connect()
+            strokes = conn.execute("SELECT COUNT(*) FROM strokes").fetchone()[0]
+            sessions = conn.execute("SELECT COUNT(*) FROM indexed_sessions").fetchone()[0]
+        return {"strokes": strokes, "sessions": sessions}
+
+    def rebuild(self):
+        """从已有会话和分析文件（含归档）重建索引"""
+        with self._lock:
+            self._rebuild(self._connect(create=False))
+
+    def _connect(self, create: bool = True) -> sqlite3.Connection:
+        if self._conn is None:
+            exists = os.path.exists(self.path)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if create and (not exists or version < STROKE_INDEX_VERSION):
+                # 第一次使用或旧版本索引：回填已有会话
+                self._rebuild(self._conn)
+        return self._conn
+
+    def _rebuild(self, conn: sqlite3.Connection):
+        with conn:
+            conn.execute("DELETE FROM strokes")
+            conn.execute("DELETE FROM indexed_sessions")
+            for metadata, analysis in iter_stored_sessions(self.folder):
+                self._replace_session(conn, metadata, stroke_rows(metadata, analysis))
+            conn.execute(f"PRAGMA user_version = {STROKE_INDEX_VERSION}")
+
+    def _replace_session(self, conn: sqlite3.Connection, metadata: Dict[str, Any], rows: List[Tuple]):
+        session_id = metadata.get('session_id', 'unknown')
+        conn.execute("DELETE FROM strokes WHERE session_id = ?", (session_id,))
+        conn.executemany(_INSERT, rows)
+        conn.execute("INSERT OR REPLACE INTO indexed_sessions (session_id, session_name, strokes) VALUES (?, ?, ?)",
+                     (session_id, metadata.get('filename', session_id), len(rows)))